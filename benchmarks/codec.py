@@ -0,0 +1,358 @@
+"""
+Benchmarks for the tensor codec (`server/types/tensor.py`): numpy <-> protobuf
+message conversion plus protobuf and JSON (de)serialization, for every data
+type we map and shapes from scalars up to PoseNet sized heatmaps.
+
+Measures time (best of several runs), peak allocations, and serialized sizes,
+and compares them against the checked in baseline (`baselines/codec.json`);
+exits with a non-zero status on regressions:
+
+  python -m benchmarks.codec                    # check against the baseline
+  python -m benchmarks.codec --update-baseline  # record a new baseline
+
+The baseline is recorded in the pinned environment (`pipenv run`: Python 3.7,
+numpy 1.16, protobuf 3.9); update it in that environment when a change makes
+things faster (or knowingly slower). Timings are scaled by how fast this machine
+is relative to the one the baseline was recorded on, and cases that look slower
+are measured again before they count as regressions, since a busy machine can
+easily be 50% slower for a few seconds.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from os.path import dirname, join
+from time import perf_counter
+from timeit import Timer
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from google.protobuf import json_format
+
+from server.types import Tensor, Tensors
+from server.types.tensor import pb_to_tflite_tensors, tflite_tensors_to_pb
+
+BASELINE = join(dirname(__file__), "baselines", "codec.json")
+
+# Things that are slower than their baseline by more than this fraction (and
+# by more than the absolute slack) are regressions:
+TIME_TOLERANCE = 0.30
+TIME_SLACK_US = 10.0
+ALLOC_TOLERANCE = 0.10
+ALLOC_SLACK_BYTES = 4096
+# Sizes only change with the codec (or the protobuf version), but a few bytes
+# of framing here and there aren't worth failing over:
+SIZE_TOLERANCE = 0.02
+SIZE_SLACK_BYTES = 16
+
+SEED = 0
+
+# Times cases that look like regressions get measured again:
+CONFIRM_RUNS = 2
+# The calibration is short, so it gets more runs than the cases do (its best is
+# what everything else gets scaled by):
+CALIBRATION_REPEAT = 20
+
+Shape = Tuple[int, ...]
+
+SHAPES: Dict[str, Shape] = {
+    "scalar": (),
+    "vector": (10,),
+    "mnist": (1, 28, 28, 1),
+    "posenet heatmaps": (1, 33, 33, 17),
+    "posenet offsets": (1, 33, 33, 34),
+    "mobilenet input": (1, 224, 224, 3),
+}
+
+# Strings and complex numbers are per-element messages/objects; the big shapes
+# take ages and aren't realistic:
+SMALL_SHAPES = ("scalar", "vector", "mnist")
+
+
+def random_tensor(dtype: str, shape: Shape) -> np.ndarray:
+    # (`randn()` gives us a float rather than an array for scalars)
+    randn = lambda: np.asarray(np.random.randn(*shape))
+
+    if dtype == "float32":
+        return randn().astype(np.float32)
+    if dtype == "int32":
+        return np.random.randint(-(2 ** 31), 2 ** 31 - 1, size=shape, dtype=np.int32)
+    if dtype == "uint8":
+        return np.random.randint(0, 255, size=shape, dtype=np.uint8)
+    if dtype == "bool":
+        return randn() > 0
+    if dtype == "complex64":
+        return (randn() + 1j * randn()).astype(np.complex64)
+    if dtype == "str":
+        return np.full(shape, "tensor", dtype=np.str_)
+
+    raise ValueError(f"Unknown dtype: {dtype}")
+
+
+def complex_message(tensor: np.ndarray) -> Tensors:
+    """
+    The codec can't convert complex tensors (yet); we build the messages by hand
+    so that the serialization side still gets measured.
+    """
+    array = [
+        Tensor.Complex(real=int(c.real), imaginary=int(c.imag)) for c in tensor.flat
+    ]
+    return Tensors(
+        tensors=[
+            Tensor(
+                complex_nums=Tensor.ComplexArray(array=array),
+                dimensions=list(tensor.shape),
+            )
+        ]
+    )
+
+
+# (dtype, shape name) for every case:
+CASES: List[Tuple[str, str]] = [
+    (dtype, shape)
+    for dtype in ("float32", "int32", "uint8", "bool", "complex64", "str")
+    for shape in SHAPES
+    if dtype not in ("complex64", "str") or shape in SMALL_SHAPES
+]
+
+
+def best_us(func: Callable[[], Any], repeat: int) -> float:
+    # Enough calls per run for runs of ~20ms (`Timer.autorange` aims for 200ms,
+    # which makes the whole suite take ages):
+    begin = perf_counter()
+    func()
+    number = max(1, int(0.02 / max(perf_counter() - begin, 1e-7)))
+
+    return min(Timer(func).repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def calibration_us(repeat: int = CALIBRATION_REPEAT) -> float:
+    """
+    A fixed mix of interpreter and numpy work; timings are scaled by how long
+    this takes relative to the baseline's run, so that a machine that's busier
+    (or slower) overall doesn't look like a regression.
+    """
+    array = np.arange(4096, dtype=np.float32)
+
+    def work() -> None:
+        sum(i * i for i in range(2000))
+        array.astype(np.int32).tolist()
+
+    return best_us(work, repeat)
+
+
+def peak_alloc(func: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(dtype: str, shape_name: str, repeat: int) -> Dict[str, float]:
+    # Same inputs every time; sizes (JSON especially) depend on the values:
+    np.random.seed(SEED)
+    tensor = random_tensor(dtype, SHAPES[shape_name])
+    results: Dict[str, float] = {}
+
+    def supported(func: Callable[[], Any], what: str) -> bool:
+        try:
+            func()
+            return True
+        except (TypeError, ValueError) as e:
+            print(f"{dtype}/{shape_name}: can't {what} ({e})", file=sys.stderr)
+            return False
+
+    encode = lambda: tflite_tensors_to_pb([tensor])
+    if supported(encode, "encode"):
+        pb = encode()
+        results["encode_us"] = best_us(encode, repeat)
+        results["encode_alloc_bytes"] = peak_alloc(encode)
+    else:
+        pb = complex_message(tensor)
+
+    decode = lambda: pb_to_tflite_tensors(pb)
+    if supported(decode, "decode"):
+        results["decode_us"] = best_us(decode, repeat)
+        results["decode_alloc_bytes"] = peak_alloc(decode)
+
+    data = pb.SerializeToString()
+    results["protobuf_bytes"] = len(data)
+    results["protobuf_serialize_us"] = best_us(pb.SerializeToString, repeat)
+    results["protobuf_parse_us"] = best_us(lambda: Tensors.FromString(data), repeat)
+
+    text = json_format.MessageToJson(pb, indent=None)
+    results["json_bytes"] = len(text.encode())
+    results["json_serialize_us"] = best_us(
+        lambda: json_format.MessageToJson(pb, indent=None), repeat
+    )
+    results["json_parse_us"] = best_us(
+        lambda: json_format.Parse(text, Tensors()), repeat
+    )
+
+    return results
+
+
+Results = Dict[str, Dict[str, float]]
+
+
+def normalized(results: Results, scale: float) -> Results:
+    """
+    Timings as they'd have been when the baseline was recorded; `scale` is how
+    much slower this machine is now.
+    """
+    return {
+        case: {m: v / scale if m.endswith("_us") else v for m, v in metrics.items()}
+        for case, metrics in results.items()
+    }
+
+
+# (case, metric, value, baseline value)
+Regression = Tuple[str, str, float, float]
+
+
+def regressions(
+    current: Results, baseline: Results, tolerance: float
+) -> List[Regression]:
+    problems: List[Regression] = []
+
+    for case, metrics in current.items():
+        if case not in baseline:
+            continue
+
+        for metric, value in metrics.items():
+            old = baseline[case].get(metric)
+            if old is None:
+                continue
+
+            if metric.endswith("_us"):
+                bad = value > old * (1 + tolerance) and value - old > TIME_SLACK_US
+            elif metric.endswith("_alloc_bytes"):
+                bad = (
+                    value > old * (1 + ALLOC_TOLERANCE)
+                    and value - old > ALLOC_SLACK_BYTES
+                )
+            else:
+                bad = (
+                    value > old * (1 + SIZE_TOLERANCE)
+                    and value - old > SIZE_SLACK_BYTES
+                )
+
+            if bad:
+                problems.append((case, metric, value, old))
+
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--confirm", type=int, default=CONFIRM_RUNS)
+    parser.add_argument("--filter", help="only run cases containing this string")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    calibration = calibration_us()
+
+    current: Dict[str, Dict[str, float]] = {}
+    for dtype, shape in CASES:
+        case = f"{dtype}/{shape}"
+        if args.filter is not None and args.filter not in case:
+            continue
+
+        current[case] = measure(dtype, shape, args.repeat)
+        print(
+            f"{case}: " + ", ".join(f"{k} {v:,.1f}" for k, v in current[case].items()),
+            file=sys.stderr,
+        )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "processor": platform.processor(),
+            "calibration_us": calibration,
+        },
+        "results": current,
+    }
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        os.makedirs(dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote a new baseline to `{args.baseline}`.", file=sys.stderr)
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"No baseline at `{args.baseline}`; try `--update-baseline`.")
+
+    for key in ("machine", "python", "numpy"):
+        if baseline["meta"].get(key) != report["meta"][key]:
+            print(
+                f"Warning: the baseline was recorded with {key} "
+                f"`{baseline['meta'].get(key)}` (this is `{report['meta'][key]}`); "
+                "results may not be comparable.",
+                file=sys.stderr,
+            )
+
+    baseline_calibration = baseline["meta"].get("calibration_us", calibration)
+    scale = calibration / baseline_calibration
+    print(f"Machine speed vs. the baseline: {1 / scale:.2f}x", file=sys.stderr)
+
+    checked = normalized(current, scale)
+    problems = regressions(checked, baseline["results"], args.tolerance)
+
+    # Keep the best of each run for the cases that look slower:
+    for _ in range(args.confirm):
+        if not problems:
+            break
+
+        cases = sorted({case for case, *_ in problems})
+        print(f"\nMeasuring {len(cases)} case(s) again...", file=sys.stderr)
+
+        scale = calibration_us() / baseline_calibration
+        for case in cases:
+            dtype, shape = case.split("/", 1)
+            again = normalized({case: measure(dtype, shape, args.repeat)}, scale)
+            checked[case] = {
+                m: min(v, again[case].get(m, v)) for m, v in checked[case].items()
+            }
+
+        problems = regressions(checked, baseline["results"], args.tolerance)
+
+    if problems:
+        print(f"\n{len(problems)} regression(s):", file=sys.stderr)
+        for case, metric, value, old in problems:
+            change = (value - old) / old * 100 if old else float("inf")
+            print(
+                f"  {case} {metric}: {value:,.1f} vs. {old:,.1f} ({change:+.1f}%)",
+                file=sys.stderr,
+            )
+        sys.exit(1)
+
+    print("\nNo regressions.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Memory and disk I/O of getting a large SavedModel upload onto disk (the part of
+`/api/load_model` before conversion; see `server/ingest.py`), for the current
+streaming ingestion and for the old way of doing it (write the whole payload to
+a file, then `extractall` it):
+
+  python -m benchmarks.ingest --size-mib 256 --runs 3
+
+The archive is generated: a SavedModel with `--size-mib` of (incompressible)
+variables, plus half as much again in checkpoints that the model doesn't need.
+Each run is a fresh process; memory and I/O numbers come from `/proc/self`
+(Linux 4.0+). The payload is already in memory when measuring starts, as it is in
+the server; the peak is how much more memory ingestion needed.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+from typing import Any, Dict, List
+
+import numpy as np
+
+METHODS = ("streaming", "legacy")
+SOURCES = ("data", "file")
+
+# Runs in the child; prints a JSON object with its measurements:
+CHILD = """
+import json, os, shutil, sys, tempfile, time, zipfile
+
+from server.types import MODEL_DIR, Model
+from server.types.model import Conversion, acquire_model
+
+method, source, archive = sys.argv[1:4]
+
+def io_counters():
+    with open("/proc/self/io") as f:
+        return {k: int(v) for k, v in (l.split(":") for l in f)}
+
+def memory(field):
+    with open("/proc/self/status") as f:
+        kib = [l.split()[1] for l in f if l.startswith(field + ":")][0]
+        return int(kib) * 1024
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+if source == "data":
+    with open(archive, "rb") as f:
+        model = Model(data=Model.FromBytes(data=f.read()), type=Model.TF_SAVED_MODEL)
+else:
+    shutil.copy(archive, os.path.join(MODEL_DIR, "ingest-benchmark.zip"))
+    model = Model(
+        file=Model.FromFile(file="ingest-benchmark.zip"), type=Model.TF_SAVED_MODEL
+    )
+
+directory = tempfile.mkdtemp()
+reset_peak_rss()
+before_rss, before_io = memory("VmRSS"), io_counters()
+begin = time.perf_counter()
+
+if method == "streaming":
+    acquire_model(model, Conversion(directory))
+else:
+    original = os.path.join(directory, "original")
+    if source == "data":
+        with open(original, "wb") as f:
+            f.write(model.data.data)
+    else:
+        shutil.copyfile(os.path.join(MODEL_DIR, model.file.file), original)
+    with zipfile.ZipFile(original) as z:
+        z.extractall(os.path.join(directory, "tf_saved_model"))
+
+elapsed = time.perf_counter() - begin
+after_io = io_counters()
+shutil.rmtree(directory)
+if source == "file":
+    os.remove(os.path.join(MODEL_DIR, model.file.file))
+
+print(json.dumps({
+    "seconds": elapsed,
+    "peak_rss_increase_mib": (memory("VmHWM") - before_rss) / 2 ** 20,
+    "written_mib": (after_io["wchar"] - before_io["wchar"]) / 2 ** 20,
+    "read_mib": (after_io["rchar"] - before_io["rchar"]) / 2 ** 20,
+}))
+"""
+
+
+def make_archive(path: str, size_mib: int) -> None:
+    rng = np.random.RandomState(0)
+    chunk = lambda mib: rng.bytes(mib * 2 ** 20)
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("model/saved_model.pb", chunk(1))
+        z.writestr("model/variables/variables.index", b"\0" * 4096)
+        z.writestr("model/variables/variables.data-00000-of-00001", chunk(size_mib))
+        for i in range(2):
+            z.writestr(f"model/checkpoints/ckpt-{i}.data", chunk(size_mib // 4))
+
+
+def run_once(method: str, source: str, archive: str) -> Dict[str, Any]:
+    """:raises RuntimeError: When the child fails."""
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, method, source, archive],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["?"])[-1]
+        raise RuntimeError(last)
+
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size-mib", type=int, default=256)
+    parser.add_argument("--method", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--source", nargs="+", choices=SOURCES, default=SOURCES)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "saved_model.zip")
+        make_archive(archive, args.size_mib)
+
+        for source in args.source:
+            for method in args.method:
+                runs = [run_once(method, source, archive) for _ in range(args.runs)]
+                median = lambda k: float(np.median([r[k] for r in runs]))
+
+                r = {
+                    "method": method,
+                    "source": source,
+                    "runs": len(runs),
+                    "seconds": median("seconds"),
+                    "peak_rss_increase_mib": median("peak_rss_increase_mib"),
+                    "written_mib": median("written_mib"),
+                    "read_mib": median("read_mib"),
+                }
+                results.append(r)
+
+                print(
+                    f"{source}/{method}: {r['seconds']:.2f}s, peak RSS "
+                    f"+{r['peak_rss_increase_mib']:.0f}MiB, wrote "
+                    f"{r['written_mib']:.0f}MiB, read {r['read_mib']:.0f}MiB",
+                    file=sys.stderr,
+                )
+
+    report: Dict[str, Any] = {
+        "meta": {"size_mib": args.size_mib, "python": sys.version},
+        "results": results,
+    }
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Load generator for `/api/load_model` and `/api/inference`.
+
+Runs every combination of the given transports, encodings, models, batch sizes
+and concurrency levels against an in-process server (either through Flask's
+test client or over a real socket) and reports latency percentiles and
+throughput for each:
+
+  python -m benchmarks.load --model mnist-lstm.tflite --concurrency 1 4 16 \\
+      --batch 1 8 --output results.json
+
+  python -m benchmarks.load ... --baseline results.json  # compare against a run
+
+Models are files in the local model directory (`pipenv run fetch`, or
+`python -m tests.synthetic $MODEL_DIR` for generated ones that don't need the
+network); inputs are random tensors matching each model's input details.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+from google.protobuf import json_format
+from google.protobuf.message import Message
+from werkzeug.serving import make_server
+
+import server
+from server.model_store import ModelStore
+from server.profiling import TraceStore
+from server.types import (
+    MODEL_DIR,
+    InferenceRequest,
+    InferenceResponse,
+    LoadModelRequest,
+    LoadModelResponse,
+    Model,
+)
+from server.types.tensor import tflite_tensors_to_pb
+
+TRANSPORTS = ("test-client", "socket")
+ENCODINGS = ("protobuf", "json")
+
+MIME_TYPES = {"protobuf": "application/x-protobuf", "json": "application/json"}
+
+# Sends a request body to an endpoint and returns the response body:
+Send = Callable[[str, bytes], bytes]
+
+
+class Config(NamedTuple):
+    endpoint: str  # "load_model" or "inference"
+    transport: str
+    encoding: str
+    model: str
+    batch: int
+    concurrency: int
+
+    def key(self) -> str:
+        return "/".join(str(v) for v in self)
+
+    @staticmethod
+    def of(result: Dict[str, Any]) -> "Config":
+        return Config(**{f: result[f] for f in Config._fields})
+
+
+def encode(msg: Message, encoding: str) -> bytes:
+    if encoding == "json":
+        return json_format.MessageToJson(msg).encode()
+
+    return msg.SerializeToString()
+
+
+def decode(body: bytes, klass: Any, encoding: str) -> Any:
+    if encoding == "json":
+        return json_format.Parse(body, klass(), ignore_unknown_fields=True)
+
+    return klass.FromString(body)
+
+
+def test_client_sender(encoding: str) -> Callable[[], Send]:
+    headers = {"Accept": MIME_TYPES[encoding], "Content-Type": MIME_TYPES[encoding]}
+
+    def make() -> Send:
+        client = server.app.test_client()
+        return lambda endpoint, body: client.post(
+            endpoint, data=body, headers=headers
+        ).get_data()
+
+    return make
+
+
+def socket_sender(port: int, encoding: str) -> Callable[[], Send]:
+    headers = {"Accept": MIME_TYPES[encoding], "Content-Type": MIME_TYPES[encoding]}
+
+    def make() -> Send:
+        local = threading.local()
+
+        def send(endpoint: str, body: bytes) -> bytes:
+            # Keep a connection per thread for as long as the server lets us:
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = http.client.HTTPConnection("127.0.0.1", port)
+
+            try:
+                conn.request("POST", endpoint, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                local.conn = None
+                raise
+
+            if resp.getheader("Connection", "").lower() == "close" or (
+                resp.version == 10
+            ):
+                conn.close()
+                local.conn = None
+
+            return data
+
+        return send
+
+    return make
+
+
+def random_inputs(model: str, batch: int) -> List[np.ndarray]:
+    """Random input tensors for the model, with a batch of `batch`."""
+    interp = tf.lite.Interpreter(model_path=join(MODEL_DIR, model))
+    tensors = []
+
+    for inp in interp.get_input_details():
+        shape = tuple(int(d) for d in inp["shape"])
+        if batch > 1:
+            # Models with a batch dimension of 1 get it replaced:
+            shape = ((batch,) + shape[1:]) if shape[0] == 1 else (batch,) + shape
+
+        dtype = np.dtype(inp["dtype"])
+        if dtype.kind == "f":
+            tensors.append(np.random.rand(*shape).astype(np.float32))
+        else:
+            # Integer tensors travel as int32s; the server casts them:
+            tensors.append(np.random.randint(0, 128, size=shape, dtype=np.int32))
+
+    return tensors
+
+
+def load_request(model: str) -> LoadModelRequest:
+    return LoadModelRequest(
+        model=Model(file=Model.FromFile(file=model), type=Model.TFLITE_FLAT_BUFFER)
+    )
+
+
+def prepare(cfg: Config, send: Send) -> Tuple[str, bytes, Any]:
+    """Returns the endpoint, request body, and response type for the config."""
+    load = load_request(cfg.model)
+
+    if cfg.endpoint == "load_model":
+        return "/api/load_model", encode(load, cfg.encoding), LoadModelResponse
+
+    resp = decode(
+        send("/api/load_model", encode(load, cfg.encoding)),
+        LoadModelResponse,
+        cfg.encoding,
+    )
+    if resp.WhichOneof("response") != "handle":
+        raise RuntimeError(f"Failed to load `{cfg.model}`: {resp.error.message}")
+
+    req = InferenceRequest(
+        handle=resp.handle,
+        tensors=tflite_tensors_to_pb(random_inputs(cfg.model, cfg.batch)),
+    )
+
+    return "/api/inference", encode(req, cfg.encoding), InferenceResponse
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    return float(np.percentile(latencies, p)) if latencies else 0.0
+
+
+def run(
+    cfg: Config, make_sender: Callable[[], Send], requests: int, warmup: int
+) -> Dict[str, Any]:
+    send = make_sender()
+    endpoint, body, klass = prepare(cfg, send)
+
+    # Warm up (allocations, caches, connections) before we start the clock:
+    for _ in range(warmup):
+        send(endpoint, body)
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker() -> None:
+        send = make_sender()
+
+        for _ in remaining:
+            begin = time.perf_counter()
+            try:
+                resp = decode(send(endpoint, body), klass, cfg.encoding)
+                error = resp.error.message if resp.HasField("error") else None
+            except Exception as e:  # the run goes on; errors are reported
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - begin
+
+            with lock:
+                if error is not None:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies.append(elapsed)
+
+    # `remaining` is shared, so the workers split the requests between them:
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=cfg.concurrency) as pool:
+        for f in [pool.submit(worker) for _ in range(cfg.concurrency)]:
+            f.result()
+    wall = time.perf_counter() - begin
+
+    ms = lambda s: s * 1000
+
+    return {
+        **cfg._asdict(),
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "error_messages": errors,
+        "rps": len(latencies) / wall if wall > 0 else 0.0,
+        "items_per_sec": len(latencies) * cfg.batch / wall if wall > 0 else 0.0,
+        "mean_ms": ms(float(np.mean(latencies))) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies, default=0.0)),
+    }
+
+
+def configs(args: argparse.Namespace) -> Iterator[Config]:
+    for transport, encoding, model in itertools.product(
+        args.transport, args.encoding, args.model
+    ):
+        for concurrency in args.concurrency:
+            yield Config("load_model", transport, encoding, model, 1, concurrency)
+
+        for batch, concurrency in itertools.product(args.batch, args.concurrency):
+            yield Config("inference", transport, encoding, model, batch, concurrency)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {Config.of(r).key(): r for r in json.load(f)["results"]}
+
+    print(f"\nChange vs. `{baseline_path}`:")
+    for r in results:
+        key = Config.of(r).key()
+        old = baseline.get(key)
+        if old is None:
+            continue
+
+        delta = lambda m: (r[m] - old[m]) / old[m] * 100 if old[m] else 0.0
+        print(
+            f"  {key}: p50 {delta('p50_ms'):+.1f}%, p99 {delta('p99_ms'):+.1f}%, "
+            f"rps {delta('rps'):+.1f}%"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", nargs="+", default=["mnist-lstm.tflite"])
+    parser.add_argument("--batch", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument(
+        "--transport", nargs="+", choices=TRANSPORTS, default=TRANSPORTS
+    )
+    parser.add_argument("--encoding", nargs="+", choices=ENCODINGS, default=ENCODINGS)
+    parser.add_argument("--requests", type=int, default=200, help="per configuration")
+    parser.add_argument("--warmup", type=int, default=10, help="per configuration")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    args = parser.parse_args()
+
+    server.model_store = ModelStore()
+    server.trace_store = TraceStore()
+
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    results: List[Dict[str, Any]] = []
+
+    try:
+        for cfg in configs(args):
+            make_sender = (
+                socket_sender(http_server.server_port, cfg.encoding)
+                if cfg.transport == "socket"
+                else test_client_sender(cfg.encoding)
+            )
+
+            r = run(cfg, make_sender, args.requests, args.warmup)
+            results.append(r)
+
+            print(
+                f"{cfg.key()}: {r['rps']:.1f} req/s, p50 {r['p50_ms']:.2f}ms, "
+                f"p95 {r['p95_ms']:.2f}ms, p99 {r['p99_ms']:.2f}ms"
+                + (f", {r['errors']} errors" if r["errors"] else ""),
+                file=sys.stderr,
+            )
+    finally:
+        http_server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.time(),
+            "python": platform.python_version(),
+            "tensorflow": tf.__version__,
+            "machine": platform.platform(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
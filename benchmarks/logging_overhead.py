@@ -0,0 +1,90 @@
+"""
+Cost of (disabled) debug logging in tensor conversion, before and after the
+switch to lazily formatted logging.
+
+`python -m benchmarks.logging_overhead [--json]`; run without `DEBUG` or any
+`LOG_*` variables set.
+"""
+
+import argparse
+import json
+import sys
+from timeit import Timer
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from server.debug import DEBUG, get_logger
+from server.types.tensor import pb_to_tflite_tensors, tflite_tensors_to_pb
+
+# (name, shape)
+SHAPES = [("scalar-ish", (1, 10)), ("mobilenet input", (1, 224, 224, 3))]
+
+
+def eager_dprint(*args: Any) -> None:
+    """`dprint` as it was: callers format their message before we get here."""
+    if False:
+        print(*args, file=sys.stderr)
+
+
+def per_call_ns(func: Callable[[], Any], min_time: float = 0.2) -> float:
+    timer = Timer(func)
+    number, elapsed = timer.autorange()
+
+    # Repeat until we've spent at least `min_time` and keep the best run:
+    runs = max(3, int(min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=runs, number=number))
+
+    return best / number * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--json", action="store_true", help="machine readable output")
+    args = parser.parse_args()
+
+    log = get_logger("tensor")
+    if log.enabled(DEBUG):
+        sys.exit("Tensor logging is enabled; unset `DEBUG`/`LOG_*` and try again.")
+
+    results: List[Dict[str, Any]] = []
+
+    for name, shape in SHAPES:
+        tensor = np.random.rand(*shape).astype(np.float32)
+        pb = tflite_tensors_to_pb([tensor])
+
+        eager = per_call_ns(
+            lambda: eager_dprint(f"[INPUT] arr: {tensor}; shape: {tensor.shape}")
+        )
+        lazy = per_call_ns(
+            lambda: log.debug("[INPUT] arr: %s; shape: %s", tensor, tensor.shape)
+        )
+        decode = per_call_ns(lambda: pb_to_tflite_tensors(pb))
+
+        results.append(
+            {
+                "tensor": name,
+                "shape": list(shape),
+                "eager_ns": eager,
+                "lazy_ns": lazy,
+                "saved_ns": eager - lazy,
+                # Including the (lazy) logging that's in there now:
+                "pb_to_tflite_ns": decode,
+            }
+        )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    for r in results:
+        print(
+            f"{r['tensor']} {r['shape']}: eager f-string {r['eager_ns']:,.0f}ns, "
+            f"lazy {r['lazy_ns']:,.0f}ns per message "
+            f"(conversion itself: {r['pb_to_tflite_ns']:,.0f}ns)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Replays traffic captured with `CAPTURE_FILE` (see `server/capture.py`) against
+a running server, keeping the original spacing between requests (or
+compressing it with `--speed`):
+
+  python -m benchmarks.replay capture.bin --url http://localhost:5000 \\
+      --speed 4 --output replay.json
+
+Handles in inference requests are mapped to the handles the replayed load model
+requests get. Reports latency percentiles for each endpoint along with how late
+requests were sent relative to their schedule (if that's large, the replay
+couldn't keep up and `--concurrency` should go up).
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from server.capture import read_capture
+from server.types import (
+    CapturedRequest,
+    InferenceResponse,
+    LoadModelRequest,
+    LoadModelResponse,
+)
+
+HEADERS = {"Accept": "application/x-protobuf", "Content-Type": "application/x-protobuf"}
+
+
+class Client:
+    """An HTTP connection per thread."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname or "localhost", parts.port or 80
+        self._local = threading.local()
+
+    def post(self, endpoint: str, body: bytes) -> bytes:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port)
+
+        try:
+            conn.request("POST", endpoint, body=body, headers=HEADERS)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+        if resp.version == 10 or resp.getheader("Connection", "").lower() == "close":
+            conn.close()
+            self._local.conn = None
+
+        return data
+
+
+# (endpoint, seconds late, latency in seconds, error message)
+Sample = Tuple[str, float, float, Optional[str]]
+
+
+def send_inference(client: Client, body: bytes, scheduled: float) -> Sample:
+    late = time.perf_counter() - scheduled
+    begin = time.perf_counter()
+
+    try:
+        resp = InferenceResponse.FromString(client.post("/api/inference", body))
+        error = resp.error.message if resp.HasField("error") else None
+    except Exception as e:  # keep going; errors are reported
+        error = f"{type(e).__name__}: {e}"
+
+    return "inference", late, time.perf_counter() - begin, error
+
+
+def load_model(
+    client: Client, req: LoadModelRequest
+) -> Tuple[float, LoadModelResponse]:
+    begin = time.perf_counter()
+    resp = LoadModelResponse.FromString(
+        client.post("/api/load_model", req.SerializeToString())
+    )
+
+    return time.perf_counter() - begin, resp
+
+
+def replay(
+    records: List[CapturedRequest], client: Client, speed: float, concurrency: int
+) -> Tuple[List[Sample], float]:
+    samples: List[Sample] = []
+    futures: List["Future[Sample]"] = []
+    handles: Dict[int, int] = {}
+
+    origin_ns = records[0].timestamp_ns if records else 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            scheduled = start + (record.timestamp_ns - origin_ns) / 1e9 / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            kind = record.WhichOneof("request")
+
+            # Loads happen inline; later requests need their handles:
+            if kind == "load_model":
+                late = time.perf_counter() - scheduled
+                latency, error = 0.0, None
+
+                try:
+                    latency, resp = load_model(client, record.load_model)
+
+                    if resp.WhichOneof("response") == "handle":
+                        if record.HasField("handle"):
+                            handles[record.handle.id] = resp.handle.id
+                    else:
+                        error = resp.error.message
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+
+                samples.append(("load_model", late, latency, error))
+
+            elif kind == "inference":
+                req = record.inference
+                req.handle.id = handles.get(req.handle.id, req.handle.id)
+
+                futures.append(
+                    pool.submit(
+                        send_inference, client, req.SerializeToString(), scheduled
+                    )
+                )
+
+    samples.extend(f.result() for f in futures)
+
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples: List[Sample], wall: float) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+
+    for endpoint in sorted({s[0] for s in samples}):
+        ok = [s for s in samples if s[0] == endpoint and s[3] is None]
+        errors = [s[3] for s in samples if s[0] == endpoint and s[3] is not None]
+
+        latencies = np.array([s[2] for s in ok]) * 1000
+        late = np.array([s[1] for s in ok]) * 1000
+        pct = lambda a, p: float(np.percentile(a, p)) if len(a) else 0.0
+
+        summary[endpoint] = {
+            "requests": len(ok),
+            "errors": len(errors),
+            "error_messages": {e: errors.count(e) for e in set(errors)},
+            "rps": len(ok) / wall if wall > 0 else 0.0,
+            "p50_ms": pct(latencies, 50),
+            "p95_ms": pct(latencies, 95),
+            "p99_ms": pct(latencies, 99),
+            "max_ms": float(latencies.max()) if len(latencies) else 0.0,
+            "late_p50_ms": pct(late, 50),
+            "late_p99_ms": pct(late, 99),
+        }
+
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("capture", help="a capture file")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="2 replays twice as fast, etc."
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    records = sorted(read_capture(args.capture), key=lambda r: r.timestamp_ns)
+    print(f"Replaying {len(records)} request(s) at {args.speed}x..", file=sys.stderr)
+
+    samples, wall = replay(records, Client(args.url), args.speed, args.concurrency)
+
+    report = {
+        "meta": {
+            "capture": args.capture,
+            "url": args.url,
+            "speed": args.speed,
+            "concurrency": args.concurrency,
+            "time": time.time(),
+            "wall_s": wall,
+        },
+        "results": summarize(samples, wall),
+    }
+
+    for endpoint, r in report["results"].items():
+        print(
+            f"{endpoint}: {r['requests']} ok, {r['errors']} errors; "
+            f"p50 {r['p50_ms']:.2f}ms, p95 {r['p95_ms']:.2f}ms, "
+            f"p99 {r['p99_ms']:.2f}ms; sent late by {r['late_p99_ms']:.2f}ms (p99)",
+            file=sys.stderr,
+        )
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Worker startup cost for each TFLite runtime (see `server/runtime.py`): the time
+it takes to import the server and serve a first inference, and the resident
+memory afterwards. Each run is a fresh process:
+
+  python -m benchmarks.startup --model mnist-lstm.tflite --runs 5
+
+Runtimes that aren't installed are skipped.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+RUNTIMES = ("tensorflow", "tflite_runtime")
+
+# Runs in the child; prints a JSON object with its measurements:
+CHILD = """
+import json, resource, sys, time
+
+begin = time.perf_counter()
+import server
+from server.model_store import ModelStore
+imported = time.perf_counter()
+
+model = sys.argv[1] if len(sys.argv) > 1 else None
+first_run_ms = None
+if model:
+    store = ModelStore()
+    first_run_ms, _ = store.get(store._load_from_file(model)).warm_up(1)
+ready = time.perf_counter()
+
+print(json.dumps({
+    "import_s": imported - begin,
+    "ready_s": ready - begin,
+    "first_run_ms": first_run_ms,
+    "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "tensorflow_imported": "tensorflow" in sys.modules,
+}))
+"""
+
+
+def run_once(runtime: str, model: Optional[str]) -> Dict[str, Any]:
+    """
+    :raises RuntimeError: When the child fails (i.e. the runtime is missing).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD] + ([model] if model else []),
+        env={**os.environ, "TFLITE_RUNTIME": runtime},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["?"])[-1]
+        raise RuntimeError(last)
+
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runtime", nargs="+", choices=RUNTIMES, default=RUNTIMES)
+    parser.add_argument("--model", help="a `.tflite` file to load and run once")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    model = os.path.abspath(args.model) if args.model else None
+    results: List[Dict[str, Any]] = []
+
+    for runtime in args.runtime:
+        try:
+            runs = [run_once(runtime, model) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{runtime}: skipped ({e})", file=sys.stderr)
+            continue
+
+        median = lambda k: (
+            float(np.median([r[k] for r in runs])) if runs[0][k] is not None else None
+        )
+        r = {
+            "runtime": runtime,
+            "runs": len(runs),
+            "import_s": median("import_s"),
+            "ready_s": median("ready_s"),
+            "first_run_ms": median("first_run_ms"),
+            "max_rss_mib": median("max_rss_mib"),
+            "tensorflow_imported": runs[0]["tensorflow_imported"],
+        }
+        results.append(r)
+
+        print(
+            f"{runtime}: import {r['import_s']:.2f}s, ready {r['ready_s']:.2f}s, "
+            f"max RSS {r['max_rss_mib']:.0f}MiB"
+            + (" (TensorFlow imported)" if r["tensorflow_imported"] else ""),
+            file=sys.stderr,
+        )
+
+    report = {"meta": {"model": model, "python": sys.version}, "results": results}
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,63 @@
+import atexit
 from os import environ as env
 from os import listdir
 from os.path import dirname, exists, isdir, isfile, join
 from string import capwords
-from typing import Any, TypeVar, Union
+from time import perf_counter_ns, time_ns
+from typing import Any, List, Optional, TypeVar, Union
 
-import tensorflow as tf
-import tensorflowjs
-from flask import Flask, redirect, render_template, request, send_from_directory
+from flask import (
+    Flask,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    url_for,
+)
 from flask_pbj import api, json, protobuf
 
+from . import telemetry
+from .admission import DeadlineExceeded, Gate, Overloaded
+from .cancellation import Cancelled, CancelToken, disconnect_probe
+from .capture import CAPTURE_FILE, CaptureWriter
 from .debug import _DEBUG, dprint, if_debug
+from .delegates import Selection, Trial
+from .env import env_int
 from .model_store import ModelStore
+from .multiplex import multiplexer
+from .profiling import TRACE_DIR, TraceStore, chrome_trace, should_trace
 from .types import (
+    ConversionReport,
     InferenceRequest,
     InferenceResponse,
     LoadModelRequest,
     LoadModelResponse,
+    ModelOptions,
+    PostProcess,
 )
 from .types.error import Error, into_error
-from .types.metrics import Metrics
-from .types.model import Model, ModelHandle, convert_handle, convert_model, into_handle
+from .types.image import pb_images_to_tflite_tensors
+from .types.metrics import DECODE, ENCODE, INVOKE, QUEUE, Metrics
+from .types.model import (
+    Model,
+    ModelHandle,
+    conversion_costs,
+    convert_handle,
+    convert_model,
+    into_handle,
+    name_model_type,
+)
+from .types.options import convert_model_options, convert_priority
+from .types.postprocess import convert_post_process
 from .types.tensor import Tensors, pb_to_tflite_tensors, tflite_tensors_to_pb
+from .warmup import WARMUP_MODELS, Warmup, load_requests
 
 # convert: Foreign type -> Local type
 # into: Local type -> Foreign type
 
 HOST: str = env["HOST"] if "HOST" in env else "0.0.0.0"
-PORT: int = int(env["PORT"]) if "PORT" in env else 5000
+PORT: int = env_int("PORT", 5000, minimum=0, maximum=65535)
 EX_DIR = join(dirname(__file__), "..", "examples")
 TEMPLATE_DIR = join(dirname(__file__), "templates")
 
@@ -37,6 +68,11 @@ app = Flask(
     template_folder=TEMPLATE_DIR,
 )
 model_store: ModelStore
+trace_store: TraceStore
+capture_writer: Optional[CaptureWriter] = None
+warmup: Optional[Warmup] = None
+# Admission control for `/api/inference` (see `admission.py`):
+gate = Gate()
 
 # Not ideal, but good enough:
 Response = Any
@@ -92,36 +128,196 @@ def serve_build_file(example_name: str, path: str) -> Response:
 @api(json, protobuf(receives=LoadModelRequest, sends=LoadModelResponse, to_dict=False))
 def load_model() -> LoadModelResponse:
     pb_model: Model = request.received_message.model
+    pb_post_process: PostProcess = request.received_message.post_process
+    pb_options: ModelOptions = request.received_message.options
+
+    labels: telemetry.Labels = (("endpoint", "load_model"),)
+    telemetry.inc("requests_total", labels)
+    arrived, begin = time_ns(), perf_counter_ns()
+    handle: Optional[int] = None
 
     try:
-        model: bytes = convert_model(pb_model)
-        handle = model_store.load(model)
+        post_process = convert_post_process(pb_post_process)
+        options = convert_model_options(pb_options)
+        report = ConversionReport()
+        model: bytes = convert_model(pb_model, report)
+        handle = model_store.load(model, post_process, options)
 
-        return LoadModelResponse(handle=into_handle(handle))
+        return LoadModelResponse(handle=into_handle(handle), report=report)
     except Exception as e:
-        return LoadModelResponse(error=into_error(e))
+        err = into_error(e)
+        telemetry.inc("errors_total", labels + (("kind", Error.Kind.Name(err.kind)),))
+
+        return LoadModelResponse(error=err)
+    finally:
+        telemetry.observe("load_latency_seconds", (perf_counter_ns() - begin) / 1e9)
+
+        if capture_writer is not None:
+            capture_writer.load_model(request.received_message, arrived, handle)
 
 
 @app.route("/api/inference", methods=["POST"])
 @api(json, protobuf(receives=InferenceRequest, sends=InferenceResponse, to_dict=False))
 def run_inference() -> InferenceResponse:
-    pb_tensor: Tensors = request.received_message.tensors
     pb_handle: ModelHandle = request.received_message.handle
+    pb_input: Optional[str] = request.received_message.WhichOneof("input")
+
+    # Handles come from clients; don't let bogus ones blow up our label sets:
+    handle_label = (
+        str(pb_handle.id) if 0 <= pb_handle.id < len(model_store.models) else "invalid"
+    )
+    labels: telemetry.Labels = (("endpoint", "inference"), ("handle", handle_label))
+    telemetry.inc("requests_total", labels)
+    telemetry.inc("queue_depth", labels[1:])
+    begin = perf_counter_ns()
+
+    if capture_writer is not None:
+        capture_writer.inference(request.received_message, time_ns())
+
+    deadline_ms: int = request.received_message.deadline_ms
+    deadline = begin + deadline_ms * 1_000_000 if deadline_ms else None
+    cancel = CancelToken(deadline, disconnect_probe(request.environ))
 
     try:
-        tensors = pb_to_tflite_tensors(pb_tensor)
         handle = model_store.get(convert_handle(pb_handle))
+        options = handle.options
+        priority = convert_priority(request.received_message.priority)
 
-        tensors, metrics = handle.predict(tensors)
+        # Wait for our turn (or get turned away) before doing any work:
+        with gate.admit(
+            handle_label, deadline, priority or options.priority, options.weight
+        ):
+            admitted = perf_counter_ns()
 
-        return InferenceResponse(
-            tensors=tflite_tensors_to_pb(tensors), metrics=metrics.into()
-        )
+            # The client may have given up while we were waiting:
+            cancel.check()
+
+            # Tensors, unless we were sent images to decode:
+            if pb_input == "images":
+                tensors = pb_images_to_tflite_tensors(request.received_message.images)
+            else:
+                tensors = pb_to_tflite_tensors(request.received_message.tensors)
+
+            decoded = perf_counter_ns()
+
+            trace = should_trace(request.received_message.trace)
+
+            tensors, metrics = handle.predict(tensors, trace, cancel)
+            metrics.add_time(QUEUE, admitted - begin).span(QUEUE, begin, admitted)
+            metrics.add_time(DECODE, decoded - admitted).span(DECODE, admitted, decoded)
+
+            with metrics.timed(ENCODE):
+                pb_tensors = tflite_tensors_to_pb(tensors)
+
+            spans = metrics.spans()
+            if spans is not None and any(s.name == INVOKE for s in spans):
+                # Traces are only handed out once they have per-op timings;
+                # until the model's been profiled (or if it can't be), requests
+                # don't get a `trace_url`:
+                ops = handle.op_profile()
+                if ops is None:
+                    handle.profile_ops()
+                elif ops:
+                    name = trace_store.save(chrome_trace(spans, ops))
+                    metrics.trace(url_for("serve_trace", name=name, _external=True))
+
+        return InferenceResponse(tensors=pb_tensors, metrics=metrics.into())
     except Exception as e:
-        return InferenceResponse(error=into_error(e))
+        err = into_error(e)
+        telemetry.inc("errors_total", labels + (("kind", Error.Kind.Name(err.kind)),))
+        if isinstance(e, (Overloaded, DeadlineExceeded)):
+            reason = "overloaded" if isinstance(e, Overloaded) else "deadline"
+            telemetry.inc("requests_shed_total", labels[1:] + (("reason", reason),))
+        if isinstance(e, Cancelled):
+            telemetry.inc(
+                "inference_cancelled_total", labels[1:] + (("reason", e.reason),)
+            )
+            telemetry.inc("batch_elements_skipped_total", labels[1:], cancel.skipped)
+
+        return InferenceResponse(error=err)
+    finally:
+        telemetry.dec("queue_depth", labels[1:])
+        telemetry.observe(
+            "inference_latency_seconds", (perf_counter_ns() - begin) / 1e9, labels[1:]
+        )
+
+
+@app.route("/api/traces/<string:name>")
+def serve_trace(name: str) -> Response:
+    return send_from_directory(trace_store.directory, name, mimetype="application/json")
+
+
+@app.route("/api/ready")
+def ready() -> Response:
+    # 503 until the models we're warming up are good to go:
+    report = warmup.report() if warmup is not None else {"ready": True, "models": {}}
+
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+def _config(backend: str, config: Union[Selection, Trial]) -> telemetry.Labels:
+    threads = str(config.num_threads) if config.num_threads else "default"
+    return (("delegate", backend), ("threads", threads))
+
+
+@app.route("/metrics")
+def export_metrics() -> Response:
+    # Per-handle gauges are cheap enough to just read at scrape time:
+    samples: List[telemetry.Sample] = [
+        ("ready", (), float(warmup is None or warmup.ready))
+    ]
+    for handle, m in enumerate(list(model_store.models)):
+        labels = (("handle", str(handle)),)
+
+        samples.append(("interpreter_reallocations_total", labels, m.reallocations))
+        samples.append(("model_file_bytes", labels, m.file_bytes()))
+        if m.native_batching is not None:
+            samples.append(("native_batching", labels, float(m.native_batching)))
+        if m.delegate is not None:
+            d = m.delegate
+            samples.append(("delegate", labels + _config(d.backend.name, d), 1.0))
+            for t in d.trials:
+                if t.median_ms is not None:
+                    config = labels + _config(t.backend, t)
+                    samples.append(("delegate_benchmark_ms", config, t.median_ms))
+            if d.backend.exclusive:
+                stats = multiplexer(d.backend.name).stats(m)
+                runs = "multiplexed_runs_total"
+                samples.append((runs, labels + (("on", "device"),), stats.device_runs))
+                samples.append((runs, labels + (("on", "cpu"),), stats.cpu_runs))
+                samples.append(("model_swaps_total", labels, stats.swaps))
+        if m.cache is not None:
+            samples.append(("cache_hit_rate", labels, m.cache.hit_rate))
+        samples.append(("inference_waiting", labels, gate.waiting(str(handle))))
+
+    for (source, target), ms in conversion_costs().items():
+        edge = (("from", name_model_type(source)), ("to", name_model_type(target)))
+        samples.append(("conversion_cost_ms", edge, ms))
+
+    return app.response_class(
+        telemetry.render(samples), mimetype="text/plain; version=0.0.4"
+    )
 
 
 def main() -> None:
-    global model_store
+    global model_store, trace_store, capture_writer, warmup
     model_store = ModelStore()
-    app.run(host=HOST, port=PORT, debug=_DEBUG)
+    trace_store = TraceStore(TRACE_DIR)
+
+    # In debug mode, Werkzeug's reloader runs this in a process that only
+    # watches for changes and then again in the child process that it starts to
+    # serve requests (which has `WERKZEUG_RUN_MAIN` set); the watcher shouldn't
+    # load models or write captures:
+    use_reloader = _DEBUG
+    serving = not use_reloader or env.get("WERKZEUG_RUN_MAIN") == "true"
+
+    # Happens in the background; `/api/ready` says when it's done:
+    warmup = Warmup(model_store, load_requests(WARMUP_MODELS))
+    if serving:
+        warmup.start()
+
+    if CAPTURE_FILE is not None and serving:
+        capture_writer = CaptureWriter(CAPTURE_FILE)
+        atexit.register(capture_writer.close)
+
+    app.run(host=HOST, port=PORT, debug=_DEBUG, use_reloader=use_reloader)
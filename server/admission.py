@@ -0,0 +1,261 @@
+import os
+import threading
+from contextlib import contextmanager
+from itertools import count
+from time import perf_counter_ns
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .debug import get_logger
+from .env import env_int
+
+# Admission control and scheduling for inference requests.
+#
+# Without a limit, every request the server accepts runs at once; under
+# overload they all slow down together until clients time out, and the work
+# done on the requests that time out is wasted. Instead:
+#   - at most `MAX_CONCURRENT_INFERENCES` requests run at once; the rest wait
+#   - each handle can only have `MAX_QUEUED_PER_HANDLE` requests waiting; past
+#     that, requests for it are turned away (`Overloaded`)
+#   - requests with a deadline that we don't expect to meet (going by how long
+#     the requests that would go before them and requests for their handle have
+#     been taking) are turned away when they arrive, and requests whose
+#     deadline passes while they wait give up (`DeadlineExceeded`)
+#
+# When a slot frees up, the waiting request that goes next is picked by:
+#   1. priority class: interactive, then normal, then bulk
+#   2. deadline, earliest first, for requests that have one
+#   3. weighted fair queueing across handles (start-time fair queueing, where
+#      a request costs its handle's average run time over the handle's weight)
+#      for the rest; a handle with twice the weight gets twice the run time
+#      when handles are competing
+# Bulk requests can't take the last `RESERVED_SLOTS` slots, so interactive
+# requests don't have to wait for a long bulk request to finish to get one;
+# bulk work soaks up the rest of the capacity.
+#
+# All of this happens before a request's tensors are decoded, so requests that
+# are turned away cost next to nothing. Both errors are retryable and say when
+# to retry.
+
+log = get_logger("admission")
+
+MAX_CONCURRENT_INFERENCES: int = env_int(
+    "MAX_CONCURRENT_INFERENCES", 2 * (os.cpu_count() or 1), minimum=1
+)
+MAX_QUEUED_PER_HANDLE: int = env_int("MAX_QUEUED_PER_HANDLE", 16, minimum=0)
+RESERVED_SLOTS: int = env_int("RESERVED_SLOTS", 1, minimum=0)
+
+INTERACTIVE, NORMAL, BULK = "interactive", "normal", "bulk"
+RANKS: Dict[str, int] = {INTERACTIVE: 0, NORMAL: 1, BULK: 2}
+
+# Weight of the newest sample in the moving averages of request times:
+ALPHA = 0.2
+# What a request costs (in the fair queueing) before its handle has run one:
+DEFAULT_COST_MS = 1.0
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after_ms: float = 0.0):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, message: str, retry_after_ms: float = 0.0):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+class _Request:
+    __slots__ = ("handle", "priority", "deadline_ns", "start", "key", "granted")
+
+    def __init__(
+        self,
+        handle: str,
+        priority: str,
+        deadline_ns: Optional[int],
+        start: float,
+        finish: float,
+        seq: int,
+    ):
+        self.handle = handle
+        self.priority = priority
+        self.deadline_ns = deadline_ns
+        self.start = start  # virtual time (fair queueing)
+        self.granted = False
+
+        # Smallest goes first:
+        self.key: Tuple[int, int, float, int] = (
+            RANKS[priority],
+            0 if deadline_ns is not None else 1,
+            float(deadline_ns) if deadline_ns is not None else finish,
+            seq,
+        )
+
+
+class Gate:
+    def __init__(
+        self,
+        concurrency: int = MAX_CONCURRENT_INFERENCES,
+        queue_limit: int = MAX_QUEUED_PER_HANDLE,
+        reserved: int = RESERVED_SLOTS,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.queue_limit = max(queue_limit, 0)
+        # Always leave bulk work at least one slot:
+        self.reserved = min(max(reserved, 0), self.concurrency - 1)
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting: List[_Request] = []
+        self._queued: Dict[str, int] = {}
+        self._seq = count()
+        # Moving averages of how long requests take once admitted, in ms:
+        self._service_ms: Dict[str, float] = {}
+
+        # Fair queueing: the virtual time (the start tag of the last request to
+        # be let in) and the finish tag of each handle's last request:
+        self._vtime = 0.0
+        self._finish: Dict[str, float] = {}
+
+    def service_ms(self, handle: str) -> float:
+        """Expected time to run a request for `handle` (0 until we know)."""
+        if handle in self._service_ms:
+            return self._service_ms[handle]
+
+        known = list(self._service_ms.values())
+        return sum(known) / len(known) if known else 0.0
+
+    def _slots(self, priority: str) -> int:
+        return self.concurrency - (self.reserved if priority == BULK else 0)
+
+    def _wait_ms(self, key: Tuple[int, int, float, int], priority: str) -> float:
+        """
+        Expected wait for a slot, for a request that would be ordered by `key`.
+        Hold `_cond`.
+        """
+        ahead = [r for r in self._waiting if r.key < key]
+        slots = self._slots(priority)
+        if self._running + len(ahead) < slots:
+            return 0.0
+
+        # The requests ahead of us, spread over the slots, plus (on average)
+        # half of a running request:
+        known = list(self._service_ms.values())
+        mean = sum(known) / len(known) if known else 0.0
+        work = sum(self.service_ms(r.handle) for r in ahead)
+        return work / slots + mean / 2
+
+    def _check_deadline(
+        self, handle: str, deadline_ns: Optional[int], wait: float
+    ) -> None:
+        """:raises DeadlineExceeded: If we don't expect to make it. Hold `_cond`."""
+        if deadline_ns is None:
+            return
+
+        service = self.service_ms(handle)
+        left_ms = (deadline_ns - perf_counter_ns()) / 1e6
+        if wait + service > left_ms:
+            raise DeadlineExceeded(
+                f"Expected to take {wait + service:.1f}ms ({wait:.1f}ms waiting); "
+                f"{max(left_ms, 0):.1f}ms left until the deadline.",
+                retry_after_ms=wait,
+            )
+
+    def _dispatch(self) -> None:
+        """Lets in as many of the waiting requests as there are slots for."""
+        for request in sorted(self._waiting, key=lambda r: r.key):
+            if self._running >= self.concurrency:
+                break
+            if request.granted or self._running >= self._slots(request.priority):
+                continue
+
+            request.granted = True
+            self._running += 1
+            self._vtime = max(self._vtime, request.start)
+
+        self._cond.notify_all()
+
+    @contextmanager
+    def admit(
+        self,
+        handle: str,
+        deadline_ns: Optional[int] = None,
+        priority: str = NORMAL,
+        weight: float = 1.0,
+    ) -> Iterator[None]:
+        """
+        :raises Overloaded: If `handle` has too many requests waiting.
+        :raises DeadlineExceeded: If the request isn't expected to be done by
+                                  `deadline_ns` (`perf_counter_ns` time).
+
+        Runs the block once it's the request's turn (see above).
+        """
+        with self._cond:
+            queued = self._queued.get(handle, 0)
+            if queued >= self.queue_limit and self._running >= self._slots(priority):
+                raise Overloaded(
+                    f"{queued} requests are already waiting for this model.",
+                    # (as if at the back of its class:)
+                    retry_after_ms=self._wait_ms(
+                        (RANKS[priority], 2, 0.0, 0), priority
+                    ),
+                )
+
+            start = max(self._vtime, self._finish.get(handle, 0.0))
+            finish = start + (self.service_ms(handle) or DEFAULT_COST_MS) / weight
+            request = _Request(
+                handle, priority, deadline_ns, start, finish, next(self._seq)
+            )
+            self._check_deadline(
+                handle, deadline_ns, self._wait_ms(request.key, priority)
+            )
+
+            self._finish[handle] = finish
+            self._waiting.append(request)
+            self._queued[handle] = queued + 1
+            try:
+                self._dispatch()
+                while not request.granted:
+                    timeout = None
+                    if deadline_ns is not None:
+                        timeout = (deadline_ns - perf_counter_ns()) / 1e9
+                        if timeout <= 0:
+                            raise DeadlineExceeded(
+                                "The deadline passed while waiting to run.",
+                                retry_after_ms=self._wait_ms(request.key, priority),
+                            )
+
+                    self._cond.wait(timeout)
+
+                # Waiting may have used up the time we needed:
+                self._check_deadline(handle, deadline_ns, wait=0.0)
+            except BaseException:
+                if request.granted:
+                    self._running -= 1
+                raise
+            finally:
+                self._waiting.remove(request)
+                self._queued[handle] -= 1
+                self._dispatch()
+
+        begin = perf_counter_ns()
+        try:
+            yield
+        finally:
+            ms = (perf_counter_ns() - begin) / 1e6
+            with self._cond:
+                self._running -= 1
+
+                old = self._service_ms.get(handle)
+                self._service_ms[handle] = (
+                    ms if old is None else ALPHA * ms + (1 - ALPHA) * old
+                )
+                self._dispatch()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def waiting(self, handle: Optional[str] = None) -> int:
+        with self._cond:
+            return len(self._waiting) if handle is None else self._queued.get(handle, 0)
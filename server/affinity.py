@@ -0,0 +1,58 @@
+import os
+from contextlib import contextmanager
+from typing import FrozenSet, Iterable, Iterator
+
+from .debug import get_logger
+
+# Pinning model execution to sets of cores.
+#
+# Models that are given a set of cores (`ModelOptions.cpus`) only ever run on
+# those cores, so giving a heavy model a couple of cores of its own keeps it
+# from starving the latency sensitive models it shares the server with (for
+# strict isolation, give every model its own cores).
+#
+# Affinity is per thread on Linux: the thread running a request is pinned for
+# the duration of the request (and restored afterwards, since request threads
+# are shared between models) and threads that only ever run one model's work
+# (i.e. replica threads) are pinned once. The interpreter's own worker threads
+# inherit the affinity of the thread that starts them, which is always pinned.
+#
+# Where `sched_setaffinity` isn't available (i.e. not Linux), pinning does
+# nothing.
+
+log = get_logger("affinity")
+
+SUPPORTED: bool = hasattr(os, "sched_setaffinity")
+
+
+def available_cpus() -> FrozenSet[int]:
+    """The cores this process is allowed to run on."""
+    if SUPPORTED:
+        return frozenset(os.sched_getaffinity(0))
+
+    return frozenset(range(os.cpu_count() or 1))
+
+
+def pin(cpus: Iterable[int]) -> None:
+    """Pins the calling thread to the given cores (if there are any)."""
+    cpus = frozenset(cpus)
+
+    if cpus and SUPPORTED:
+        os.sched_setaffinity(0, cpus)
+
+
+@contextmanager
+def pinned(cpus: Iterable[int]) -> Iterator[None]:
+    """Pins the calling thread to the given cores while in the block."""
+    cpus = frozenset(cpus)
+
+    if not cpus or not SUPPORTED:
+        yield
+        return
+
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
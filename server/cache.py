@@ -0,0 +1,89 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .debug import get_logger
+
+Tensor = np.ndarray
+Tensors = List[Tensor]
+Digest = bytes
+
+log = get_logger("cache")
+
+
+def digest_tensors(tensors: Tensors) -> Digest:
+    """
+    A (fast, non-cryptographic use of a cryptographic hash) digest of a set of
+    tensors: their data types, shapes, and contents.
+    """
+    h = hashlib.blake2b(digest_size=16)
+
+    for t in tensors:
+        h.update(f"{t.dtype.str}{t.shape};".encode())
+        # Hashes the array's buffer in place (no copy) when it's contiguous:
+        h.update(np.ascontiguousarray(t).data)
+
+    return h.digest()
+
+
+class ResultCache:
+    """
+    A thread safe LRU cache of inference results with an optional TTL.
+
+    Each handle gets its own cache, so the model's identity (the model, its
+    post processing stage and its options) is implicitly part of the key.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0.0):
+        assert max_entries > 0 and ttl >= 0
+
+        self.max_entries = max_entries
+        self.ttl = ttl  # in seconds; 0 means entries never expire
+
+        self._entries: "OrderedDict[Digest, Tuple[float, Tensors]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Digest) -> Optional[Tensors]:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self.ttl and now - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key: Digest, outputs: Tensors) -> None:
+        # Cached results are handed out to every request that hits them, so
+        # make sure nothing can go modify them:
+        for t in outputs:
+            t.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), outputs)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                log.debug("Evicted an entry from the result cache.")
@@ -0,0 +1,100 @@
+import select
+import threading
+from os import environ
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Optional
+
+from .debug import get_logger
+
+# Cancelling inference that nobody is waiting for anymore.
+#
+# Once admitted, a request used to run to completion even if the client had
+# gone away (i.e. a page navigated away from or a webcam demo that moved on to
+# the next frame) or its deadline had passed; for a large manual batch that's
+# a lot of invokes whose outputs are thrown away, with the model's interpreter
+# held the whole time. Instead, each inference request gets a `CancelToken`
+# that's checked between batch elements (and once more after admission, before
+# the inputs are decoded). Once the client has disconnected or the deadline has
+# passed, the next check raises `Cancelled`, which stops every replica working
+# on the request at its next element and releases the interpreter.
+#
+# Disconnects are noticed by polling the request's socket for a hang up; set
+# `CANCEL_ON_DISCONNECT=0` to turn that off (i.e. for clients that half-close
+# their connection after sending the request, which looks the same).
+
+log = get_logger("cancellation")
+
+CANCEL_ON_DISCONNECT: bool = environ.get("CANCEL_ON_DISCONNECT", "1") != "0"
+
+DISCONNECTED, DEADLINE = "disconnected", "deadline"
+
+# `POLLRDHUP` (the other end shut down its half) is Linux only; elsewhere we
+# only notice connections that are gone entirely:
+_HANGUP = getattr(select, "POLLRDHUP", 0) | select.POLLHUP | select.POLLERR
+
+
+class Cancelled(Exception):
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(
+        self,
+        deadline_ns: Optional[int] = None,
+        disconnected: Optional[Callable[[], bool]] = None,
+    ):
+        self.deadline_ns = deadline_ns
+        self.disconnected = disconnected
+        self.reason: Optional[str] = None
+        # Batch elements that didn't run because of the cancellation:
+        self.skipped = 0
+
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str) -> None:
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+
+    def skip(self, elements: int) -> None:
+        with self._lock:
+            self.skipped += elements
+
+    def check(self) -> None:
+        """:raises Cancelled: If the request has been cancelled."""
+        if self.reason is None:
+            if self.deadline_ns is not None and perf_counter_ns() > self.deadline_ns:
+                self.cancel(DEADLINE)
+            elif self.disconnected is not None and self.disconnected():
+                self.cancel(DISCONNECTED)
+
+        if self.reason == DEADLINE:
+            raise Cancelled("The deadline passed while running.", DEADLINE)
+        if self.reason is not None:
+            raise Cancelled("The client went away.", self.reason)
+
+
+def disconnect_probe(wsgi_environ: Dict[str, Any]) -> Optional[Callable[[], bool]]:
+    """
+    A function that tells whether the client that made the request in
+    `wsgi_environ` has hung up, or None if we can't tell for this server.
+    Only valid while the request is being handled.
+    """
+    if not CANCEL_ON_DISCONNECT:
+        return None
+
+    sock = wsgi_environ.get("werkzeug.socket") or wsgi_environ.get("gunicorn.socket")
+    try:
+        # Werkzeug's development server (that `app.run` uses) hands us the
+        # socket's file as the request body's stream:
+        fd = (sock or wsgi_environ["wsgi.input"]).fileno()
+    except (AttributeError, KeyError, OSError, ValueError):
+        log.debug("Can't find the request's socket; disconnects won't cancel.")
+        return None
+
+    poller = select.poll()
+    poller.register(fd, _HANGUP)
+
+    return lambda: any(events & _HANGUP for _, events in poller.poll(0))
@@ -0,0 +1,143 @@
+from os import environ
+from queue import Full, Queue
+from random import random
+from threading import Thread
+from typing import BinaryIO, Iterator, Optional
+
+from .debug import get_logger
+from .env import env_float, env_int
+from .types import CapturedRequest, InferenceRequest, LoadModelRequest
+
+# Optional capture of incoming requests, for replaying later (see
+# `benchmarks/replay.py`).
+#
+# Capture files are a sequence of `CapturedRequest` messages, each prefixed with
+# its length as a varint (like protobuf's `writeDelimitedTo`). Requests are
+# serialized on the request path but written out on a background thread; if
+# the writer falls behind, requests are dropped rather than making requests
+# wait. Load model requests are always captured (replays need them to map
+# handles); inference requests are sampled.
+
+CAPTURE_FILE: Optional[str] = environ.get("CAPTURE_FILE")
+CAPTURE_SAMPLE_RATE: float = env_float(
+    "CAPTURE_SAMPLE_RATE", 1.0, minimum=0.0, maximum=1.0
+)
+CAPTURE_QUEUE_SIZE: int = env_int("CAPTURE_QUEUE_SIZE", 1024, minimum=1)
+
+log = get_logger("capture")
+
+
+class CaptureFileError(Exception):
+    ...
+
+
+def _encode_varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(f: BinaryIO) -> Optional[int]:
+    """Returns None at the end of the file."""
+    result = shift = 0
+
+    while True:
+        b = f.read(1)
+        if not b:
+            if shift == 0:
+                return None
+            raise CaptureFileError("Capture file ends in the middle of a length.")
+
+        result |= (b[0] & 0x7F) << shift
+        shift += 7
+
+        if not b[0] & 0x80:
+            return result
+
+
+def read_capture(path: str) -> Iterator[CapturedRequest]:
+    """
+    :raises CaptureFileError: On truncated or corrupt capture files.
+    """
+    with open(path, "rb") as f:
+        while True:
+            length = _read_varint(f)
+            if length is None:
+                return
+
+            data = f.read(length)
+            if len(data) != length:
+                raise CaptureFileError(
+                    f"Capture file is truncated; expected a {length} byte record, "
+                    f"Got: {len(data)} bytes."
+                )
+
+            yield CapturedRequest.FromString(data)
+
+
+class CaptureWriter:
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = CAPTURE_SAMPLE_RATE,
+        queue_size: int = CAPTURE_QUEUE_SIZE,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.dropped = 0
+
+        # Appends, so that restarts don't clobber earlier captures:
+        self._file = open(path, "ab")
+        self._queue: "Queue[Optional[bytes]]" = Queue(maxsize=queue_size)
+        self._thread = Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+        log.info("Capturing requests to `%s` (sample rate: %s).", path, sample_rate)
+
+    def load_model(
+        self, req: LoadModelRequest, arrived_ns: int, handle: Optional[int]
+    ) -> None:
+        record = CapturedRequest(timestamp_ns=arrived_ns, load_model=req)
+        if handle is not None:
+            record.handle.id = handle
+
+        # These are rare and replays can't do without them, so we'll wait:
+        self._put(record, wait=True)
+
+    def inference(self, req: InferenceRequest, arrived_ns: int) -> None:
+        if self.sample_rate < 1.0 and random() >= self.sample_rate:
+            return
+
+        self._put(CapturedRequest(timestamp_ns=arrived_ns, inference=req))
+
+    def _put(self, record: CapturedRequest, wait: bool = False) -> None:
+        data = record.SerializeToString()
+
+        try:
+            self._queue.put(_encode_varint(len(data)) + data, block=wait)
+        except Full:
+            self.dropped += 1
+            log.warning("Capture queue is full; dropped a request.")
+
+    def _run(self) -> None:
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+
+            self._file.write(data)
+
+            # Flush whenever we catch up, so the file is usable while we run:
+            if self._queue.empty():
+                self._file.flush()
+
+        self._file.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
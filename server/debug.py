@@ -1,14 +1,276 @@
+import json
+import logging
 import os
 import sys
-from typing import Any, Callable, Optional, TypeVar
+import time
+from contextlib import contextmanager, nullcontext
+from random import random
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional, TypeVar
+
+# Logging, split into categories (i.e. "tensor", "model") that each have their
+# own level and sample rate:
+#
+#   LOG_LEVEL=info LOG_LEVELS=tensor:debug,model:trace LOG_SAMPLE=tensor:0.01
+#
+# This sits on the standard library's `logging`: each category is a logger
+# (`web_demos.<category>`) under one parent that has the level from `LOG_LEVEL`
+# and the handler; `LOG_LEVELS` sets levels on the category loggers and
+# `LOG_SAMPLE` attaches a sampling filter to them. Other code (and tools) can
+# configure them like any other logger.
+#
+# Messages are %-style format strings that are only formatted once we know a
+# message is going to be emitted, so disabled logging costs a method call and
+# a (cached) level check; in particular, tensors passed as arguments don't get
+# turned into strings. `LOG_FORMAT=json` switches to one JSON object per line.
+#
+# `DEBUG=true` is shorthand for `LOG_LEVEL=debug` (and also turns on Flask's
+# debug mode). Bad values in any of these get a warning and the default rather
+# than stopping the server from starting.
 
 _DEBUG = "DEBUG" in os.environ and os.environ["DEBUG"].lower() == "true"
 
+TRACE, DEBUG, INFO, WARNING, ERROR = (
+    5,
+    logging.DEBUG,
+    logging.INFO,
+    logging.WARNING,
+    logging.ERROR,
+)
+OFF = logging.CRITICAL + 10
+logging.addLevelName(TRACE, "TRACE")
+logging.addLevelName(OFF, "OFF")
+
+LEVELS: Dict[str, int] = {
+    "trace": TRACE,
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR,
+    "off": OFF,
+}
+LEVEL_NAMES: Dict[int, str] = {v: k for k, v in LEVELS.items()}
+
+NAMESPACE = "web_demos"
+
+
+def _warn(message: str) -> None:
+    # (Logging isn't set up yet when the configuration is being read.)
+    print(f"[server] {message}", file=sys.stderr)
+
+
+def _parse_categories(var: str, parse: Callable[[str], Any]) -> Dict[str, Any]:
+    """`category:value,category:value` -> {category: value}"""
+    parsed: Dict[str, Any] = {}
+    for pair in (p for p in os.environ.get(var, "").split(",") if p.strip()):
+        if ":" not in pair:
+            _warn(f"Ignoring `{pair}` in `{var}` (expected `category:value`).")
+            continue
+
+        category, value = pair.split(":", 1)
+        parsed[category.strip()] = parse(value.strip())
+
+    return parsed
+
+
+def _parse_level(name: str, default: int) -> int:
+    """Unknown level names get `default` (and a warning) rather than an error."""
+    if name.lower() in LEVELS:
+        return LEVELS[name.lower()]
+
+    _warn(
+        f"Unknown log level `{name}` (expected one of: {', '.join(LEVELS)}); "
+        f"using `{LEVEL_NAMES[default]}`."
+    )
+    return default
+
+
+def _parse_rate(rate: str) -> float:
+    """Sample rates that aren't numbers in [0, 1] are 1 (and a warning)."""
+    try:
+        value = float(rate)
+    except ValueError:
+        value = -1.0
+
+    if not 0.0 <= value <= 1.0:
+        _warn(f"Bad log sample rate `{rate}` (expected 0 to 1); using 1.")
+        return 1.0
+
+    return value
+
+
+_UNSET_LEVEL = DEBUG if _DEBUG else WARNING
+DEFAULT_LEVEL: int = _parse_level(
+    os.environ.get("LOG_LEVEL", LEVEL_NAMES[_UNSET_LEVEL]), _UNSET_LEVEL
+)
+CATEGORY_LEVELS: Dict[str, int] = _parse_categories(
+    "LOG_LEVELS", lambda l: _parse_level(l, DEFAULT_LEVEL)
+)
+CATEGORY_SAMPLE_RATES: Dict[str, float] = _parse_categories("LOG_SAMPLE", _parse_rate)
+JSON_FORMAT: bool = os.environ.get("LOG_FORMAT", "text").lower() == "json"
+
+
+class _Formatter(logging.Formatter):
+    """`[category] message key=value` or a JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        category = record.name.split(".", 1)[-1]
+        msg = record.getMessage()
+        fields: Dict[str, Any] = getattr(record, "fields", {})
+
+        if JSON_FORMAT:
+            entry = {
+                "ts": record.created,
+                "category": category,
+                "level": LEVEL_NAMES.get(record.levelno, record.levelname.lower()),
+                "msg": msg,
+            }
+            entry.update(fields)
+            return json.dumps(entry, default=str)
+
+        extra = "".join(f" {k}={v}" for k, v in fields.items())
+        return f"[{category}] {msg}{extra}"
+
+
+class _StderrHandler(logging.Handler):
+    """Writes to whatever `sys.stderr` is when a record comes in."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            print(self.format(record), file=sys.stderr)
+        except Exception:
+            self.handleError(record)
+
+
+class _Sample(logging.Filter):
+    """Lets through a `rate` fraction of records."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1.0 or random() < self.rate
+
+
+_parent = logging.getLogger(NAMESPACE)
+_parent.setLevel(DEFAULT_LEVEL)
+_parent.propagate = False
+if not _parent.handlers:
+    _handler = _StderrHandler()
+    _handler.setFormatter(_Formatter())
+    _parent.addHandler(_handler)
+
+
+_NOT_TIMED: ContextManager[None] = nullcontext()
+
+
+class Logger:
+    """
+    A category's logger: `logging.Logger` plus `key=value` fields on messages,
+    a `trace` level, and `timed`.
+    """
+
+    __slots__ = ("category", "logger", "_sampler")
+
+    def __init__(self, category: str):
+        self.category = category
+        self.logger = logging.getLogger(f"{NAMESPACE}.{category}")
+
+        if category in CATEGORY_LEVELS:
+            self.logger.setLevel(CATEGORY_LEVELS[category])
+
+        samplers = [f for f in self.logger.filters if isinstance(f, _Sample)]
+        if samplers:
+            self._sampler = samplers[0]
+        else:
+            self._sampler = _Sample(CATEGORY_SAMPLE_RATES.get(category, 1.0))
+            self.logger.addFilter(self._sampler)
+
+    @property
+    def level(self) -> int:
+        return self.logger.getEffectiveLevel()
+
+    @level.setter
+    def level(self, level: int) -> None:
+        self.logger.setLevel(level)
+
+    @property
+    def sample_rate(self) -> float:
+        return self._sampler.rate
+
+    @sample_rate.setter
+    def sample_rate(self, rate: float) -> None:
+        self._sampler.rate = rate
+
+    def enabled(self, level: int) -> bool:
+        """For guarding work (other than formatting) that's only for logging."""
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, extra={"fields": fields})
+
+    def trace(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, msg, *args, extra={"fields": fields})
+
+    def debug(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.log(DEBUG, msg, *args, extra={"fields": fields})
+
+    def info(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(INFO):
+            self.logger.log(INFO, msg, *args, extra={"fields": fields})
+
+    def warning(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(WARNING):
+            self.logger.log(WARNING, msg, *args, extra={"fields": fields})
+
+    def error(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self.logger.isEnabledFor(ERROR):
+            self.logger.log(ERROR, msg, *args, extra={"fields": fields})
+
+    def timed(
+        self, what: str, level: int = TRACE, **fields: Any
+    ) -> ContextManager[None]:
+        """Logs how long the block took (a no-op context when disabled)."""
+        if not self.logger.isEnabledFor(level):
+            return _NOT_TIMED
+
+        return self._timed(what, level, fields)
+
+    @contextmanager
+    def _timed(self, what: str, level: int, fields: Dict[str, Any]) -> Iterator[None]:
+        begin = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed_us = (time.perf_counter_ns() - begin) / 1000
+            self.log(level, "%s took %.1fμs", what, elapsed_us, **fields)
+
+
+_loggers: Dict[str, Logger] = {}
+
+
+def get_logger(category: str) -> Logger:
+    if category not in _loggers:
+        _loggers[category] = Logger(category)
+
+    return _loggers[category]
+
+
+_log = get_logger("server")
+
 
 def dprint(*args: Any, **kwargs: Any) -> None:
-    if _DEBUG:
-        kwargs["file"] = sys.stderr
-        print(*args, **kwargs)
+    """
+    Debug message for the "server" category, `print` style (`sep` and `end` work;
+    each call is one log record); prefer `get_logger` on hot paths.
+    """
+    if _log.enabled(DEBUG):
+        sep, end = kwargs.get("sep", " "), kwargs.get("end", "\n")
+        message = sep.join(str(a) for a in args) + end
+        _log.log(DEBUG, "%s", message[:-1] if message.endswith("\n") else message)
 
 
 T = TypeVar("T")
@@ -0,0 +1,291 @@
+from os import environ
+from os.path import basename, splitext
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .affinity import available_cpus
+from .debug import get_logger
+from .env import env_int
+from .multiplex import multiplexer
+from .ncore import (
+    NCORE_PRESENT,
+    Delegate,
+    InvalidDelegateLibrary,
+    get_ncore_delegate_instance,
+)
+from .runtime import (
+    SUPPORTS_NUM_THREADS,
+    Interpreter,
+    OpResolverType,
+    load_delegate,
+    outputs_agree,
+    random_inputs,
+    run_once,
+)
+
+# The delegates (backends) models can run on, and picking between them.
+#
+# Models run on the default backend (NCore if it's present, the runtime's
+# default otherwise) unless their options name another one. With
+# `ModelOptions.delegate = "auto"`, every backend (at every thread count worth
+# trying) is benchmarked on random inputs when the model is loaded; ones whose
+# outputs don't agree with plain CPU execution are thrown out and the fastest
+# of the rest is used. The numbers are kept on the model (and in `/metrics`).
+#
+# Backends:
+#   - `cpu`: the builtin kernels, without any default delegates
+#   - `xnnpack`: the builtin kernels + XNNPACK; the runtime's default (only on
+#     runtimes that let you turn XNNPACK off; elsewhere `cpu` is the default)
+#   - `ncore`: the NCore delegate (see `ncore.py`), if NCore is present
+#   - one for each shared object in `DELEGATE_LIBS` (a comma separated list of
+#     paths), named after the file; loaded with `load_delegate`
+#
+# Other modules can add backends with `register`.
+#
+# `DELEGATE_BENCHMARK_RUNS` is how many times each configuration is timed
+# (the median is used; default 5) and `DELEGATE_THREADS` the thread counts to
+# try (comma separated; defaults to powers of 2 up to the number of cores).
+
+log = get_logger("delegates")
+
+AUTO = "auto"
+
+DELEGATE_LIBS: List[str] = [
+    p for p in environ.get("DELEGATE_LIBS", "").split(",") if p.strip()
+]
+DELEGATE_BENCHMARK_RUNS: int = env_int("DELEGATE_BENCHMARK_RUNS", 5, minimum=1)
+DELEGATE_THREADS: List[int] = [
+    int(t) for t in environ.get("DELEGATE_THREADS", "").split(",") if t.strip()
+]
+
+# Delegates can lose some precision (i.e. run in fp16) and quantized kernels
+# can round differently; this much is fine (`INT_ATOL` is in quantization steps,
+# for integer outputs):
+RTOL, ATOL = 1e-2, 1e-3
+INT_ATOL = 1
+
+
+class DelegateSelectionError(Exception):
+    ...
+
+
+class Backend(NamedTuple):
+    name: str
+    # Makes the delegates for an interpreter (fresh ones for every interpreter):
+    delegates: Callable[[], Optional[List[Delegate]]]
+    # `OpResolverType` to use, if not the runtime's default:
+    resolver: Optional[Any] = None
+    # Whether the interpreter's thread count is worth tuning:
+    threaded: bool = True
+    # Whether there's only one of the underlying device and it only holds one
+    # model at a time (models take turns on it; see `multiplex.py`):
+    exclusive: bool = False
+
+
+class Trial(NamedTuple):
+    backend: str
+    num_threads: Optional[int]
+    # Median time per invoke; None if the configuration didn't work:
+    median_ms: Optional[float]
+    error: Optional[str] = None
+
+
+class Selection(NamedTuple):
+    backend: Backend
+    num_threads: Optional[int]
+    # Empty unless the backend was picked by benchmarking:
+    trials: List[Trial] = []
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register(backend: Backend) -> None:
+    BACKENDS[backend.name] = backend
+
+
+def _library(path: str) -> Backend:
+    def delegates() -> List[Delegate]:
+        try:
+            return [load_delegate(path)]
+        except ValueError as e:
+            raise InvalidDelegateLibrary(f"Error while loading `{path}`: {e}")
+
+    return Backend(splitext(basename(path))[0], delegates)
+
+
+if OpResolverType is not None:
+    register(
+        Backend(
+            "cpu",
+            lambda: None,
+            resolver=OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES,
+        )
+    )
+    register(Backend("xnnpack", lambda: None))
+else:
+    register(Backend("cpu", lambda: None))
+
+if NCORE_PRESENT:
+    register(
+        Backend("ncore", get_ncore_delegate_instance, threaded=False, exclusive=True)
+    )
+
+for _path in DELEGATE_LIBS:
+    register(_library(_path))
+
+
+def default_backend() -> Backend:
+    for name in ("ncore", "xnnpack", "cpu"):
+        if name in BACKENDS:
+            return BACKENDS[name]
+
+    raise AssertionError("The `cpu` backend is always registered.")
+
+
+def interpreter_args(backend: Backend, num_threads: Optional[int]) -> Dict[str, Any]:
+    """
+    :raises InvalidDelegateLibrary: If the backend's delegate can't be loaded.
+
+    Arguments for the `Interpreter` constructor (other than the model).
+    """
+    args: Dict[str, Any] = {"experimental_delegates": backend.delegates()}
+
+    if backend.resolver is not None:
+        args["experimental_op_resolver_type"] = backend.resolver
+
+    if num_threads is not None and SUPPORTS_NUM_THREADS:
+        args["num_threads"] = num_threads
+    elif num_threads is not None:
+        log.warning("This runtime can't set a thread count; using its default.")
+
+    return args
+
+
+def thread_counts(
+    backend: Backend, num_threads: Optional[int], cpus: int
+) -> List[Optional[int]]:
+    """The thread counts worth trying for a backend."""
+    if num_threads or not backend.threaded or not SUPPORTS_NUM_THREADS:
+        return [num_threads]
+    if DELEGATE_THREADS:
+        return list(DELEGATE_THREADS)
+
+    counts: List[Optional[int]] = []
+    n = 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+
+    return counts + [cpus]
+
+
+def _time(run: Callable[[], Any], runs: int) -> float:
+    times = []
+    for _ in range(max(runs, 1)):
+        begin = perf_counter_ns()
+        run()
+        times.append((perf_counter_ns() - begin) / 1e6)
+
+    return float(np.median(times))
+
+
+def _trial(
+    model: Dict[str, Any],
+    backend: Backend,
+    num_threads: Optional[int],
+    inputs: Optional[List[np.ndarray]],
+    runs: int,
+) -> Tuple[List[np.ndarray], float, List[np.ndarray]]:
+    """
+    Runs the model on a backend; returns the outputs, the median time, and the
+    inputs (random ones, unless given).
+    """
+    interp = Interpreter(**model, **interpreter_args(backend, num_threads))
+    interp.allocate_tensors()
+
+    tensors = random_inputs(interp.get_input_details()) if inputs is None else inputs
+
+    # Also a warm up run:
+    outputs = run_once(interp, tensors)
+    return outputs, _time(lambda: run_once(interp, tensors), runs), tensors
+
+
+def select(
+    model: Dict[str, Any],
+    num_threads: Optional[int] = None,
+    cpus: Optional[int] = None,
+    runs: int = DELEGATE_BENCHMARK_RUNS,
+    backends: Optional[List[Backend]] = None,
+) -> Selection:
+    """
+    :raises DelegateSelectionError: When none of the backends can run the model.
+
+    Benchmarks every backend (at each thread count worth trying, unless
+    `num_threads` is given) on the model (`model_content` or `model_path`, as
+    for `Interpreter`) and returns the fastest one whose outputs agree with the
+    first backend's (which should be `cpu`).
+    """
+    backends = list(BACKENDS.values()) if backends is None else backends
+    cpus = cpus or len(available_cpus())
+
+    trials: List[Trial] = []
+    reference: Optional[List[np.ndarray]] = None
+    reference_name = ""
+    inputs: Optional[List[np.ndarray]] = None
+    best: Optional[Selection] = None
+    best_ms = float("inf")
+
+    for backend in backends:
+        for threads in thread_counts(backend, num_threads, cpus):
+            trial = Trial(backend.name, threads, None)
+
+            try:
+                if backend.exclusive:
+                    # Other models might be using the device:
+                    with multiplexer(backend.name).hold():
+                        outputs, ms, inputs = _trial(
+                            model, backend, threads, inputs, runs
+                        )
+                else:
+                    outputs, ms, inputs = _trial(model, backend, threads, inputs, runs)
+            except (RuntimeError, ValueError, InvalidDelegateLibrary) as e:
+                trials.append(trial._replace(error=f"failed to run: {e}"))
+                continue
+
+            if reference is None:
+                reference, reference_name = outputs, backend.name
+            elif len(outputs) != len(reference) or not all(
+                outputs_agree(o, r, RTOL, ATOL, INT_ATOL)
+                for o, r in zip(outputs, reference)
+            ):
+                trials.append(
+                    trial._replace(
+                        median_ms=ms, error=f"outputs differ from {reference_name}"
+                    )
+                )
+                continue
+
+            trials.append(trial._replace(median_ms=ms))
+            if ms < best_ms:
+                best, best_ms = Selection(backend, threads), ms
+
+    if best is None:
+        raise DelegateSelectionError(
+            "None of the backends could run the model: "
+            + "; ".join(f"{t.backend}: {t.error}" for t in trials)
+        )
+
+    log.info(
+        "Picked %s (%s threads); %s",
+        best.backend.name,
+        best.num_threads or "default",
+        ", ".join(
+            f"{t.backend}/{t.num_threads or '-'}: "
+            + (f"{t.median_ms:.2f}ms" if t.error is None else t.error)
+            for t in trials
+        ),
+    )
+    return best._replace(trials=trials)
@@ -0,0 +1,73 @@
+from os import environ
+from typing import Callable, Optional, TypeVar
+
+from .debug import get_logger
+
+# Numeric options from environment variables.
+#
+# A typo in an option shouldn't stop the server from starting (or, for options
+# that are read when a module is first imported, break an import somewhere
+# unexpected); values that don't parse or are out of range get a warning and
+# the default instead.
+
+log = get_logger("config")
+
+N = TypeVar("N", int, float)
+
+
+def _number(
+    name: str,
+    default: N,
+    parse: Callable[[str], N],
+    minimum: Optional[N],
+    maximum: Optional[N],
+) -> N:
+    raw = environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+
+    try:
+        value = parse(raw.strip())
+    except ValueError:
+        value = None
+
+    if minimum is None:
+        expected = "a number" if maximum is None else f"at most {maximum}"
+    else:
+        expected = (
+            f"at least {minimum}" if maximum is None else f"{minimum} to {maximum}"
+        )
+
+    # (NaNs fail every comparison, so the range checks would let them through)
+    if (
+        value is None
+        or value != value
+        or (minimum is not None and value < minimum)
+        or (maximum is not None and value > maximum)
+    ):
+        log.warning(
+            "Ignoring `%s=%s` (expected %s); using %s.", name, raw, expected, default
+        )
+        return default
+
+    return value
+
+
+def env_int(
+    name: str,
+    default: int,
+    minimum: Optional[int] = None,
+    maximum: Optional[int] = None,
+) -> int:
+    """`name`'s value as an int in [minimum, maximum]; `default` if it isn't one."""
+    return _number(name, default, int, minimum, maximum)
+
+
+def env_float(
+    name: str,
+    default: float,
+    minimum: Optional[float] = None,
+    maximum: Optional[float] = None,
+) -> float:
+    """`name`'s value as a float in [minimum, maximum]; `default` if it isn't one."""
+    return _number(name, default, float, minimum, maximum)
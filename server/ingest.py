@@ -0,0 +1,259 @@
+import json
+import posixpath
+import zipfile
+from os import makedirs
+from os.path import dirname, join
+from time import perf_counter_ns
+from typing import BinaryIO, Callable, Dict, Optional, Union
+from urllib.request import urlopen
+
+from .debug import get_logger
+from .env import env_int
+
+# Getting models onto disk, for conversion (see `types/model.py`).
+#
+# Every source goes straight to where the conversion wants it: downloads are
+# streamed to their destination, inline (`FromBytes`) models are written once
+# (archives aren't written at all; they're read from memory) and archives on
+# disk are read in place. Only the archive members the model's format needs get
+# extracted (see the layouts below), also streamed.
+#
+# Sizes are checked as bytes arrive, not against what headers (HTTP or zip)
+# claim:
+#   - `MAX_MODEL_BYTES`: the most a model can take, as sent (a download, an
+#     upload or a zip file)
+#   - `MAX_EXTRACTED_BYTES`: the most an archive can expand to
+#
+# Inline models arrive inside a protobuf message, which is parsed in full before
+# we see it; for those the limit only saves us writing them out.
+
+log = get_logger("ingest")
+
+MAX_MODEL_BYTES: int = env_int("MAX_MODEL_BYTES", 2 << 30, minimum=1)
+MAX_EXTRACTED_BYTES: int = env_int("MAX_EXTRACTED_BYTES", 8 << 30, minimum=1)
+
+CHUNK_BYTES = 1 << 20
+
+# Archive member name => where to put it (relative to the extraction directory):
+Layout = Dict[str, str]
+LayoutFunc = Callable[[zipfile.ZipFile], Layout]
+
+
+class ModelTooLarge(Exception):
+    ...
+
+
+class InvalidArchive(Exception):
+    ...
+
+
+class Ingestion:
+    """How much was read and written getting a model onto disk."""
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_MODEL_BYTES,
+        max_extracted_bytes: int = MAX_EXTRACTED_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_extracted_bytes = max_extracted_bytes
+
+        self.received_bytes = 0
+        self.extracted_bytes = 0
+        self.written_bytes = 0
+        # Archive members that weren't needed (uncompressed sizes):
+        self.skipped_bytes = 0
+        self.ns = 0
+
+    def receive(self, n: int) -> None:
+        """:raises ModelTooLarge: Past `max_bytes`."""
+        self.received_bytes += n
+        if self.received_bytes > self.max_bytes:
+            raise ModelTooLarge(
+                f"Models can be at most {self.max_bytes} bytes (as sent); got more "
+                f"than that."
+            )
+
+    def extract(self, n: int) -> None:
+        """:raises ModelTooLarge: Past `max_extracted_bytes`."""
+        self.extracted_bytes += n
+        if self.extracted_bytes > self.max_extracted_bytes:
+            raise ModelTooLarge(
+                f"Archives can expand to at most {self.max_extracted_bytes} bytes; "
+                f"this one expands to more than that."
+            )
+
+
+def _copy(src: BinaryIO, path: str, count: Callable[[int], None]) -> int:
+    """Streams `src` to a new file at `path`, calling `count` on every chunk."""
+    written = 0
+    with open(path, "wb") as dst:
+        while True:
+            chunk = src.read(CHUNK_BYTES)
+            if not chunk:
+                return written
+
+            count(len(chunk))
+            dst.write(chunk)
+            written += len(chunk)
+
+
+def save(data: bytes, path: str, ingestion: Ingestion) -> None:
+    """:raises ModelTooLarge: If `data` is."""
+    begin = perf_counter_ns()
+    ingestion.receive(len(data))
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+    ingestion.written_bytes += len(data)
+    ingestion.ns += perf_counter_ns() - begin
+
+
+def fetch(url: str, path: str, ingestion: Ingestion) -> None:
+    """
+    :raises ModelTooLarge: Once the download passes the limit (what's been
+                           downloaded so far is left at `path`).
+    :raises URLError: If the download fails.
+    :raises ValueError: On invalid URLs.
+    """
+    begin = perf_counter_ns()
+    with urlopen(url) as response:
+        ingestion.written_bytes += _copy(response, path, ingestion.receive)
+
+    ingestion.ns += perf_counter_ns() - begin
+
+
+def _member_path(directory: str, name: str) -> str:
+    """:raises InvalidArchive: On paths that escape `directory`."""
+    path = posixpath.normpath(name)
+    if posixpath.isabs(path) or path == ".." or path.startswith("../"):
+        raise InvalidArchive(f"Archive member `{name}` is outside of the archive.")
+
+    return join(directory, *path.split("/"))
+
+
+def extract(
+    archive: Union[str, BinaryIO],
+    directory: str,
+    layout: LayoutFunc,
+    ingestion: Ingestion,
+    size: Optional[int] = None,
+) -> None:
+    """
+    :raises ModelTooLarge: If the archive (`size` bytes, if given) or what it
+                           expands to is too large.
+    :raises InvalidArchive: If the archive doesn't have what `layout` needs in
+                            it or has members with unsafe paths.
+    :raises zipfile.BadZipFile: If `archive` isn't a zip file.
+
+    Extracts the members of a zip file (a path or a file object) that `layout`
+    picks into `directory`.
+    """
+    begin = perf_counter_ns()
+    if size is not None:
+        ingestion.receive(size)
+
+    with zipfile.ZipFile(archive, mode="r") as z:
+        members = layout(z)
+        infos = z.infolist()
+
+        for info in infos:
+            if info.filename not in members:
+                ingestion.skipped_bytes += info.file_size
+                continue
+
+            path = _member_path(directory, members[info.filename])
+            makedirs(dirname(path), exist_ok=True)
+
+            with z.open(info) as src:
+                ingestion.written_bytes += _copy(src, path, ingestion.extract)
+
+    ingestion.ns += perf_counter_ns() - begin
+    log.debug(
+        "Extracted %d of %d archive members (%d bytes; skipped %d).",
+        sum(i.filename in members for i in infos),
+        len(infos),
+        ingestion.extracted_bytes,
+        ingestion.skipped_bytes,
+    )
+
+
+# Layouts: which members each kind of model needs, and where they go.
+
+
+def _files(z: zipfile.ZipFile) -> Dict[str, str]:
+    """Members that are files, minus OS clutter; by name."""
+    return {
+        i.filename: i.filename
+        for i in z.infolist()
+        if not i.is_dir()
+        and not i.filename.startswith("__MACOSX/")
+        and posixpath.basename(i.filename) not in (".DS_Store", "Thumbs.db")
+    }
+
+
+def _rooted_at(files: Dict[str, str], root: str) -> Dict[str, str]:
+    """Members under `root`, relative to it."""
+    prefix = f"{root}/" if root else ""
+    return {n: n[len(prefix) :] for n in files if n.startswith(prefix)}
+
+
+def everything(z: zipfile.ZipFile) -> Layout:
+    return _files(z)
+
+
+def saved_model(z: zipfile.ZipFile) -> Layout:
+    """
+    :raises InvalidArchive: If there's no `saved_model.pb(txt)`.
+
+    The graph, variables and assets of a SavedModel; the model's folder can be
+    anywhere in the archive (i.e. zipped with its folder or from inside it).
+    """
+    files = _files(z)
+    graphs = [
+        n
+        for n in files
+        if posixpath.basename(n) in ("saved_model.pb", "saved_model.pbtxt")
+    ]
+    if not graphs:
+        raise InvalidArchive("There's no `saved_model.pb` in the archive.")
+
+    root = posixpath.dirname(min(graphs, key=lambda n: n.count("/")))
+    return {
+        n: rel
+        for n, rel in _rooted_at(files, root).items()
+        if ("/" not in rel and rel.startswith("saved_model."))
+        or rel.split("/")[0] in ("variables", "assets", "assets.extra")
+    }
+
+
+def tfjs_layers(model_name: str) -> LayoutFunc:
+    """
+    The `model.json` of a TFJS layers model (renamed to `model_name`) and the
+    weight shards it lists.
+    """
+
+    def layout(z: zipfile.ZipFile) -> Layout:
+        """:raises InvalidArchive: If there's no model JSON file."""
+        for name in sorted(_files(z), key=lambda n: n.count("/")):
+            if not name.endswith(".json"):
+                continue
+
+            try:
+                with z.open(name) as f:
+                    model = json.load(f)
+                shards = [p for w in model["weightsManifest"] for p in w["paths"]]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            root = posixpath.dirname(name)
+            layout = {name: model_name}
+            for shard in shards:
+                layout[posixpath.join(root, shard) if root else shard] = shard
+
+            return layout
+
+        raise InvalidArchive("There's no TFJS layers model (`model.json`) in it.")
+
+    return layout
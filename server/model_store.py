@@ -1,26 +1,47 @@
 import os
-import time
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
 from functools import reduce
+from tempfile import mkstemp
+from time import perf_counter_ns
 from typing import Any, Callable, Dict, Iterable, List
 from typing import NoReturn as Never
 from typing import Optional, Tuple, TypeVar, Union, cast
 
 import numpy as np
-import tensorflow as tf
 
-from .debug import dprint, if_debug
-from .ncore import NCORE_PRESENT, Delegate, get_ncore_delegate_instance, if_ncore
+from .affinity import pin, pinned
+from .cache import Digest, ResultCache, digest_tensors
+from .cancellation import Cancelled, CancelToken
+from .debug import dprint, get_logger
+from .delegates import (
+    AUTO,
+    BACKENDS,
+    DelegateSelectionError,
+    Selection,
+    default_backend,
+    interpreter_args,
+    select,
+)
+from .env import env_int
+from .multiplex import multiplexer
+from .ncore import Delegate
+from .options import ModelOptions
+from .postprocess import PostProcessError, PostProcessor
+from .profiling import InputShapes, OpProfile, background, profile_ops
+from .rewrite import RewriteError, make_batch_dynamic, verify_native_batching
+from .runtime import RUNTIME, Interpreter, InterpreterType, random_inputs
 from .types import MODEL_DIR
-from .types.metrics import Metrics
+from .types.metrics import FETCH, INVOKE, POST_PROCESS, RESIZE, VALIDATE, Metrics
 from .types.model import LocalHandle as Handle
 
-dprint(f"TF Version: {tf.__version__}")
-# tf.compat.v1.enable_eager_execution()
-_: None = if_debug(
-    lambda: tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.DEBUG)
-)
+dprint(f"TFLite runtime: {RUNTIME}")
+
+log = get_logger("model")
 
-Interpreter = tf.lite.Interpreter
+# Upper bound on interpreter replicas per model (see `ModelOptions.replicas`):
+MAX_REPLICAS: int = env_int("MAX_REPLICAS", 0, minimum=0) or (os.cpu_count() or 1)
 
 Error = str
 Tensor = np.ndarray
@@ -52,6 +73,13 @@ class TensorTypeError(Exception):
 
 
 # Can't raise exceptions in lambdas!
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 def raise_err(err: Exception) -> Never:
     raise err
 
@@ -65,7 +93,13 @@ def equal_or_error(expected: T, actual: T, msg: str, ex: Callable[[str], Any]) -
 
 
 class LocalModel:
-    def __init__(self, model: Optional[bytes] = None, path: Optional[str] = None):
+    def __init__(
+        self,
+        model: Optional[bytes] = None,
+        path: Optional[str] = None,
+        post_process: Optional[PostProcessor] = None,
+        options: ModelOptions = ModelOptions(),
+    ):
         """
         :raises ModelRegisterError: When given obviously incorrect models.
         """
@@ -77,6 +111,19 @@ class LocalModel:
         # loaded if self.model isn't set.
         self.path: Optional[str] = path
 
+        # Optional stage that's run on the model's outputs before they're
+        # returned (i.e. PoseNet decoding).
+        self.post_process: Optional[PostProcessor] = post_process
+
+        self.options: ModelOptions = options
+
+        # Opt-in cache of results (post processing included):
+        self.cache: Optional[ResultCache] = (
+            ResultCache(options.cache_entries, options.cache_ttl)
+            if options.cache_entries > 0
+            else None
+        )
+
         from_str, from_file = self.model is not None, self.path is not None
 
         # Validate the options we were passed:
@@ -90,7 +137,59 @@ class LocalModel:
             ),
         }[(from_str, from_file)]()
 
-        self.interp: Optional[tf.lite.Interpreter] = None
+        self.interp: Optional[InterpreterType] = None
+
+        # Whether the model was rewritten to batch natively (see `rewrite.py`);
+        # None until we've tried, which we only do if the options ask for it:
+        self.native_batching: Optional[bool] = None
+        self._batched_model: Optional[bytes] = None
+
+        # The backend the model runs on and its thread count (and, if they were
+        # benchmarked, the numbers; see `delegates.py`); set on load:
+        self.delegate: Optional[Selection] = None
+        # Where requests go when the device is busy with other models (only
+        # for backends like that; see `_run`):
+        self._cpu: Optional[LocalModel] = None
+
+        # Interpreters aren't thread safe; one request at a time (replicas
+        # included: they're only used by the request holding the lock):
+        self._lock = threading.RLock()
+
+        # Extra interpreters that manual batches are split across, and the
+        # threads that run them (see `_run_batch`):
+        self._replicas: List[InterpreterType] = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+        # Number of times we've had to (re)allocate the interpreter's tensors:
+        self.reallocations: int = 0
+
+        # Per-op timings (for traces), by input shapes:
+        self._op_profiles: Dict[Tuple[Any, ...], List[OpProfile]] = {}
+        # Waiting on profiles that are being worked out:
+        self._profiling: Dict[
+            Tuple[Any, ...], List[Callable[[List[OpProfile]], None]]
+        ] = {}
+        self._model_file: Optional[str] = None
+
+    def file_bytes(self) -> int:
+        """
+        Size of the model's flatbuffer (in memory or on disk); 0 if we can't
+        tell. Not what the interpreters allocate, which the runtime doesn't say.
+        """
+        if self.model is not None:
+            return len(self.model)
+
+        try:
+            return os.path.getsize(cast(str, self.path))
+        except OSError:
+            return 0
+
+    def num_threads(self) -> Optional[int]:
+        """Threads each of the model's interpreters get; None for the default."""
+        if self.delegate is not None:
+            return self.delegate.num_threads
+
+        return self.options.num_threads or len(self.options.cpus) or None
 
     def _check_bytes_model(self) -> None:
         """
@@ -116,43 +215,120 @@ class LocalModel:
                 f"File ({self.path}) doesn't seem to be a TFLite model."
             )
 
-    def _prepare_interpreter(self) -> None:
+    def _prepare_interpreter(self, metrics: Optional[Metrics] = None) -> None:
         """
         :raises ModelLoadError: When the given model cannot be loaded.
         """
         # If we have yet to create an interpreter for this model..
         if self.interp is None:
-            # ..do so:
-            try:
-                delegate = if_ncore(get_ncore_delegate_instance)
+            if self.options.native_batching and self.native_batching is None:
+                self._rewrite_for_native_batching()
+            if self.delegate is None:
+                self.delegate = self._select_delegate()
 
-                # From a string, if we've got it:
-                if self.model is not None:
-                    self.interp = Interpreter(
-                        model_content=self.model, experimental_delegates=delegate
-                    )
-                # If not, try a file if we've got one:
-                elif self.path is not None:
-                    self.interp = Interpreter(
-                        model_path=self.path, experimental_delegates=delegate
-                    )
-                # Failing that, bail:
-                else:
-                    raise ModelLoadError(
-                        "Internal Error! Got a model without a path or"
-                        " data (this isn't supposed to be possible)."
-                    )
-            except RuntimeError as e:
-                raise ModelLoadError(
-                    f"Failed to load the model. Got: `{e}`."
-                    f"(model = `{self.model}`, path = `{self.path}`)"
-                )
+            # ..do so:
+            self.interp = self._new_interpreter()
 
+            begin = perf_counter_ns()
             self.interp.allocate_tensors()
+            self.reallocations += 1
+
+            if metrics is not None:
+                end = perf_counter_ns()
+                metrics.add_time(RESIZE, end - begin).span(RESIZE, begin, end)
 
             dprint("Loaded new model.")
 
-    def _resize_internal(self, idx: int, shape: Tuple[int, ...]) -> None:
+    def _source(self) -> Dict[str, Any]:
+        """The model, as arguments for the `Interpreter` constructor."""
+        # The rewritten model, if we've got one:
+        if self._batched_model is not None:
+            return {"model_content": self._batched_model}
+        # From a string, if we've got it:
+        elif self.model is not None:
+            return {"model_content": self.model}
+        # If not, try a file if we've got one:
+        elif self.path is not None:
+            return {"model_path": self.path}
+        # Failing that, bail:
+        else:
+            raise ModelLoadError(
+                "Internal Error! Got a model without a path or"
+                " data (this isn't supposed to be possible)."
+            )
+
+    def _select_delegate(self) -> Selection:
+        """
+        :raises ModelLoadError: When benchmarking finds no backend that works.
+        """
+        name = self.options.delegate
+        if name != AUTO:
+            backend = BACKENDS[name] if name else default_backend()
+            return Selection(backend, self.num_threads())
+
+        try:
+            return select(
+                self._source(),
+                self.options.num_threads or None,
+                len(self.options.cpus) or None,
+            )
+        except DelegateSelectionError as e:
+            raise ModelLoadError(str(e))
+
+    def _new_interpreter(self) -> InterpreterType:
+        """
+        :raises ModelLoadError: When the given model cannot be loaded.
+        :raises InvalidDelegateLibrary: When the backend's delegate won't load.
+
+        Tensors aren't allocated yet.
+        """
+        assert self.delegate is not None
+
+        try:
+            return Interpreter(
+                **self._source(),
+                **interpreter_args(self.delegate.backend, self.delegate.num_threads),
+            )
+        except RuntimeError as e:
+            raise ModelLoadError(
+                f"Failed to load the model. Got: `{e}`."
+                f"(model = `{self.model}`, path = `{self.path}`)"
+            )
+
+    def _rewrite_for_native_batching(self) -> None:
+        """
+        :raises ModelLoadError: When the model file can't be read.
+        """
+        try:
+            if self.model is not None:
+                data = self.model
+            else:
+                with open(cast(str, self.path), "rb") as f:
+                    data = f.read()
+        except OSError as e:
+            raise ModelLoadError(f"Failed to read the model. Got: `{e}`.")
+
+        problem: Optional[str]
+        try:
+            rewritten, changed = make_batch_dynamic(data)
+            problem = (
+                verify_native_batching(data, rewritten)
+                if changed
+                else "there was nothing to rewrite"
+            )
+        except (RewriteError, RuntimeError, ValueError) as e:
+            problem = str(e)
+
+        self.native_batching = problem is None
+        if problem is None:
+            self._batched_model = rewritten
+            log.info("Rewrote the model (%d shape(s)) to batch natively.", changed)
+        else:
+            log.info("Not batching natively: %s", problem)
+
+    def _resize_internal(
+        self, idx: int, shape: Tuple[int, ...], metrics: Metrics
+    ) -> None:
         """
         :raises RuntimeError: When the interpreter is unable to resize the tensors.
         """
@@ -163,13 +339,19 @@ class LocalModel:
         input_index = input_details["index"]
 
         if current_shape != shape:
-            dprint(f"Attempting to resize `{current_shape}` to `{shape}`..")
-            self.interp.resize_tensor_input(input_index, shape)
-            self.interp.allocate_tensors()
-            dprint("Success!")
+            log.debug("Attempting to resize `%s` to `%s`..", current_shape, shape)
+            with metrics.timed(RESIZE):
+                self.interp.resize_tensor_input(input_index, shape)
+                self.interp.allocate_tensors()
+            self.reallocations += 1
+            log.debug("Success!")
 
     def _resize(
-        self, idx: int, shape: Tuple[int, ...], backup: Optional[Tuple[int, ...]] = None
+        self,
+        idx: int,
+        shape: Tuple[int, ...],
+        metrics: Metrics,
+        backup: Optional[Tuple[int, ...]] = None,
     ) -> bool:
         """
         :raises RuntimeError: When the interpreter is unable to resize the tensors.
@@ -188,7 +370,7 @@ class LocalModel:
 
         # Try the first shape:
         try:
-            self._resize_internal(idx, shape)
+            self._resize_internal(idx, shape, metrics)
             return False
         except RuntimeError as e:
             if backup is None:
@@ -196,12 +378,14 @@ class LocalModel:
 
         # Try the second shape:
         try:
-            self._resize_internal(idx, backup)
+            self._resize_internal(idx, backup, metrics)
             return True
         except RuntimeError as e:
             throw(backup, e)
 
-    def _check_tensor(self, idx: int, tensor: Tensor) -> Tuple[Tensor, int]:
+    def _check_tensor(
+        self, idx: int, tensor: Tensor, metrics: Metrics
+    ) -> Tuple[Tensor, int]:
         """
         :raises TensorTypeError: When the given tensor cannot be used.
         """
@@ -216,7 +400,7 @@ class LocalModel:
             or dtype == np.int16
             or dtype == np.int64
         ) and tensor.dtype == np.int32:
-            dprint(f"Warning: Casting tensor elements from {tensor.dtype} to {dtype}!")
+            log.debug("Casting tensor elements from %s to %s!", tensor.dtype, dtype)
             tensor = tensor.astype(dtype)
 
         # Check the tensor's data type:
@@ -238,7 +422,7 @@ class LocalModel:
         # original shape), we'll try to load the input tensor as a batch:
         if rank == def_rank + 1 and shape[1:] == def_shape:
             # Try native batches and manual batches as a backup:
-            if self._resize(idx, shape, shape[1:]):
+            if self._resize(idx, shape, metrics, shape[1:]):
                 # If we're going with manual batches:
                 manual_batch_size = shape[0]
 
@@ -252,7 +436,7 @@ class LocalModel:
             and def_shape[0] == 1
         ):
             # Native batches or manual batches if that doesn't work:
-            if self._resize(idx, shape, def_shape):
+            if self._resize(idx, shape, metrics, def_shape):
                 # If manual batches:
                 manual_batch_size = shape[0]
                 tensor = np.reshape(tensor, (shape[0],) + def_shape)
@@ -260,12 +444,12 @@ class LocalModel:
         # If our model is expecting a batch of one, but the input tensor is
         # singular, wrap the input tensor to make it a batch of one:
         elif rank == def_rank - 1 and def_shape[0] == 1 and shape == def_shape[1:]:
-            self._resize(idx, def_shape)
+            self._resize(idx, def_shape, metrics)
             tensor = np.reshape(tensor, def_shape)
 
         # If the input tensor matches the shape we're looking for, use it as is:
         elif shape == def_shape:
-            self._resize(idx, shape)
+            self._resize(idx, shape, metrics)
 
         # Otherwise, we can't use the input tensor:
         else:
@@ -287,68 +471,426 @@ class LocalModel:
         # Finally, if we're not doing manual batching, wrap the tensor in a list
         # so that we can pretend we're making a batch of size 1:
         if manual_batch_size == 0:
-            dprint("Pseudo manual batch")
+            log.debug("Pseudo manual batch")
             tensor = cast(Tensor, [tensor])
             manual_batch_size = 1
         else:
-            dprint(f"Manual batch of size {manual_batch_size}")
+            log.debug("Manual batch of size %d", manual_batch_size)
 
         return tensor, manual_batch_size
 
+    def _replica_count(self, manual_batch_size: int) -> int:
+        # i.e. there's only one NCore, so no point in more interpreters for it:
+        if self.delegate is not None and self.delegate.backend.exclusive:
+            return 1
+
+        return max(1, min(self.options.replicas, manual_batch_size, MAX_REPLICAS))
+
+    def _interpreters(self, count: int) -> List[InterpreterType]:
+        """
+        :raises ModelLoadError: If a replica can't be created.
+
+        The primary interpreter and `count - 1` replicas, with the replicas'
+        input shapes matching the primary's.
+        """
+        assert self.interp is not None
+
+        while len(self._replicas) < count - 1:
+            replica = self._new_interpreter()
+            replica.allocate_tensors()
+            self.reallocations += 1
+            self._replicas.append(replica)
+
+        # The primary has already been resized (or not) to fit the inputs:
+        shapes = [tuple(inp["shape"]) for inp in self.interp.get_input_details()]
+
+        for replica in self._replicas[: count - 1]:
+            resized = False
+            for inp, shape in zip(replica.get_input_details(), shapes):
+                if tuple(inp["shape"]) != shape:
+                    replica.resize_tensor_input(inp["index"], shape)
+                    resized = True
+
+            if resized:
+                replica.allocate_tensors()
+                self.reallocations += 1
+
+        return [self.interp] + self._replicas[: count - 1]
+
+    def _run_elements(
+        self,
+        interp: InterpreterType,
+        batched_tensors: List[Tensor],
+        elements: range,
+        metrics: Metrics,
+        replica: Optional[int] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tuple[List[List[Tensor]], int, int]:
+        """
+        :raises Cancelled: If `cancel` is cancelled before all the elements ran.
+
+        Runs some of a manual batch's elements on an interpreter. Returns the
+        outputs ([num_outputs][num_elements]) and the time spent invoking and
+        fetching.
+        """
+        input_idxs = [inp["index"] for inp in interp.get_input_details()]
+        output_idxs = [out["index"] for out in interp.get_output_details()]
+
+        # Stitched together once we're done so that we don't copy the outputs
+        # we've got so far on every batch:
+        output_parts: List[List[Tensor]] = [[] for _ in output_idxs]
+        invoke_time = fetch_time = 0
+        # The real invokes, on whatever backend the model was loaded with (the
+        # op profile in traces is from a separate run, on the CPU):
+        args: Dict[str, Any] = {} if replica is None else {"replica": replica}
+        if self.delegate is not None:
+            args["backend"] = self.delegate.backend.name
+
+        for done, batch_num in enumerate(elements):
+            if cancel is not None:
+                try:
+                    cancel.check()
+                except Cancelled:
+                    cancel.skip(len(elements) - done)
+                    raise
+
+            for i, input_idx in enumerate(input_idxs):
+                interp.set_tensor(input_idx, batched_tensors[i][batch_num])
+
+            begin = perf_counter_ns()
+            interp.invoke()
+            end = perf_counter_ns()
+            invoke_time += end - begin
+            metrics.span(INVOKE, begin, end, batch_element=batch_num, **args)
+
+            begin = perf_counter_ns()
+            for i, output_idx in enumerate(output_idxs):
+                output_parts[i].append(interp.get_tensor(output_idx))
+            end = perf_counter_ns()
+            fetch_time += end - begin
+            metrics.span(FETCH, begin, end, batch_element=batch_num, **args)
+
+        return output_parts, invoke_time, fetch_time
+
     def _run_batch(
-        self, batched_tensors: List[Tensor], manual_batch_size: int
-    ) -> Tuple[Tensors, Metrics]:
+        self,
+        batched_tensors: List[Tensor],
+        manual_batch_size: int,
+        metrics: Metrics,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tensors:
         """
+        :raises Cancelled: If `cancel` is cancelled partway through.
+
         Takes a list of tensors, each of which is batched.
         As in, batched_tensor: [num_tensors][num_batches][*(nth tensor shape)]
+
+        Manual batches are split between the model's replicas (if it has any),
+        which run in parallel; the interpreter releases the GIL while invoking.
         """
         assert self.interp is not None
 
-        input_idxs = [inp["index"] for inp in self.interp.get_input_details()]
-        output_idxs = [out["index"] for out in self.interp.get_output_details()]
+        count = self._replica_count(manual_batch_size)
 
-        output: List[Optional[Tensor]] = [None for i in range(len(output_idxs))]
-        exec_time = 0.0
+        if count == 1:
+            output_parts, invoke_time, fetch_time = self._run_elements(
+                self.interp,
+                batched_tensors,
+                range(manual_batch_size),
+                metrics,
+                cancel=cancel,
+            )
+        else:
+            interps = self._interpreters(count)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    self.options.replicas - 1,
+                    thread_name_prefix="replica",
+                    initializer=pin,
+                    initargs=(self.options.cpus,),
+                )
 
-        for batch_num in range(manual_batch_size):
-            for i, input_idx in enumerate(input_idxs):
-                self.interp.set_tensor(input_idx, batched_tensors[i][batch_num])
+            # Contiguous chunks, so the outputs just need to be put end to end:
+            bounds = np.linspace(0, manual_batch_size, count + 1).astype(int)
+            chunks = [range(bounds[r], bounds[r + 1]) for r in range(count)]
+
+            futures = [
+                self._pool.submit(
+                    self._run_elements,
+                    interps[r],
+                    batched_tensors,
+                    chunks[r],
+                    metrics,
+                    r,
+                    cancel,
+                )
+                for r in range(1, count)
+            ]
+            try:
+                # We take the first chunk ourselves:
+                results = [
+                    self._run_elements(
+                        interps[0], batched_tensors, chunks[0], metrics, 0, cancel
+                    )
+                ] + [f.result() for f in futures]
+            finally:
+                # Don't hand the replicas to the next request while they're busy
+                # (if we were cancelled, the other replicas stop at their next
+                # element; the token is shared):
+                wait(futures)
+
+            output_parts = [
+                [part for parts, _, _ in results for part in parts[o]]
+                for o in range(len(results[0][0]))
+            ]
+
+            # The chunks ran at the same time; the slowest one is what we waited on:
+            invoke_time = max(r[1] for r in results)
+            fetch_time = max(r[2] for r in results)
+
+        # Outputs with a batch dimension (of 1) get joined along it; outputs
+        # of models without one get a new batch dimension. Which it is comes
+        # from the model's shapes (an output's values can't tell a batch of 1
+        # apart from a dimension that happens to be 1): the model has a batch
+        # dimension if all of its inputs lead with a 1, and so does the output.
+        # (Elements of manual batches are run at the model's own shapes.)
+        leads_with_1 = lambda details: (
+            len(details["shape"]) > 0 and details["shape"][0] == 1
+        )
+        batched = all(leads_with_1(inp) for inp in self.interp.get_input_details())
+        joins = [
+            np.concatenate if batched and leads_with_1(out) else np.stack
+            for out in self.interp.get_output_details()
+        ]
 
-            begin = time.clock()
-            self.interp.invoke()
-            exec_time += time.clock() - begin
+        begin = perf_counter_ns()
+        output: Tensors = [
+            parts[0] if len(parts) == 1 else join(parts)
+            for join, parts in zip(joins, output_parts)
+        ]
+        fetch_time += perf_counter_ns() - begin
 
-            for i, output_idx in enumerate(output_idxs):
-                output_part = self.interp.get_tensor(output_idx)
-                if output[i] is None:
-                    output[i] = output_part
-                else:
-                    output[i] = np.append(output[i], output_part, axis=0)
+        metrics.add_time(INVOKE, invoke_time).add_time(FETCH, fetch_time)
+        metrics.time_to_execute(invoke_time // 1000)  # in microseconds
 
-        metrics = Metrics().time_to_execute(
-            int(exec_time * (10 ** 6))
-        )  # in microseconds
-        # .trace("") # TODO!!
+        return output
 
-        # Appease mypy:
-        for tensor in output:
-            assert tensor is not None
+    def _input_shapes(self) -> Optional[InputShapes]:
+        """The interpreter's current input shapes; None if it's been freed."""
+        with self._lock:
+            if self.interp is None:
+                return None
 
-        return cast(Tensors, output), metrics
+            return [
+                (inp["name"], tuple(int(d) for d in inp["shape"]))
+                for inp in self.interp.get_input_details()
+            ]
+
+    def op_profile(self) -> Optional[List[OpProfile]]:
+        """
+        Per-op timings for the interpreter's current input shapes if we have
+        them already (see `profiling.py`); doesn't wait for them.
+        """
+        inputs = self._input_shapes()
+        if inputs is None:
+            return []
+
+        with self._lock:
+            return self._op_profiles.get(tuple(inputs))
+
+    def profile_ops(
+        self, done: Optional[Callable[[List[OpProfile]], None]] = None
+    ) -> None:
+        """
+        Gets the per-op timings for the interpreter's current input shapes (in
+        the background, with `benchmark_model`; it's slow) if we don't have them
+        yet, and calls `done` (if given) with them once we do.
+
+        `benchmark_model` is always run on the CPU: the device a model runs on
+        (i.e. NCore) may be busy serving, and there's only one of it.
+        """
+        inputs = self._input_shapes()
+        if inputs is None:
+            return
+        key = tuple(inputs)
+
+        with self._lock:
+            if key in self._op_profiles:
+                ops = self._op_profiles[key]
+            elif key in self._profiling:
+                self._profiling[key].extend([done] if done is not None else [])
+                return
+            else:
+                self._profiling[key] = [done] if done is not None else []
+                background(self._profile_ops, key, inputs, self._model_path())
+                return
 
-    def predict(self, tensors: Optional[Tensors]) -> Tuple[Tensors, Metrics]:
+        if done is not None:
+            done(ops)
+
+    def _model_path(self) -> str:
+        """A file with the model in it (`benchmark_model` wants a file)."""
+        if self.model is None:
+            return cast(str, self.path)
+
+        if self._model_file is None:
+            fd, self._model_file = mkstemp(suffix=".tflite")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.model)
+
+            # Gone once we are:
+            weakref.finalize(self, _remove, self._model_file)
+
+        return self._model_file
+
+    def _profile_ops(
+        self, key: Tuple[Any, ...], inputs: InputShapes, path: str
+    ) -> None:
+        ops: List[OpProfile] = []
+        try:
+            ops = profile_ops(path, inputs, num_threads=self.num_threads())
+        finally:
+            with self._lock:
+                self._op_profiles[key] = ops
+                waiting = self._profiling.pop(key)
+
+        for done in waiting:
+            try:
+                done(ops)
+            except Exception as e:
+                log.warning("Couldn't use an op profile: %s", e)
+
+    def warm_up(self, runs: int) -> Tuple[float, float]:
+        """
+        :raises ModelLoadError: If the model cannot be loaded.
+
+        Loads the model and runs it `runs` times on random inputs at its
+        declared shapes, so that the first real request doesn't pay for
+        allocation and the cold first invoke.
+
+        Returns the time the first run took and the best of the rest (in
+        milliseconds; 0 for the latter if there was only one run).
+        """
+
+        def input_details() -> List[Dict[str, Any]]:
+            self._prepare_interpreter()
+            assert self.interp is not None
+            return cast(List[Dict[str, Any]], self.interp.get_input_details())
+
+        inputs = random_inputs(self._run(input_details))
+
+        times: List[float] = []
+        for _ in range(max(runs, 1)):
+            begin = perf_counter_ns()
+            try:
+                # No CPU fallback; it's the device that needs warming up:
+                self._run(lambda: self._predict(inputs, False))
+            except PostProcessError as e:
+                # Random inputs are fine for the interpreter, but not
+                # necessarily for post processing:
+                log.warning("Post processing failed during warm up: %s", e)
+            times.append((perf_counter_ns() - begin) / 1e6)
+
+        return times[0], min(times[1:], default=0.0)
+
+    def predict(
+        self,
+        tensors: Optional[Tensors],
+        trace: bool = False,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tuple[Tensors, Metrics]:
         """
         :raises TensorTypeError: When the given tensor doesn't match the model.
         :raises ModelLoadError: If the given model cannot be loaded.
+        :raises Cancelled: If `cancel` is cancelled before inference is done.
+
+        With `trace` set, the returned metrics also have spans for each stage.
+        `cancel` is checked between batch elements (see `cancellation.py`).
         """
+        return self._run(
+            lambda: self._predict(tensors, trace, cancel),
+            lambda: self._on_cpu().predict(tensors, trace, cancel),
+        )
 
-        # Load the model if it's not already loaded:
-        self._prepare_interpreter()
+    def _run(self, func: Callable[[], T], cpu: Optional[Callable[[], T]] = None) -> T:
+        """
+        :raises ModelLoadError: If the model cannot be loaded.
+
+        Runs `func` with the model's lock held, on the model's cores, and (for
+        backends whose device only holds one model at a time, like NCore) with
+        the model on the device; see `multiplex.py`. `cpu` is what to run
+        instead if waiting for the device would take longer.
+        """
+        with self._lock, pinned(self.options.cpus):
+            if self.delegate is None:
+                self.delegate = self._select_delegate()
+            backend = self.delegate.backend
+
+        def locked() -> T:
+            with self._lock, pinned(self.options.cpus):
+                return func()
+
+        if not backend.exclusive:
+            return locked()
+
+        return multiplexer(backend.name).run(self, locked, cpu)
 
+    def activate(self) -> None:
+        """
+        :raises ModelLoadError: If the model cannot be loaded.
+
+        Puts the model on its device (for `multiplex.py`).
+        """
+        with self._lock, pinned(self.options.cpus):
+            self._prepare_interpreter()
+
+    def deactivate(self) -> None:
+        """Frees the model's interpreter, and with it its spot on the device."""
+        with self._lock:
+            self.interp = None
+            self._replicas = []
+
+    def _on_cpu(self) -> "LocalModel":
+        """A copy of the model that runs on the CPU (sharing our cache)."""
+        with self._lock:
+            if self._cpu is None:
+                self._cpu = LocalModel(
+                    self.model,
+                    self.path,
+                    self.post_process,
+                    self.options._replace(delegate="cpu", cache_entries=0),
+                )
+                self._cpu.cache = self.cache
+
+            return self._cpu
+
+    def _predict(
+        self,
+        tensors: Optional[Tensors],
+        trace: bool,
+        cancel: Optional[CancelToken] = None,
+    ) -> Tuple[Tensors, Metrics]:
         # Check that we actually got something:
         if tensors is None:
             raise TensorTypeError("Got an empty set of input Tensors.")
 
+        metrics = Metrics()
+        if trace:
+            metrics.record_spans()
+
+        # If we've seen these inputs before, we don't need the interpreter:
+        key: Optional[Digest] = None
+        if self.cache is not None:
+            key = digest_tensors(tensors)
+            cached = self.cache.get(key)
+
+            if cached is not None:
+                log.debug("Result cache hit!")
+                return cached, metrics.cache(True, self.cache.hit_rate)
+
+        # Load the model if it's not already loaded:
+        self._prepare_interpreter(metrics)
+
         # mypy doesn't yet know this can't be None after
         # self._prepare_interpreter() is called
         assert self.interp is not None
@@ -365,10 +907,17 @@ class LocalModel:
 
         # Then go check that each of those tensors is valid and matches what the
         # model was expecting:
+        begin, resize_time = perf_counter_ns(), metrics.get_time(RESIZE)
         checked_tensors: List[Tuple[Tensor, int]] = [
-            self._check_tensor(*t) for t in enumerate(tensors)
+            self._check_tensor(i, t, metrics) for i, t in enumerate(tensors)
         ]
 
+        # Checking the tensors involves resizing; don't count that twice:
+        resize_time = metrics.get_time(RESIZE) - resize_time
+        end = perf_counter_ns()
+        metrics.add_time(VALIDATE, end - begin - resize_time)
+        metrics.span(VALIDATE, begin, end, includes_resize_ns=resize_time)
+
         # Here's the tricky bit: batching when we have multiple input tensors.
         # In order for this to work, all the input tensors must agree on the
         # number of manual batches:
@@ -435,26 +984,54 @@ class LocalModel:
 
         batched_tensors: List[Tensor] = [t for t, _ in checked_tensors]
 
-        # And finally, try to run inference:
+        # Next, try to run inference:
         try:
-            return self._run_batch(batched_tensors, manual_batch_sizes[0])
+            outputs = self._run_batch(
+                batched_tensors, manual_batch_sizes[0], metrics, cancel
+            )
+        except Cancelled:
+            raise
         except Exception as e:
             raise Exception(
                 f"Encountered an error while trying to run inference: `{e}`."
             )
 
+        # And finally, run the post processing stage if we've got one:
+        if self.post_process is not None:
+            with metrics.timed(POST_PROCESS):
+                outputs = self.post_process(outputs)
+
+        if self.cache is not None and key is not None:
+            self.cache.put(key, outputs)
+            metrics.cache(False, self.cache.hit_rate)
+
+        return outputs, metrics
+
+
+# (model, path, post processing stage, options)
+ModelIdent = Tuple[
+    Optional[bytes], Optional[str], Optional[PostProcessor], ModelOptions
+]
+
 
 class ModelStore:
     # TODO: why is this annotation required. https://git.io/fjbSz says it isn't.
     def __init__(self) -> None:
         self.models: List[LocalModel] = []
-        self.model_table: Dict[Tuple[Optional[bytes], Optional[str]], Handle] = {}
+        self.model_table: Dict[ModelIdent, Handle] = {}
+
+        # Loads can come from request threads and from warm up at once:
+        self._lock = threading.Lock()
 
     # If we had literal types (const generics) this would be Union[None, False, Handle]
     Check = Union[None, bool, Handle]
 
     def _check_model_store(
-        self, model: Optional[bytes] = None, path: Optional[str] = None
+        self,
+        model: Optional[bytes] = None,
+        path: Optional[str] = None,
+        post_process: Optional[PostProcessor] = None,
+        options: ModelOptions = ModelOptions(),
     ) -> Check:
         """
         Takes the model string/path that we're trying to make a new model with.
@@ -463,13 +1040,8 @@ class ModelStore:
           - False if the model does not already exist
           - a Handle corresponding to the model if it already exists
         """
-        if NCORE_PRESENT and len(self.models) >= 1:
-            # NCore's driver/loadable caching can currently handle 1 model at a time.
-            assert len(self.models) == 1
-            return None
-
         # If we've already loaded this model, return its handle:
-        model_ident: Tuple[Optional[bytes], Optional[str]] = (model, path)
+        model_ident: ModelIdent = (model, path, post_process, options)
         if model_ident in self.model_table:
             return self.model_table[model_ident]
 
@@ -477,11 +1049,20 @@ class ModelStore:
         return False
 
     def _load_or_use_cached(
-        self, check: Check, load_func: Callable[[], LocalModel], model: str
+        self,
+        check: Callable[[], Check],
+        load_func: Callable[[], LocalModel],
+        model: str,
     ) -> Handle:
         """
         :raises ModelStoreFullError: When the model store is unable to load mode models.
         """
+        with self._lock:
+            return self._load_or_use_cached_locked(check(), load_func, model)
+
+    def _load_or_use_cached_locked(
+        self, check: Check, load_func: Callable[[], LocalModel], model: str
+    ) -> Handle:
         if check is None:
             raise ModelStoreFullError(
                 "We're unable to load more models, so we're dropping the load model"
@@ -493,21 +1074,28 @@ class ModelStore:
             idx: Handle = len(self.models) - 1
 
             # Add to the model table:
-            self.model_table[(m.model, m.path)] = idx
+            self.model_table[(m.model, m.path, m.post_process, m.options)] = idx
 
             return idx
         else:
             dprint(f"Using cache for model `{model}`")
             return check
 
-    def load(self, model: bytes) -> Handle:
+    def load(
+        self,
+        model: bytes,
+        post_process: Optional[PostProcessor] = None,
+        options: ModelOptions = ModelOptions(),
+    ) -> Handle:
         """
         :raises ModelRegisterError: When given an obviously incorrect model.
         :raises ModelStoreFullError: When the model store is unable to load more models.
         """
         return self._load_or_use_cached(
-            self._check_model_store(model=model),
-            lambda: LocalModel(model=model),
+            lambda: self._check_model_store(
+                model=model, post_process=post_process, options=options
+            ),
+            lambda: LocalModel(model=model, post_process=post_process, options=options),
             f"<from string with hash '{hash(model)}'>",
         )
 
@@ -517,7 +1105,9 @@ class ModelStore:
         :raises ModelStoreFullError: When the model store is unable to load more models.
         """
         return self._load_or_use_cached(
-            self._check_model_store(path=path), lambda: LocalModel(path=path), path
+            lambda: self._check_model_store(path=path),
+            lambda: LocalModel(path=path),
+            path,
         )
 
     def get(self, handle: Handle) -> LocalModel:
@@ -0,0 +1,231 @@
+import threading
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from .debug import get_logger
+from .env import env_int
+
+# Sharing a device that can only hold one model at a time between models.
+#
+# NCore's driver caches a single loadable, so only one model can have an
+# interpreter on it at once. Rather than refusing to load a second model, the
+# models that run on a device like that (backends marked `exclusive`; see
+# `delegates.py`) take turns: requests queue up for the device, and running a
+# request for a model other than the one that's on the device means swapping
+# it out (dropping its interpreter) and swapping the new one in (making its
+# interpreter, which loads its loadable).
+#
+# Swaps are slow, so:
+#   - queued requests are grouped by model: while the model on the device has
+#     requests waiting they go first, up to `NCORE_GROUP_LIMIT` in a row when
+#     other models are waiting (so that they don't starve)
+#   - when the expected wait for the device (the requests ahead, plus a swap if
+#     one is needed) is longer than running on the CPU takes, the request runs
+#     on a CPU interpreter instead; the first time a model would need a swap,
+#     it goes to the CPU so that we know how long that takes
+#
+# Requests run on the threads that made them; there's no dispatcher thread.
+
+log = get_logger("multiplex")
+
+NCORE_GROUP_LIMIT: int = env_int("NCORE_GROUP_LIMIT", 8, minimum=1)
+
+# Weight of the newest sample in the moving averages of run/swap times:
+ALPHA = 0.2
+
+T = TypeVar("T")
+
+# Anything with `activate` (put yourself on the device) and `deactivate` (free
+# your spot on it) methods; `LocalModel` in practice:
+Tenant = Any
+
+
+class Stats:
+    """Per model numbers; times are moving averages in ms (None until seen)."""
+
+    def __init__(self) -> None:
+        self.device_ms: Optional[float] = None
+        self.cpu_ms: Optional[float] = None
+        self.swap_ms: Optional[float] = None
+
+        self.device_runs = 0
+        self.cpu_runs = 0
+        self.swaps = 0
+
+    def record(self, kind: str, ms: float) -> None:
+        old: Optional[float] = getattr(self, kind)
+        setattr(self, kind, ms if old is None else ALPHA * ms + (1 - ALPHA) * old)
+
+
+class _Job:
+    __slots__ = ("tenant", "turn")
+
+    def __init__(self, tenant: Optional[Tenant]):
+        self.tenant = tenant
+        self.turn = False
+
+
+class Multiplexer:
+    def __init__(self, name: str, group_limit: int = NCORE_GROUP_LIMIT):
+        self.name = name
+        self.group_limit = max(group_limit, 1)
+
+        self._cond = threading.Condition()
+        self._queue: List[_Job] = []
+        self._busy = False
+        # The tenant that's on the device and how many of its requests have
+        # run in a row while others were waiting:
+        self._active: Optional[Tenant] = None
+        self._streak = 0
+
+        self._stats: Dict[int, Stats] = {}
+
+    def stats(self, tenant: Tenant) -> Stats:
+        with self._cond:
+            return self._stats.setdefault(id(tenant), Stats())
+
+    @property
+    def active(self) -> Optional[Tenant]:
+        return self._active
+
+    def _expected_wait_ms(self, tenant: Tenant) -> float:
+        """Until a new request for `tenant` would be done running on the device."""
+        ms = lambda t, kind: getattr(self._stats.get(id(t)), kind, None) or 0.0
+
+        wait = ms(self._active, "device_ms") if self._busy else 0.0
+        wait += sum(ms(j.tenant, "device_ms") for j in self._queue)
+        # Requests ahead of us for other models will swap them in (and we'll
+        # have to swap ourselves back in):
+        if any(j.tenant is not tenant for j in self._queue):
+            wait += sum(ms(t, "swap_ms") for t in {j.tenant for j in self._queue})
+
+        if self._active is not tenant:
+            wait += ms(tenant, "swap_ms")
+
+        return wait + ms(tenant, "device_ms")
+
+    def _offload(self, tenant: Tenant) -> bool:
+        """Whether to run on the CPU rather than wait for the device."""
+        if self._active is tenant and not self._busy and not self._queue:
+            return False
+
+        stats = self._stats.setdefault(id(tenant), Stats())
+        if stats.cpu_ms is None:
+            # Find out what the CPU's like when we'd otherwise have to swap:
+            return self._active is not None and self._active is not tenant
+
+        return stats.cpu_ms < self._expected_wait_ms(tenant)
+
+    def _dispatch(self) -> None:
+        """Gives the device to the next job, if it's free. Hold `_cond`."""
+        if self._busy or not self._queue:
+            return
+
+        others = [j for j in self._queue if j.tenant is not self._active]
+        same = [j for j in self._queue if j.tenant is self._active]
+
+        if same and (not others or self._streak < self.group_limit):
+            job = same[0]
+            self._streak = self._streak + 1 if others else 0
+        else:
+            job = others[0]
+            self._streak = 0
+
+        self._queue.remove(job)
+        self._busy, job.turn = True, True
+        self._cond.notify_all()
+
+    def _acquire(self, job: _Job) -> None:
+        with self._cond:
+            self._queue.append(job)
+            self._dispatch()
+            while not job.turn:
+                self._cond.wait()
+
+    def _release(self) -> None:
+        with self._cond:
+            self._busy = False
+            self._dispatch()
+
+    def _swap_in(self, tenant: Optional[Tenant]) -> None:
+        """Puts `tenant` on the device; call with the device held."""
+        if self._active is tenant:
+            return
+
+        begin = perf_counter_ns()
+        if self._active is not None:
+            self._active.deactivate()
+            self._active = None
+
+        if tenant is not None:
+            tenant.activate()
+            self._active = tenant
+
+            stats = self.stats(tenant)
+            stats.swaps += 1
+            stats.record("swap_ms", (perf_counter_ns() - begin) / 1e6)
+            log.debug("Swapped a model onto %s (swap #%d).", self.name, stats.swaps)
+
+    def run(
+        self,
+        tenant: Tenant,
+        func: Callable[[], T],
+        cpu: Optional[Callable[[], T]] = None,
+    ) -> T:
+        """
+        Runs `func` with `tenant` on the device, or `cpu` (if given) when that's
+        expected to be quicker than waiting for the device.
+        """
+        with self._cond:
+            offload = cpu is not None and self._offload(tenant)
+
+        if offload:
+            assert cpu is not None
+            begin = perf_counter_ns()
+            result = cpu()
+
+            stats = self.stats(tenant)
+            stats.cpu_runs += 1
+            stats.record("cpu_ms", (perf_counter_ns() - begin) / 1e6)
+            return result
+
+        self._acquire(_Job(tenant))
+        try:
+            self._swap_in(tenant)
+
+            begin = perf_counter_ns()
+            result = func()
+
+            stats = self.stats(tenant)
+            stats.device_runs += 1
+            stats.record("device_ms", (perf_counter_ns() - begin) / 1e6)
+            return result
+        finally:
+            self._release()
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        """
+        Has the device to yourself (with nothing on it) while in the block;
+        i.e. for benchmarking.
+        """
+        self._acquire(_Job(None))
+        try:
+            self._swap_in(None)
+            yield
+        finally:
+            self._release()
+
+
+_multiplexers: Dict[str, Multiplexer] = {}
+_multiplexers_lock = threading.Lock()
+
+
+def multiplexer(device: str) -> Multiplexer:
+    """The multiplexer for a device (by backend name); made on first use."""
+    with _multiplexers_lock:
+        if device not in _multiplexers:
+            _multiplexers[device] = Multiplexer(device)
+
+        return _multiplexers[device]
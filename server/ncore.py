@@ -3,16 +3,15 @@ import stat
 import sys
 from typing import Any, Callable, List, Optional, Tuple, Type, TypeVar
 
-import tensorflow as tf
-
 from .debug import dprint, if_debug
+from .runtime import load_delegate
 
 NCORE_PATH: str = "/dev/ncore_pci"
 
 _NCORE: Optional[bool] = None
 _DELEGATE_LIB_PATH: Optional[str] = None
 
-# This should be `tf.lite.Delegate`, but it's currently not made public so
+# This should be `Delegate` (from the runtime), but it's currently not made public so
 # we'll have to settle for this:
 Delegate = Any
 
@@ -81,9 +80,7 @@ def get_ncore_delegate_instance(options: Any = None) -> Optional[List[Delegate]]
     if _NCORE and _DELEGATE_LIB_PATH is not None:
         try:
             dprint("Making a new NCore delegate!")
-            return [
-                tf.lite.experimental.load_delegate(_DELEGATE_LIB_PATH, options=options)
-            ]
+            return [load_delegate(_DELEGATE_LIB_PATH, options=options)]
         except ValueError as e:
             raise InvalidDelegateLibrary(
                 f"Error while loading `{_DELEGATE_LIB_PATH}`: {e}"
@@ -0,0 +1,36 @@
+from typing import NamedTuple, Tuple
+
+from .admission import NORMAL
+
+
+class InvalidModelOptions(Exception):
+    ...
+
+
+class ModelOptions(NamedTuple):
+    """
+    Options for how a model is run; see `ModelOptions` in `inference.proto`.
+
+    These are part of a handle's identity in the model store, so they need to
+    be hashable (hence the tuple).
+    """
+
+    # Result cache size (in entries); 0 disables the cache:
+    cache_entries: int = 0
+    # How long cached results stay valid, in seconds; 0 means forever:
+    cache_ttl: float = 0.0
+    # Rewrite the model so that batches run as one invoke (see `rewrite.py`):
+    native_batching: bool = False
+    # Interpreters to split manual batches across (run in parallel):
+    replicas: int = 1
+    # Interpreter threads; 0 leaves it to the runtime (or the number of `cpus`):
+    num_threads: int = 0
+    # Cores to run the model on (see `affinity.py`); empty means any of them:
+    cpus: Tuple[int, ...] = ()
+    # Backend to run on (see `delegates.py`): "" for the default, "auto" to
+    # benchmark them all and pick the fastest, or a backend's name:
+    delegate: str = ""
+    # Scheduling class of the handle's requests and its share of the server
+    # against other handles (see `admission.py`):
+    priority: str = NORMAL
+    weight: float = 1.0
@@ -0,0 +1,307 @@
+from abc import ABC, abstractmethod
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from .debug import get_logger
+
+Tensor = np.ndarray
+Tensors = List[Tensor]
+
+log = get_logger("post_process")
+
+# Output strides the PoseNet models are available in:
+POSENET_OUTPUT_STRIDES: Tuple[int, ...] = (8, 16, 32)
+
+
+class InvalidPostProcess(Exception):
+    ...
+
+
+class PostProcessError(Exception):
+    ...
+
+
+class PostProcessor(ABC):
+    """
+    A stage that runs on a model's output tensors (for the whole batch) before
+    they're sent back to the client.
+    """
+
+    @abstractmethod
+    def __call__(self, outputs: Tensors) -> Tensors:
+        ...
+
+    # Post processors are part of a handle's identity in the model store, so
+    # two processors that do the same thing need to compare equal:
+    @abstractmethod
+    def key(self) -> Tuple[Any, ...]:
+        ...
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PostProcessor) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+
+def _sigmoid(x: Tensor) -> Tensor:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class PoseNetDecoder(PostProcessor):
+    """
+    Single pose decoding for PoseNet models; this is `decodeSinglePose` from
+    `examples/posenet/src/single_pose/`, vectorized across the batch.
+    """
+
+    def __init__(self, output_stride: int):
+        """
+        :raises InvalidPostProcess: On unsupported output strides.
+        """
+        if output_stride not in POSENET_OUTPUT_STRIDES:
+            raise InvalidPostProcess(
+                f"Invalid output stride for PoseNet decoding; Expected one of "
+                f"`{list(POSENET_OUTPUT_STRIDES)}`, Got: `{output_stride}`"
+            )
+
+        self.output_stride = output_stride
+
+    def key(self) -> Tuple[Any, ...]:
+        return ("posenet", self.output_stride)
+
+    def __call__(self, outputs: Tensors) -> Tensors:
+        """
+        :raises PostProcessError: When the outputs don't look like PoseNet's.
+
+        Takes heatmaps ([batch, height, width, parts]) and offsets
+        ([batch, height, width, parts * 2]) and returns the keypoints
+        ([batch, parts, 2]), keypoint scores ([batch, parts]) and pose scores
+        ([batch]).
+        """
+        if len(outputs) < 2:
+            raise PostProcessError(
+                f"PoseNet decoding needs heatmaps and offsets; the model only "
+                f"produced {len(outputs)} output tensor(s)."
+            )
+
+        heatmaps, offsets = outputs[0], outputs[1]
+
+        # Models that don't have a batch dimension get one:
+        if heatmaps.ndim == 3 and offsets.ndim == 3:
+            heatmaps, offsets = heatmaps[np.newaxis], offsets[np.newaxis]
+
+        if heatmaps.ndim != 4:
+            raise PostProcessError(
+                f"Expected heatmaps of rank 4 ([batch, height, width, parts]), "
+                f"Got: `{list(heatmaps.shape)}`"
+            )
+
+        batch, height, width, parts = heatmaps.shape
+        if offsets.shape != (batch, height, width, parts * 2):
+            raise PostProcessError(
+                f"Offsets don't match the heatmaps; Expected "
+                f"`{[batch, height, width, parts * 2]}`, "
+                f"Got: `{list(offsets.shape)}`"
+            )
+
+        # argmax2d: flatten the spatial dimensions and find the most likely
+        # position for each part. The heatmaps are logits, but sigmoid is
+        # monotonic so we can take the argmax first and only squash the
+        # values we actually keep.
+        flat = heatmaps.reshape(batch, height * width, parts)
+        coords = np.argmax(flat, axis=1)  # [batch, parts]
+        ys, xs = np.divmod(coords, width)
+
+        b = np.arange(batch)[:, np.newaxis]
+        k = np.arange(parts)[np.newaxis, :]
+
+        scores = _sigmoid(flat[b, coords, k].astype(np.float32))
+
+        # Offsets are [y offsets for each part..., x offsets for each part...]:
+        offset_ys = offsets[b, ys, xs, k]
+        offset_xs = offsets[b, ys, xs, k + parts]
+
+        keypoints = np.stack(
+            [ys * self.output_stride + offset_ys, xs * self.output_stride + offset_xs],
+            axis=-1,
+        ).astype(np.float32)
+
+        log.debug("Decoded %d pose(s) with %d parts each.", batch, parts)
+
+        return [keypoints, scores, scores.mean(axis=1).astype(np.float32)]
+
+
+class NonMaxSuppression(PostProcessor):
+    """
+    Score thresholding + class agnostic non-max suppression for detection
+    models that produce raw boxes and class scores.
+
+    This is vectorized across the batch: every iteration picks the highest
+    scoring box that's left in each image and suppresses the boxes that overlap
+    it, so we do at most `max_detections` iterations for the whole batch.
+    """
+
+    def __init__(
+        self,
+        score_threshold: float = 0.0,
+        iou_threshold: float = 0.5,
+        max_detections: int = 20,
+        boxes_index: int = 0,
+        scores_index: int = 1,
+        has_background_class: bool = False,
+    ):
+        """
+        :raises InvalidPostProcess: On nonsensical thresholds or indexes.
+        """
+        if not 0.0 <= iou_threshold <= 1.0:
+            raise InvalidPostProcess(
+                f"IoU threshold must be in [0, 1], Got: `{iou_threshold}`"
+            )
+
+        if max_detections < 1:
+            raise InvalidPostProcess(
+                f"Need to keep at least 1 detection, Got: `{max_detections}`"
+            )
+
+        if boxes_index == scores_index:
+            raise InvalidPostProcess(
+                f"Boxes and scores can't be the same output tensor "
+                f"(`{boxes_index}`)."
+            )
+
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+        self.boxes_index = boxes_index
+        self.scores_index = scores_index
+        self.has_background_class = has_background_class
+
+    def key(self) -> Tuple[Any, ...]:
+        return (
+            "nms",
+            self.score_threshold,
+            self.iou_threshold,
+            self.max_detections,
+            self.boxes_index,
+            self.scores_index,
+            self.has_background_class,
+        )
+
+    def _get_inputs(self, outputs: Tensors) -> Tuple[Tensor, Tensor]:
+        """
+        :raises PostProcessError: When the outputs don't look like boxes/scores.
+        """
+        if max(self.boxes_index, self.scores_index) >= len(outputs):
+            raise PostProcessError(
+                f"Expected boxes at output {self.boxes_index} and scores at "
+                f"output {self.scores_index}, but the model only produced "
+                f"{len(outputs)} output tensor(s)."
+            )
+
+        boxes, scores = outputs[self.boxes_index], outputs[self.scores_index]
+
+        # [batch, num_boxes, 1, 4] -> [batch, num_boxes, 4]:
+        if boxes.ndim == 4 and boxes.shape[2] == 1:
+            boxes = boxes[:, :, 0, :]
+
+        # Models that don't have a batch dimension get one:
+        if boxes.ndim == 2 and scores.ndim == 2:
+            boxes, scores = boxes[np.newaxis], scores[np.newaxis]
+
+        if boxes.ndim != 3 or boxes.shape[2] != 4:
+            raise PostProcessError(
+                f"Expected boxes shaped `[batch, num_boxes, 4]`, "
+                f"Got: `{list(boxes.shape)}`"
+            )
+
+        if scores.ndim != 3 or scores.shape[:2] != boxes.shape[:2]:
+            raise PostProcessError(
+                f"Expected scores shaped `{list(boxes.shape[:2]) + ['classes']}`, "
+                f"Got: `{list(scores.shape)}`"
+            )
+
+        if self.has_background_class:
+            scores = scores[:, :, 1:]
+
+        if scores.shape[2] == 0:
+            raise PostProcessError("Got scores for 0 classes.")
+
+        return boxes.astype(np.float32), scores.astype(np.float32)
+
+    def __call__(self, outputs: Tensors) -> Tensors:
+        """
+        :raises PostProcessError: When the outputs don't look like boxes/scores.
+
+        Returns boxes ([batch, max_detections, 4]), classes
+        ([batch, max_detections]), scores ([batch, max_detections]) and the
+        number of valid detections ([batch]); all as float32s, to match
+        `TFLite_Detection_PostProcess`. Slots past the number of valid
+        detections are zeroed.
+        """
+        boxes, scores = self._get_inputs(outputs)
+        batch, num_boxes, _ = boxes.shape
+
+        # Each box gets the class it scored highest on:
+        classes = np.argmax(scores, axis=2)  # [batch, num_boxes]
+        best = np.max(scores, axis=2)
+
+        # Boxes that are below the threshold (or have been suppressed) get a
+        # score of -inf so that they're never picked:
+        best = np.where(best >= self.score_threshold, best, -np.inf)
+
+        y_min, x_min, y_max, x_max = (boxes[:, :, i] for i in range(4))
+        areas = np.maximum(y_max - y_min, 0) * np.maximum(x_max - x_min, 0)
+
+        b = np.arange(batch)
+        box_idxs = np.arange(num_boxes)[np.newaxis, :]
+        picks = np.zeros((batch, self.max_detections), dtype=np.int64)
+        num_detections = np.zeros(batch, dtype=np.int64)
+
+        for i in range(self.max_detections):
+            pick = np.argmax(best, axis=1)  # [batch]
+            alive = np.isfinite(best[b, pick])
+
+            if not alive.any():
+                break
+
+            picks[:, i] = pick
+            num_detections += alive
+
+            # IoU of each image's pick against every box in the image:
+            p = pick[:, np.newaxis]
+            picked = boxes[b, pick][:, np.newaxis, :]  # [batch, 1, 4]
+
+            overlap_h = np.minimum(y_max, picked[..., 2]) - np.maximum(
+                y_min, picked[..., 0]
+            )
+            overlap_w = np.minimum(x_max, picked[..., 3]) - np.maximum(
+                x_min, picked[..., 1]
+            )
+            intersection = np.maximum(overlap_h, 0) * np.maximum(overlap_w, 0)
+            union = areas + areas[b, pick][:, np.newaxis] - intersection
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                iou = np.where(union > 0, intersection / union, 0.0)
+
+            suppress = (iou > self.iou_threshold) | (box_idxs == p)
+            best = np.where(suppress & alive[:, np.newaxis], -np.inf, best)
+
+        valid = (
+            np.arange(self.max_detections)[np.newaxis, :]
+            < num_detections[:, np.newaxis]
+        )
+        bp = b[:, np.newaxis]
+
+        out_boxes = np.where(valid[:, :, np.newaxis], boxes[bp, picks], 0)
+        out_classes = np.where(valid, classes[bp, picks], 0)
+        out_scores = np.where(valid, scores[bp, picks, classes[bp, picks]], 0)
+
+        log.debug("Kept %s detection(s) after NMS.", num_detections)
+
+        return [
+            out_boxes.astype(np.float32),
+            out_classes.astype(np.float32),
+            out_scores.astype(np.float32),
+            num_detections.astype(np.float32),
+        ]
@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from os.path import join
+from random import random
+from tempfile import mkdtemp
+from threading import Lock
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from uuid import uuid4
+
+from .debug import dprint
+from .env import env_float, env_int
+from .types.metrics import INVOKE, Span
+
+# Per-request traces, in Chrome's trace event format (open them with
+# chrome://tracing or https://ui.perfetto.dev).
+#
+# The Python interpreter bindings don't expose TFLite's op profiler, so per-op
+# timings come from TFLite's `benchmark_model` tool (built with op profiling),
+# run against the same model and input shapes. Those runs take a while, so
+# they happen in the background (one at a time) and are cached per handle and
+# shape; the averages are laid out under each `invoke()` in the trace on a
+# separate track. The tool always runs the model on the CPU (the device a model
+# is served from, i.e. NCore, is busy serving), so those are CPU numbers even
+# when the `invoke()` spans above them (which are timed around the real invokes
+# and say which backend they ran on) aren't.
+#
+# Requests only get a trace once the model has an op profile: until then (and
+# without the tool, or if it fails) `Metrics.trace_url` is left empty.
+
+# Fraction of inference requests to trace even if the client didn't ask to:
+TRACE_SAMPLE_RATE: float = env_float("TRACE_SAMPLE_RATE", 0.0, minimum=0.0, maximum=1.0)
+
+# Where traces are kept (a temporary directory if unset) and how many to keep:
+TRACE_DIR: Optional[str] = environ.get("TRACE_DIR")
+MAX_TRACES: int = env_int("MAX_TRACES", 64, minimum=1)
+
+BENCHMARK_MODEL: Optional[str] = environ.get("TFLITE_BENCHMARK_MODEL")
+BENCHMARK_RUNS: int = env_int("TFLITE_BENCHMARK_RUNS", 20, minimum=1)
+BENCHMARK_TIMEOUT: float = env_float("TFLITE_BENCHMARK_TIMEOUT", 120.0, minimum=0.0)
+
+# (name, shape) for each of a model's inputs:
+InputShapes = Sequence[Tuple[str, Tuple[int, ...]]]
+
+
+class OpProfile(NamedTuple):
+    node_type: str
+    name: str
+    start: float  # ms into an invoke (on average)
+    avg: float  # ms
+    times_called: int
+
+
+_profiler = ThreadPoolExecutor(1, thread_name_prefix="profiler")
+
+
+def background(func: Callable[..., None], *args: Any) -> None:
+    """Runs `func` on the profiling thread, off the request's path."""
+
+    def run() -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            dprint(f"Warning: profiling failed: {e}")
+
+    _profiler.submit(run)
+
+
+def should_trace(requested: bool) -> bool:
+    return requested or (TRACE_SAMPLE_RATE > 0 and random() < TRACE_SAMPLE_RATE)
+
+
+# A row in `benchmark_model`'s "Run Order" table; the columns are:
+#   [node type] [start] [first] [avg ms] [%] [cdf%] [mem KB] [times called] [Name]
+_OP_ROW = re.compile(
+    r"^\s*(?P<type>\S+)\s+(?P<start>[\d.]+)\s+[\d.]+\s+(?P<avg>[\d.]+)\s+"
+    r"[\d.]+%\s+[\d.]+%\s+[\d.]+\s+(?P<calls>\d+)\s+\[(?P<name>.*)\]\s*$"
+)
+
+
+def parse_op_profile(output: str) -> List[OpProfile]:
+    """Grabs the ops from the first "Run Order" table in `benchmark_model` output."""
+    ops: List[OpProfile] = []
+    in_table = False
+
+    for line in output.splitlines():
+        if not in_table:
+            in_table = "Run Order" in line
+            continue
+
+        m = _OP_ROW.match(line)
+        if m is not None:
+            ops.append(
+                OpProfile(
+                    m["type"],
+                    m["name"],
+                    float(m["start"]),
+                    float(m["avg"]),
+                    int(m["calls"]),
+                )
+            )
+        elif ops or line.startswith("="):
+            # The table's over (or there's a new one that we don't want):
+            break
+
+    return ops
+
+
+def profile_ops(
+    model_path: str,
+    inputs: InputShapes,
+    delegate_lib: Optional[str] = None,
+    num_threads: Optional[int] = None,
+) -> List[OpProfile]:
+    """
+    Runs `benchmark_model` on the given model; returns an empty list if we don't
+    have the tool or if it fails (profiling shouldn't fail requests).
+    """
+    if BENCHMARK_MODEL is None:
+        return []
+
+    cmd = [
+        BENCHMARK_MODEL,
+        f"--graph={model_path}",
+        "--enable_op_profiling=true",
+        f"--num_runs={BENCHMARK_RUNS}",
+        f"--input_layer={','.join(name for name, _ in inputs)}",
+        f"--input_layer_shape={':'.join(','.join(map(str, s)) for _, s in inputs)}",
+    ]
+
+    if delegate_lib is not None:
+        cmd.append(f"--external_delegate_path={delegate_lib}")
+    if num_threads is not None:
+        cmd.append(f"--num_threads={num_threads}")
+
+    dprint(f"Profiling ops with: `{' '.join(cmd)}`")
+
+    try:
+        proc = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=BENCHMARK_TIMEOUT,
+            universal_newlines=True,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        dprint(f"Warning: failed to run `{BENCHMARK_MODEL}`: {e}")
+        return []
+
+    ops = parse_op_profile(proc.stdout)
+    if proc.returncode != 0 or not ops:
+        dprint(f"Warning: no op profile from `{BENCHMARK_MODEL}`:\n{proc.stdout}")
+
+    return ops
+
+
+def chrome_trace(spans: List[Span], ops: Sequence[OpProfile] = ()) -> Dict[str, Any]:
+    """
+    Stages go on one track and ops (if we've got them) on another, under each
+    `invoke()`. Timestamps are in μs from the start of the first span.
+    """
+    origin = min((s.begin for s in spans), default=0)
+    us = lambda ns: (ns - origin) / 1000
+
+    events: List[Dict[str, Any]] = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": 1,
+            "tid": 1,
+            "args": {"name": "stages"},
+        },
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": 1,
+            "tid": 2,
+            "args": {"name": "ops (benchmark_model averages, on the CPU)"},
+        },
+    ]
+
+    for span in sorted(spans, key=lambda s: s.begin):
+        events.append(
+            {
+                "name": span.name,
+                "ph": "X",
+                "pid": 1,
+                "tid": 1,
+                "ts": us(span.begin),
+                "dur": (span.end - span.begin) / 1000,
+                "args": span.args or {},
+            }
+        )
+
+        if span.name != INVOKE:
+            continue
+
+        for op in ops:
+            events.append(
+                {
+                    "name": op.node_type,
+                    "cat": "op",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": 2,
+                    "ts": us(span.begin) + op.start * 1000,
+                    "dur": op.avg * 1000,
+                    "args": {"name": op.name, "times_called": op.times_called},
+                }
+            )
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class TraceStore:
+    """A directory of traces that holds on to the last `max_traces` traces."""
+
+    def __init__(self, directory: Optional[str] = None, max_traces: int = MAX_TRACES):
+        if directory is None:
+            directory = mkdtemp(prefix="web-demos-traces-")
+
+        os.makedirs(directory, exist_ok=True)
+        dprint(f"Keeping up to {max_traces} traces in `{directory}`.")
+
+        self.directory: str = directory
+        self.max_traces: int = max(max_traces, 1)
+        self._names: Deque[str] = deque()
+        self._lock = Lock()
+
+    def save(self, trace: Dict[str, Any]) -> str:
+        """Returns the trace's name (its file name in the directory)."""
+        name = f"{uuid4().hex}.json"
+
+        with open(join(self.directory, name), "w") as f:
+            json.dump(trace, f)
+
+        with self._lock:
+            self._names.append(name)
+            evicted = [
+                self._names.popleft() for _ in range(len(self._names) - self.max_traces)
+            ]
+
+        for old in evicted:
+            try:
+                os.remove(join(self.directory, old))
+            except FileNotFoundError:
+                pass
+
+        return name
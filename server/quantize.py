@@ -0,0 +1,139 @@
+from time import perf_counter_ns
+from typing import Any, Iterator, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .debug import get_logger
+from .runtime import Interpreter, random_inputs, run_once
+
+# Post-training quantization, for models that go through `TFLiteConverter`
+# (see `types/model.py`).
+#
+# Quantized models are smaller and (usually) quicker, but they aren't the same
+# model; so that whoever asked for one can tell whether it's good enough, the
+# quantized model is compared against the float one (produced by the same
+# converter) on some sample inputs: size, latency, and how far apart the
+# outputs are.
+#
+# Inputs and outputs stay float in every mode (for full integer quantization
+# the converter adds (de)quantize ops), so clients don't need to change.
+
+log = get_logger("quantize")
+
+Tensors = List[np.ndarray]
+
+NONE, DYNAMIC_RANGE, FLOAT16, FULL_INTEGER = (
+    "none",
+    "dynamic_range",
+    "float16",
+    "full_integer",
+)
+
+# Timed invokes per sample:
+RUNS = 5
+
+
+class Optimization(NamedTuple):
+    mode: str = NONE
+    # Sample inputs (full sets of input tensors):
+    dataset: Sequence[Tensors] = ()
+
+
+class Comparison(NamedTuple):
+    float_bytes: int
+    optimized_bytes: int
+    float_ms: float
+    optimized_ms: float
+    # Per output:
+    max_deviation: List[float]
+    mean_deviation: List[float]
+
+
+def configure(converter: Any, optimization: Optimization) -> None:
+    """Sets a `TFLiteConverter` up to produce the optimized model."""
+    import tensorflow as tf
+
+    if optimization.mode == NONE:
+        return
+
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if optimization.mode == FLOAT16:
+        converter.target_spec.supported_types = [tf.float16]
+    elif optimization.mode == FULL_INTEGER:
+
+        def dataset() -> Iterator[Tensors]:
+            for sample in optimization.dataset:
+                yield [t.astype(np.float32) for t in sample]
+
+        # (`TFLiteConverter` wants the wrapper; it reads `input_gen` off of it:)
+        converter.representative_dataset = tf.lite.RepresentativeDataset(dataset)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+
+def _run(model: bytes, samples: Sequence[Tensors]) -> Tuple[List[Tensors], float]:
+    """Outputs for each sample and the median time per invoke (in ms)."""
+    interp = Interpreter(model_content=model)
+    interp.allocate_tensors()
+
+    outputs: List[Tensors] = []
+    times: List[float] = []
+    for sample in samples:
+        for inp, t in zip(interp.get_input_details(), sample):
+            if tuple(inp["shape"]) != t.shape:
+                interp.resize_tensor_input(inp["index"], t.shape)
+                interp.allocate_tensors()
+
+        tensors = [
+            t.astype(inp["dtype"]) for inp, t in zip(interp.get_input_details(), sample)
+        ]
+        outputs.append(run_once(interp, tensors))
+
+        for _ in range(RUNS):
+            begin = perf_counter_ns()
+            run_once(interp, tensors)
+            times.append((perf_counter_ns() - begin) / 1e6)
+
+    return outputs, float(np.median(times))
+
+
+def compare(
+    float_model: bytes, optimized: bytes, dataset: Sequence[Tensors] = ()
+) -> Comparison:
+    """
+    :raises RuntimeError: If either model can't be run on the samples.
+    :raises ValueError: If the samples don't fit the models.
+
+    Runs both models on the samples (or on random inputs, if there aren't any).
+    """
+    if not dataset:
+        interp = Interpreter(model_content=float_model)
+        dataset = [random_inputs(interp.get_input_details())]
+
+    expected, float_ms = _run(float_model, dataset)
+    got, optimized_ms = _run(optimized, dataset)
+
+    diffs: List[List[np.ndarray]] = [[] for _ in expected[0]]
+    for exp, out in zip(expected, got):
+        for o, (e, g) in enumerate(zip(exp, out)):
+            diffs[o].append(np.abs(g.astype(np.float64) - e.astype(np.float64)).ravel())
+
+    flat = [np.concatenate(d) for d in diffs]
+    comparison = Comparison(
+        float_bytes=len(float_model),
+        optimized_bytes=len(optimized),
+        float_ms=float_ms,
+        optimized_ms=optimized_ms,
+        max_deviation=[float(d.max()) if d.size else 0.0 for d in flat],
+        mean_deviation=[float(d.mean()) if d.size else 0.0 for d in flat],
+    )
+
+    log.info(
+        "Optimized model: %d -> %d bytes, %.2f -> %.2fms; max deviation %s.",
+        comparison.float_bytes,
+        comparison.optimized_bytes,
+        comparison.float_ms,
+        comparison.optimized_ms,
+        ", ".join(f"{d:.3g}" for d in comparison.max_deviation),
+    )
+    return comparison
@@ -0,0 +1,244 @@
+import struct
+from typing import Dict, List, Optional, Set, Tuple, cast
+
+from .debug import get_logger
+from .runtime import Interpreter, outputs_agree, random_inputs, run_once
+
+# Load time rewriting of TFLite models so that they can be batched natively.
+#
+# Most models are converted with a batch size of 1 baked in: their input shapes
+# say 1, and (more importantly) their reshapes have constant target shapes that
+# start with 1, so resizing the inputs makes `allocate_tensors()` fail and we
+# fall back to one `invoke()` per batch element.
+#
+# The rewrite turns the leading 1 in those constant shapes into a -1 (the
+# "infer this dimension" value) and marks the inputs' batch dimensions as
+# dynamic in their shape signatures, if the model has them. Values are the same
+# size, so the flatbuffer is patched in place rather than rebuilt. Whether the
+# result actually works is checked by running it against the original model.
+#
+# Only the bits of TFLite's flatbuffer schema (`tensorflow/lite/schema/
+# schema.fbs`) that we need are read here.
+
+log = get_logger("rewrite")
+
+# Field indices, from the schema:
+MODEL_OPERATOR_CODES, MODEL_SUBGRAPHS, MODEL_BUFFERS = 1, 2, 4
+OPCODE_DEPRECATED_BUILTIN_CODE, OPCODE_BUILTIN_CODE = 0, 3
+SUBGRAPH_TENSORS, SUBGRAPH_INPUTS, SUBGRAPH_OPERATORS = 0, 1, 3
+TENSOR_SHAPE, TENSOR_TYPE, TENSOR_BUFFER, TENSOR_SHAPE_SIGNATURE = 0, 1, 2, 7
+OPERATOR_OPCODE_INDEX, OPERATOR_INPUTS = 0, 1
+OPERATOR_BUILTIN_OPTIONS_TYPE, OPERATOR_BUILTIN_OPTIONS = 3, 4
+BUFFER_DATA = 0
+RESHAPE_OPTIONS_NEW_SHAPE = 0
+
+RESHAPE = 22  # `BuiltinOperator.RESHAPE`
+RESHAPE_OPTIONS = 17  # `BuiltinOptions.ReshapeOptions`
+INT32 = 2  # `TensorType.INT32`
+
+
+class RewriteError(Exception):
+    ...
+
+
+class _FlatBuffer:
+    """Just enough of a flatbuffer reader to find things to patch."""
+
+    def __init__(self, data: bytearray):
+        self.data = data
+
+    def _u16(self, pos: int) -> int:
+        return cast(int, struct.unpack_from("<H", self.data, pos)[0])
+
+    def _i32(self, pos: int) -> int:
+        return cast(int, struct.unpack_from("<i", self.data, pos)[0])
+
+    def _u32(self, pos: int) -> int:
+        return cast(int, struct.unpack_from("<I", self.data, pos)[0])
+
+    def root(self) -> int:
+        return self._u32(0)
+
+    def field(self, table: int, idx: int) -> Optional[int]:
+        """Position of a table's field, or None if it isn't set."""
+        vtable = table - self._i32(table)
+        entry = 4 + 2 * idx
+
+        if entry >= self._u16(vtable):
+            return None
+
+        offset = self._u16(vtable + entry)
+        return table + offset if offset else None
+
+    def scalar(self, table: int, idx: int, fmt: str, default: int = 0) -> int:
+        pos = self.field(table, idx)
+        return (
+            default
+            if pos is None
+            else cast(int, struct.unpack_from(fmt, self.data, pos)[0])
+        )
+
+    def table(self, table: int, idx: int) -> Optional[int]:
+        pos = self.field(table, idx)
+        return None if pos is None else pos + self._u32(pos)
+
+    def vector(self, table: int, idx: int) -> Tuple[int, int]:
+        """(position of the first element, length); (0, 0) if unset."""
+        pos = self.field(table, idx)
+        if pos is None:
+            return 0, 0
+
+        vec = pos + self._u32(pos)
+        return vec + 4, self._u32(vec)
+
+    def tables(self, table: int, idx: int) -> List[int]:
+        start, length = self.vector(table, idx)
+        return [start + 4 * i + self._u32(start + 4 * i) for i in range(length)]
+
+    def ints(self, table: int, idx: int) -> List[int]:
+        start, length = self.vector(table, idx)
+        return [self._i32(start + 4 * i) for i in range(length)]
+
+    def set_i32(self, pos: int, value: int) -> None:
+        struct.pack_into("<i", self.data, pos, value)
+
+
+def _patch_leading_one(fb: _FlatBuffer, start: int, length: int) -> bool:
+    """Turns a leading 1 in an int32 shape into a -1, if there's no -1 yet."""
+    shape = [fb._i32(start + 4 * i) for i in range(length)]
+
+    if not shape or shape[0] != 1 or -1 in shape:
+        return False
+
+    fb.set_i32(start, -1)
+    return True
+
+
+def make_batch_dynamic(model: bytes) -> Tuple[bytes, int]:
+    """
+    :raises RewriteError: On models we can't rewrite (i.e. that don't have
+                          a batch dimension of 1 on all their inputs).
+
+    Returns the rewritten model and the number of shapes that were changed.
+    """
+    try:
+        return _make_batch_dynamic(model)
+    except (struct.error, IndexError) as e:
+        raise RewriteError(f"Couldn't parse the model as a TFLite flatbuffer: {e}")
+
+
+def _make_batch_dynamic(model: bytes) -> Tuple[bytes, int]:
+    fb = _FlatBuffer(bytearray(model))
+    root = fb.root()
+
+    opcodes = [
+        max(
+            fb.scalar(op, OPCODE_DEPRECATED_BUILTIN_CODE, "<b"),
+            fb.scalar(op, OPCODE_BUILTIN_CODE, "<i"),
+        )
+        for op in fb.tables(root, MODEL_OPERATOR_CODES)
+    ]
+    buffers = fb.tables(root, MODEL_BUFFERS)
+    patched = 0
+
+    for subgraph in fb.tables(root, MODEL_SUBGRAPHS):
+        tensors = fb.tables(subgraph, SUBGRAPH_TENSORS)
+        inputs = fb.ints(subgraph, SUBGRAPH_INPUTS)
+
+        for i in inputs:
+            if fb.ints(tensors[i], TENSOR_SHAPE)[:1] != [1]:
+                raise RewriteError(
+                    "The model's inputs don't all have a batch dimension of 1."
+                )
+
+        # Constant shapes are often shared (buffers are deduplicated); we only
+        # touch the ones that nothing but reshapes use:
+        users: Dict[int, Set[int]] = {}
+        for t, tensor in enumerate(tensors):
+            buf = fb.scalar(tensor, TENSOR_BUFFER, "<I")
+            if buf:
+                users.setdefault(buf, set()).add(t)
+
+        shape_tensors: Set[int] = set()
+        reshapes: List[int] = []
+        for op in fb.tables(subgraph, SUBGRAPH_OPERATORS):
+            if opcodes[fb.scalar(op, OPERATOR_OPCODE_INDEX, "<I")] != RESHAPE:
+                continue
+
+            reshapes.append(op)
+            op_inputs = fb.ints(op, OPERATOR_INPUTS)
+            if len(op_inputs) > 1 and op_inputs[1] >= 0:
+                shape_tensors.add(op_inputs[1])
+
+        for t in shape_tensors:
+            tensor = tensors[t]
+            buf = fb.scalar(tensor, TENSOR_BUFFER, "<I")
+
+            if fb.scalar(tensor, TENSOR_TYPE, "<b") != INT32 or not buf:
+                continue
+            if not users[buf] <= shape_tensors:
+                log.debug("Not patching shape tensor %d; its buffer is shared.", t)
+                continue
+
+            start, length = fb.vector(buffers[buf], BUFFER_DATA)
+            patched += _patch_leading_one(fb, start, length // 4)
+
+        # Reshapes can also carry their shape in their options:
+        for op in reshapes:
+            if fb.scalar(op, OPERATOR_BUILTIN_OPTIONS_TYPE, "<B") != RESHAPE_OPTIONS:
+                continue
+
+            options = fb.table(op, OPERATOR_BUILTIN_OPTIONS)
+            if options is not None:
+                start, length = fb.vector(options, RESHAPE_OPTIONS_NEW_SHAPE)
+                patched += _patch_leading_one(fb, start, length)
+
+        # Newer interpreters only allow resizing dimensions that the shape
+        # signature says are dynamic:
+        for i in inputs:
+            start, length = fb.vector(tensors[i], TENSOR_SHAPE_SIGNATURE)
+            patched += _patch_leading_one(fb, start, length)
+
+    return bytes(fb.data), patched
+
+
+def verify_native_batching(
+    original: bytes, rewritten: bytes, batch: int = 3
+) -> Optional[str]:
+    """
+    Runs a batch through the rewritten model in one go and each element of the
+    batch through the original, and compares. Returns why the rewritten model
+    can't be used, or None if it can.
+    """
+    orig = Interpreter(model_content=original)
+    orig.allocate_tensors()
+
+    try:
+        new = Interpreter(model_content=rewritten)
+        for inp in new.get_input_details():
+            new.resize_tensor_input(inp["index"], [batch] + list(inp["shape"][1:]))
+        new.allocate_tensors()
+    except (RuntimeError, ValueError) as e:
+        return f"the rewritten model can't be resized ({e})"
+
+    inputs = random_inputs(orig.get_input_details(), batch)
+
+    try:
+        batched = run_once(new, inputs)
+    except (RuntimeError, ValueError) as e:
+        return f"the rewritten model failed to run a batch ({e})"
+
+    for b in range(batch):
+        expected = run_once(orig, [t[b : b + 1] for t in inputs])
+
+        for o, (got, exp) in enumerate(zip(batched, expected)):
+            if got.shape[0] != batch or got.shape[1:] != exp.shape[1:]:
+                return (
+                    f"output {o} has shape {list(got.shape)} for a batch of "
+                    f"{batch}; expected {[batch] + list(exp.shape[1:])}"
+                )
+
+            if not outputs_agree(got[b], exp[0]):
+                return f"output {o} doesn't match the original model's for element {b}"
+
+    return None
@@ -0,0 +1,151 @@
+import inspect
+import sys
+from os import environ
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# The TFLite interpreter that inference runs on.
+#
+# Full TensorFlow is hundreds of megabytes and takes seconds to import, but
+# running TFLite models only needs the interpreter, which `tflite_runtime` has
+# on its own. We use `tflite_runtime` if it's installed (unless
+# `TFLITE_RUNTIME=tensorflow`) and fall back to TensorFlow otherwise.
+#
+# Converting models (`types/model.py`) still needs TensorFlow (and
+# tensorflowjs), but that's imported when a conversion actually runs; workers
+# that only serve TFLite models never import it.
+
+TFLITE_RUNTIME: str = environ.get("TFLITE_RUNTIME", "auto").lower()
+
+RUNTIMES = ("auto", "tflite_runtime", "tensorflow")
+
+
+class RuntimeUnavailableError(Exception):
+    ...
+
+
+def _tflite_runtime() -> Tuple[str, Any, Callable[..., Any]]:
+    from tflite_runtime import interpreter
+
+    return (
+        f"tflite_runtime {getattr(interpreter, '__version__', '?')}",
+        interpreter.Interpreter,
+        interpreter.load_delegate,
+    )
+
+
+def _tensorflow() -> Tuple[str, Any, Callable[..., Any]]:
+    import tensorflow as tf
+
+    return (
+        f"tensorflow {tf.__version__}",
+        tf.lite.Interpreter,
+        tf.lite.experimental.load_delegate,
+    )
+
+
+def _load(runtime: str) -> Tuple[str, Any, Callable[..., Any]]:
+    """
+    :raises RuntimeUnavailableError: When the requested runtime can't be
+                                     imported or isn't one we know about.
+    """
+    if runtime not in RUNTIMES:
+        raise RuntimeUnavailableError(
+            f"`TFLITE_RUNTIME` should be one of {RUNTIMES}; Got: `{runtime}`."
+        )
+
+    try:
+        if runtime == "tensorflow":
+            return _tensorflow()
+
+        try:
+            return _tflite_runtime()
+        except ImportError:
+            if runtime == "tflite_runtime":
+                raise
+
+            return _tensorflow()
+    except ImportError as e:
+        raise RuntimeUnavailableError(f"Couldn't import a TFLite runtime: {e}")
+
+
+# (description, interpreter class, `load_delegate`)
+RUNTIME, Interpreter, load_delegate = _load(TFLITE_RUNTIME)
+
+# The interpreter class depends on the runtime, so for annotations:
+InterpreterType = Any
+
+
+def _takes(cls: Any, arg: str) -> bool:
+    try:
+        return arg in inspect.signature(cls).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+# Older interpreters (before TensorFlow 2.3) always use their default:
+SUPPORTS_NUM_THREADS: bool = _takes(Interpreter, "num_threads")
+
+# Lets you turn off the delegates the runtime applies by default (XNNPACK);
+# None on runtimes that don't have it:
+OpResolverType: Optional[Any] = (
+    getattr(sys.modules[Interpreter.__module__], "OpResolverType", None)
+    if _takes(Interpreter, "experimental_op_resolver_type")
+    else None
+)
+
+
+def random_inputs(
+    details: List[Dict[str, Any]], batch: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Random tensors matching an interpreter's input details (with the first
+    dimension replaced by `batch`, if given).
+    """
+    tensors = []
+
+    for inp in details:
+        shape = tuple(int(d) for d in inp["shape"])
+        if batch is not None:
+            shape = (batch,) + shape[1:]
+
+        dtype = np.dtype(inp["dtype"])
+        if dtype.kind == "f":
+            tensors.append(np.random.rand(*shape).astype(dtype))
+        elif dtype.kind == "b":
+            tensors.append(np.random.rand(*shape) > 0.5)
+        else:
+            tensors.append(np.random.randint(0, 128, shape).astype(dtype))
+
+    return tensors
+
+
+def run_once(interp: InterpreterType, tensors: List[np.ndarray]) -> List[np.ndarray]:
+    """Sets an (allocated) interpreter's inputs, invokes it, and gets its outputs."""
+    for inp, t in zip(interp.get_input_details(), tensors):
+        interp.set_tensor(inp["index"], t)
+    interp.invoke()
+
+    return [interp.get_tensor(out["index"]) for out in interp.get_output_details()]
+
+
+def outputs_agree(
+    got: np.ndarray,
+    expected: np.ndarray,
+    rtol: float = 1e-4,
+    atol: float = 1e-5,
+    int_atol: int = 0,
+) -> bool:
+    """
+    Whether two outputs are the same, give or take `rtol`/`atol` for floats and
+    `int_atol` for integers (i.e. quantized outputs, where it's in quantization
+    steps).
+    """
+    if got.shape != expected.shape:
+        return False
+    if expected.dtype.kind == "f":
+        return bool(np.allclose(got, expected, rtol=rtol, atol=atol))
+
+    diff = np.abs(got.astype(np.int64) - expected.astype(np.int64))
+    return bool(np.all(diff <= int_atol))
@@ -0,0 +1,227 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Counters and histograms for the `/metrics` endpoint (Prometheus' text format).
+#
+# Recording is on the request path, so it has to be cheap: every thread gets
+# its own shard that only it writes to (no locks), and scrapes add the shards
+# up. Thread-per-request servers would leave us with a shard per request, so
+# shards belonging to threads that have exited are folded into one shard.
+
+PREFIX = "web_demos_"
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+Sample = Tuple[str, Labels, float]
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+
+# [name] => (type, help)
+# fmt: off
+METRICS: Dict[str, Tuple[str, str]] = {
+    "requests_total":                   (COUNTER,   "Requests, by endpoint and handle."),
+    "errors_total":                     (COUNTER,   "Errors returned, by endpoint and `Error.Kind`."),
+    "load_latency_seconds":             (HISTOGRAM, "Time to load (and convert) a model."),
+    "inference_latency_seconds":        (HISTOGRAM, "Time to handle an inference request, by handle."),
+    "queue_depth":                      (GAUGE,     "Inference requests in flight, by handle."),
+    "inference_waiting":                (GAUGE,     "Inference requests waiting to be admitted, by handle."),
+    "requests_shed_total":              (COUNTER,   "Inference requests turned away by admission control, by handle and reason (overloaded/deadline)."),
+    "inference_cancelled_total":        (COUNTER,   "Inference requests stopped partway, by handle and reason (disconnected/deadline)."),
+    "batch_elements_skipped_total":     (COUNTER,   "Manual batch elements that cancelled requests didn't run, by handle."),
+    "interpreter_reallocations_total":  (COUNTER,   "Tensor (re)allocations, by handle."),
+    "model_file_bytes":                 (GAUGE,     "Size of each handle's model file (not the memory its interpreters use)."),
+    "cache_hit_rate":                   (GAUGE,     "Result cache hit rate, by handle."),
+    "native_batching":                  (GAUGE,     "1 if the handle's model was rewritten to batch natively."),
+    "delegate":                         (GAUGE,     "1 for the backend (and thread count) each handle runs on."),
+    "delegate_benchmark_ms":            (GAUGE,     "Load time benchmark of each backend, by handle (auto delegate only)."),
+    "multiplexed_runs_total":           (COUNTER,   "Runs of handles that share a device (NCore), by handle and where they ran (device/cpu)."),
+    "model_swaps_total":                (COUNTER,   "Times each handle was swapped onto its (shared) device."),
+    "conversion_cost_ms":               (GAUGE,     "Planner's cost for each model conversion (moving average of its time over how often it works)."),
+    "process_resident_memory_bytes":    (GAUGE,     "Resident set size of the server."),
+    "ready":                            (GAUGE,     "1 once startup warm up is done."),
+}
+# fmt: on
+
+# Upper bounds, in seconds:
+BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class _Shard:
+    __slots__ = ("thread", "counters", "histograms")
+
+    def __init__(self, thread: Optional[threading.Thread]):
+        self.thread = thread
+        self.counters: Dict[Key, float] = {}
+        # [count for each bucket..., count for +Inf (the overflow), sum]
+        self.histograms: Dict[Key, List[float]] = {}
+
+    def merge(self, other: "_Shard") -> None:
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+        for key, hist in other.histograms.copy().items():
+            mine = self.histograms.setdefault(key, [0.0] * (len(BUCKETS) + 2))
+            for i, v in enumerate(list(hist)):
+                mine[i] += v
+
+
+_local = threading.local()
+_shards: List[_Shard] = []
+_retired = _Shard(None)
+_shards_lock = threading.Lock()
+
+# Fold away dead threads' shards once we've got this many:
+MAX_SHARDS = 64
+
+
+def _fold_dead_shards() -> None:
+    """Call with `_shards_lock` held."""
+    global _shards
+
+    alive = []
+    for shard in _shards:
+        if shard.thread is not None and shard.thread.is_alive():
+            alive.append(shard)
+        else:
+            # Dead threads don't write to their shards anymore:
+            _retired.merge(shard)
+
+    _shards = alive
+
+
+def _shard() -> _Shard:
+    shard: Optional[_Shard] = getattr(_local, "shard", None)
+
+    if shard is None:
+        shard = _local.shard = _Shard(threading.current_thread())
+
+        with _shards_lock:
+            if len(_shards) >= MAX_SHARDS:
+                _fold_dead_shards()
+            _shards.append(shard)
+
+    return shard
+
+
+def inc(name: str, labels: Labels = (), value: float = 1.0) -> None:
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0.0) + value
+
+
+def dec(name: str, labels: Labels = (), value: float = 1.0) -> None:
+    inc(name, labels, -value)
+
+
+def observe(name: str, value: float, labels: Labels = ()) -> None:
+    histograms = _shard().histograms
+    key = (name, labels)
+
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = [0.0] * (len(BUCKETS) + 2)
+
+    hist[bisect_left(BUCKETS, value)] += 1
+    hist[-1] += value
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # No procfs; peak (rather than current) RSS is the best we can do:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _collect() -> _Shard:
+    total = _Shard(None)
+
+    with _shards_lock:
+        _fold_dead_shards()
+        total.merge(_retired)
+        for shard in _shards:
+            total.merge(shard)
+
+    return total
+
+
+def _fmt_labels(labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+
+    escape = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(extra: Iterable[Sample] = ()) -> str:
+    """
+    Renders everything we've recorded (plus the given samples, which are
+    typically gauges read at scrape time) in Prometheus' text format.
+    """
+    total = _collect()
+
+    counters: Dict[str, List[Tuple[Labels, float]]] = {}
+    for (name, labels), value in total.counters.items():
+        counters.setdefault(name, []).append((labels, value))
+    for name, labels, value in extra:
+        counters.setdefault(name, []).append((labels, value))
+    counters.setdefault("process_resident_memory_bytes", []).append(
+        ((), resident_memory_bytes())
+    )
+
+    histograms: Dict[str, List[Tuple[Labels, List[float]]]] = {}
+    for (name, labels), hist in total.histograms.items():
+        histograms.setdefault(name, []).append((labels, hist))
+
+    lines: List[str] = []
+
+    for name in sorted(set(counters) | set(histograms)):
+        kind, description = METRICS.get(name, (GAUGE, ""))
+        full = PREFIX + name
+
+        lines.append(f"# HELP {full} {description}")
+        lines.append(f"# TYPE {full} {kind}")
+
+        for labels, value in sorted(counters.get(name, [])):
+            lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+        for labels, hist in sorted(histograms.get(name, [])):
+            cumulative = 0.0
+            for bound, count in zip(BUCKETS + (float("inf"),), hist):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{full}_bucket{_fmt_labels(labels, (('le', le),))} "
+                    f"{_fmt_value(cumulative)}"
+                )
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {repr(hist[-1])}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {_fmt_value(cumulative)}")
+
+    return "\n".join(lines) + "\n"
@@ -55,7 +55,10 @@ else:
     dprint(f"Warning: the local model directory (`{MODEL_DIR}`) doesn't seem to exist.")
 
 from inference_pb2 import (  # isort:skip
+    CapturedRequest,
+    ConversionReport,
     Error,
+    Images,
     InferenceRequest,
     InferenceResponse,
     LoadModelRequest,
@@ -63,6 +66,8 @@ from inference_pb2 import (  # isort:skip
     Metrics,
     Model,
     ModelHandle,
+    ModelOptions,
+    PostProcess,
     Tensor,
     Tensors,
 )
@@ -1,8 +1,11 @@
 import re
 import traceback
-from typing import Any, Dict, Type
+from typing import Any, Dict, Set, Type
 
+from ..admission import DeadlineExceeded, Overloaded
+from ..cancellation import Cancelled
 from ..debug import dprint, if_debug
+from ..ingest import InvalidArchive, ModelTooLarge
 from ..model_store import (
     InvalidHandleError,
     ModelLoadError,
@@ -11,8 +14,11 @@ from ..model_store import (
     TensorTypeError,
 )
 from ..ncore import InvalidDelegateLibrary, NCoreNotPresent
+from ..options import InvalidModelOptions
+from ..postprocess import InvalidPostProcess, PostProcessError
 from ..types import Error
-from ..types.model import ModelAcquireError, ModelConversionError
+from ..types.image import ImageDecodeError, InvalidPreprocess
+from ..types.model import ModelAcquireError, ModelConversionError, ModelDataError
 from ..types.tensor import InvalidTensorMessage, MisshapenTensor, TensorConversionError
 
 ErrorKind = Error.Kind
@@ -40,13 +46,31 @@ error_code_map: Dict[Type[Exception], ErrorKind] = {
     ModelLoadError:         Error.Kind.MODEL_LOAD_ERROR,
     InvalidHandleError:     Error.Kind.INVALID_HANDLE_ERROR,
     TensorTypeError:        Error.Kind.TENSOR_TYPE_ERROR,
+    ImageDecodeError:       Error.Kind.IMAGE_DECODE_ERROR,
+    InvalidPreprocess:      Error.Kind.INVALID_PREPROCESS,
     ModelAcquireError:      Error.Kind.MODEL_ACQUIRE_ERROR,
     ModelConversionError:   Error.Kind.MODEL_CONVERSION_ERROR,
+    ModelDataError:         Error.Kind.MODEL_DATA_ERROR,
     InvalidDelegateLibrary: Error.Kind.INVALID_DELEGATE_LIBRARY,
     NCoreNotPresent:        Error.Kind.NCORE_NOT_PRESENT,
+    InvalidPostProcess:     Error.Kind.INVALID_POST_PROCESS,
+    PostProcessError:       Error.Kind.POST_PROCESS_ERROR,
+    InvalidModelOptions:    Error.Kind.INVALID_MODEL_OPTIONS,
+    ModelTooLarge:          Error.Kind.MODEL_TOO_LARGE,
+    InvalidArchive:         Error.Kind.MODEL_DATA_ERROR,
+    Overloaded:             Error.Kind.OVERLOADED,
+    DeadlineExceeded:       Error.Kind.DEADLINE_EXCEEDED,
+    Cancelled:              Error.Kind.CANCELLED,
 }
 # fmt: on
 
+# Errors that are about the server's state rather than the request:
+retryable_kinds: Set[ErrorKind] = {
+    Error.Kind.OVERLOADED,
+    Error.Kind.DEADLINE_EXCEEDED,
+    Error.Kind.CANCELLED,
+}
+
 
 def into_error(err: Exception) -> Error:
     kind: Error.Kind = error_code_map.get(type(err), Error.Kind.OTHER)
@@ -57,4 +81,9 @@ def into_error(err: Exception) -> Error:
     dprint(f"Returning Err: `{msg}`")
     _: None = if_debug(lambda: traceback.print_exc())
 
-    return Error(kind=kind, message=f"{msg}")
+    return Error(
+        kind=kind,
+        message=f"{msg}",
+        retryable=kind in retryable_kinds,
+        retry_after_ms=int(getattr(err, "retry_after_ms", 0)),
+    )
@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from os import cpu_count
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from PIL import Image
+
+from ..debug import get_logger
+from ..env import env_int
+from ..types import Images
+
+Preprocess = Images.Preprocess
+TFLiteTensor = np.ndarray
+
+log = get_logger("image")
+
+# Decoding (and resizing) happens in PIL's C code, which releases the GIL, so
+# the images in a batch are decoded in parallel on a shared pool of threads:
+DECODE_THREADS: int = env_int("IMAGE_DECODE_THREADS", cpu_count() or 1, minimum=1)
+
+_decode_pool = ThreadPoolExecutor(
+    max_workers=DECODE_THREADS, thread_name_prefix="image-decode"
+)
+
+# [Preprocess.DataType] => numpy type
+type_map_preprocess2numpy: Dict[int, Type[np.generic]] = {
+    Preprocess.FLOAT32: np.float32,
+    Preprocess.INT32: np.int32,
+    Preprocess.UINT8: np.uint8,
+}
+
+
+class ImageDecodeError(Exception):
+    ...
+
+
+class InvalidPreprocess(Exception):
+    ...
+
+
+def _get_size(spec: Preprocess) -> Optional[Tuple[int, int]]:
+    """
+    :raises InvalidPreprocess: When only one of height and width is given.
+    """
+    if spec.height == 0 and spec.width == 0:
+        return None
+
+    if spec.height == 0 or spec.width == 0:
+        raise InvalidPreprocess(
+            f"Need both a height and a width to resize; "
+            f"Got: `{[spec.height, spec.width]}`"
+        )
+
+    return spec.height, spec.width
+
+
+def _get_normalization(
+    spec: Preprocess, channels: int
+) -> Optional[Tuple[TFLiteTensor, TFLiteTensor]]:
+    """
+    :raises InvalidPreprocess: On normalization parameters that don't fit.
+    """
+    if len(spec.mean) == 0 and len(spec.std) == 0:
+        return None
+
+    if spec.dtype != Preprocess.FLOAT32:
+        raise InvalidPreprocess(
+            f"Normalization is only supported for FLOAT32 tensors; "
+            f"Got: `{Preprocess.DataType.Name(spec.dtype)}`"
+        )
+
+    def param(name: str, values: List[float], default: float) -> TFLiteTensor:
+        if len(values) == 0:
+            values = [default]
+
+        if len(values) not in (1, channels):
+            raise InvalidPreprocess(
+                f"Expected 1 or {channels} values for `{name}`, Got: {len(values)}"
+            )
+
+        return np.array(values, dtype=np.float32)
+
+    mean, std = param("mean", spec.mean, 0.0), param("std", spec.std, 1.0)
+
+    if (std == 0).any():
+        raise InvalidPreprocess(f"`std` can't be 0; Got: `{list(spec.std)}`")
+
+    return mean, std
+
+
+def _decode_image(
+    data: bytes, size: Optional[Tuple[int, int]], grayscale: bool
+) -> TFLiteTensor:
+    """
+    :raises ImageDecodeError: On data that isn't an image we can decode.
+
+    Returns a [height, width, channels] uint8 array.
+    """
+    mode = "L" if grayscale else "RGB"
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if size is not None:
+                # For JPEGs, this lets the decoder downscale (by powers of 2)
+                # while decoding; much cheaper than decoding the full image
+                # and then resizing all of it:
+                img.draft(mode, (size[1], size[0]))
+
+            img = img.convert(mode)
+
+            if size is not None and img.size != (size[1], size[0]):
+                img = img.resize((size[1], size[0]), resample=Image.BILINEAR)
+
+            arr: TFLiteTensor = np.asarray(img, dtype=np.uint8)
+    except (IOError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageDecodeError(f"Failed to decode an image: `{e}`")
+
+    if grayscale:
+        arr = arr[:, :, np.newaxis]
+
+    return arr
+
+
+def pb_images_to_tflite_tensors(pb: Images) -> List[TFLiteTensor]:
+    """
+    :raises ImageDecodeError: On data that isn't an image we can decode.
+    :raises InvalidPreprocess: On preprocessing specs we can't satisfy.
+
+    Returns a single tensor (in a list, to match `pb_to_tflite_tensors`).
+    """
+    spec: Preprocess = pb.preprocess
+    num_images = len(pb.images)
+
+    if num_images == 0:
+        raise InvalidPreprocess("Got an empty set of images.")
+
+    # Check the spec before we go spend time decoding:
+    size = _get_size(spec)
+    norm = _get_normalization(spec, 1 if spec.grayscale else 3)
+    decode = lambda data: _decode_image(data, size, spec.grayscale)
+
+    # Don't bother with the pool if there's only one image:
+    if num_images == 1:
+        arrs = [decode(pb.images[0])]
+    else:
+        arrs = list(_decode_pool.map(decode, pb.images))
+
+    shapes = {a.shape for a in arrs}
+    if len(shapes) != 1:
+        raise InvalidPreprocess(
+            f"The images in a batch must all be the same size (try setting a "
+            f"height and width); Got: `{sorted(shapes)}`"
+        )
+
+    batch: TFLiteTensor = arrs[0] if num_images == 1 else np.stack(arrs)
+    dtype = type_map_preprocess2numpy[spec.dtype]
+
+    # Normalize the whole batch at once:
+    if norm is not None:
+        mean, std = norm
+        batch = (batch.astype(np.float32) - mean) / std
+
+    tensor: TFLiteTensor = batch.astype(dtype, copy=False)
+
+    log.debug(
+        "Decoded %d image(s) into a %s %s", num_images, tensor.dtype, tensor.shape
+    )
+
+    return [tensor]
@@ -1,14 +1,40 @@
 from __future__ import annotations
 
-from typing import Optional, Union
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 from ..types import Metrics as MetricsMessage
 
+# The stages of a request that we time; names match the fields in
+# `Metrics.Stages`:
+QUEUE, DECODE, VALIDATE, RESIZE, INVOKE, FETCH, POST_PROCESS, ENCODE = STAGES = (
+    "queue",
+    "decode",
+    "validate",
+    "resize",
+    "invoke",
+    "fetch",
+    "post_process",
+    "encode",
+)
+
+
+class Span(NamedTuple):
+    name: str
+    begin: int  # perf_counter_ns
+    end: int
+    args: Optional[Dict[str, Any]] = None
+
 
 class Metrics:
     def __init__(self, time_to_execute: int = 0, trace_url: str = ""):
         self._trace_url: Optional[str]
         self._time_to_execute: Optional[int]
+        self._cache_hit: Optional[bool] = None
+        self._cache_hit_rate: Optional[float] = None
+        self._stages: Dict[str, int] = {}  # in ns
+        self._spans: Optional[List[Span]] = None  # only when tracing
 
         self.time_to_execute(time_to_execute)
         self.trace(trace_url)
@@ -23,6 +49,49 @@ class Metrics:
         self._trace_url = trace_url
         return self
 
+    def cache(self, hit: bool, hit_rate: float) -> Metrics:
+        assert 0.0 <= hit_rate <= 1.0
+
+        self._cache_hit = hit
+        self._cache_hit_rate = hit_rate
+        return self
+
+    def add_time(self, stage: str, ns: int) -> Metrics:
+        """Adds to the time spent in a stage (stages can be entered repeatedly)."""
+        assert stage in STAGES and ns >= 0
+
+        self._stages[stage] = self._stages.get(stage, 0) + ns
+        return self
+
+    def record_spans(self) -> Metrics:
+        """Start keeping track of when (not just for how long) things happen."""
+        if self._spans is None:
+            self._spans = []
+        return self
+
+    def span(self, name: str, begin: int, end: int, **args: Any) -> Metrics:
+        if self._spans is not None:
+            self._spans.append(Span(name, begin, end, args))
+        return self
+
+    def spans(self) -> Optional[List[Span]]:
+        return self._spans
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        begin = perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = perf_counter_ns()
+            self.add_time(stage, end - begin).span(stage, begin, end)
+
+    def get_time(self, stage: str) -> int:
+        return self._stages.get(stage, 0)
+
+    def stages(self) -> Tuple[Tuple[str, int], ...]:
+        return tuple((s, self._stages[s]) for s in STAGES if s in self._stages)
+
     def into(self) -> MetricsMessage:
         mm = MetricsMessage()
 
@@ -32,4 +101,13 @@ class Metrics:
         if self._trace_url:
             mm.trace_url = self._trace_url
 
+        if self._cache_hit is not None:
+            mm.cache_hit = self._cache_hit
+
+        if self._cache_hit_rate is not None:
+            mm.cache_hit_rate = self._cache_hit_rate
+
+        if self._stages:
+            mm.stages.CopyFrom(MetricsMessage.Stages(**self._stages))
+
         return mm
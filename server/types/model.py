@@ -1,26 +1,46 @@
 import pathlib
+import threading
 import urllib
 import zipfile
+from functools import lru_cache
+from heapq import heappop, heappush
+from importlib.util import find_spec
+from io import BytesIO
 from json import load as load_json_file
-from os import environ
+from os import environ, symlink
 from os.path import dirname, isfile, join
 from shutil import copyfile, rmtree
 from tempfile import mkdtemp
-from typing import Any, BinaryIO, Callable, Dict
+from time import monotonic, perf_counter_ns
+from typing import AbstractSet, Any, BinaryIO, Callable, Dict, List, NamedTuple
 from typing import NoReturn as Never
-from typing import Optional, Type, Union, cast
+from typing import Optional, Set, Tuple, Type, Union, cast
 from urllib.error import URLError
-from urllib.request import urlretrieve as download
 
-from tensorflow.compat.v1.lite import TFLiteConverter
-from tensorflowjs.converters.converter import (  # type: ignore
-    dispatch_keras_h5_to_tfjs_layers_model_conversion,
-    dispatch_keras_saved_model_to_tensorflowjs_conversion,
-    dispatch_tensorflowjs_to_keras_h5_conversion,
+from ..debug import dprint, if_debug
+from ..env import env_float
+from ..ingest import (
+    Ingestion,
+    LayoutFunc,
+    everything,
+    extract,
+    fetch,
+    save,
+    saved_model,
+    tfjs_layers,
 )
-
-from ..debug import dprint
-from ..types import MODEL_DIR, Model, ModelHandle
+from ..quantize import (
+    DYNAMIC_RANGE,
+    FLOAT16,
+    FULL_INTEGER,
+    NONE,
+    Comparison,
+    Optimization,
+    compare,
+    configure,
+)
+from ..types import MODEL_DIR, ConversionReport, Model, ModelHandle
+from .tensor import pb_to_tflite_tensors
 
 MT = Model.Type
 LocalHandle = int
@@ -42,8 +62,33 @@ class ModelConversionError(Exception):
     ...
 
 
+class Hop(NamedTuple):
+    source: Any  # `ModelType`s
+    target: Any
+    ms: float
+    # Set for hops that failed (and were routed around, if possible):
+    error: Optional[str] = None
+
+
+class Conversion:
+    """A conversion in progress: where its files go and what was asked for."""
+
+    def __init__(self, directory: str, optimization: Optimization = Optimization()):
+        self.directory = directory
+        self.optimization = optimization
+
+        # Set if the model was optimized:
+        self.comparison: Optional[Comparison] = None
+        # Every conversion that was run, in order:
+        self.hops: List[Hop] = []
+        # Getting the model onto disk:
+        self.ingestion = Ingestion()
+
+
 ModelType = Model.Type
-ConversionFunc = Callable[[str, str], bytes]
+# (conversion, path of the input model) -> None; writes the model's file for
+# the edge's target type.
+ConversionFunc = Callable[[Conversion, str], None]
 
 # Same deal with the Enum types here as in `error.py`; protobuf enums are not
 # actually python enums, so we're going to have to use a trick:
@@ -99,203 +144,541 @@ def _unimplemented(model_type: ModelType) -> Never:
     )
 
 
-def conversion_step(model_type: ModelType, directory: str) -> bytes:
-    """
-    :raises ModelConversionError: When given a model that we don't know how to
-                                  convert or when errors occur during model
-                                  conversion.
-    """
-    func: Optional[ConversionFunc] = model_conversion_steps.get(model_type)
-    model: str = get_path_for_model_type(model_type, directory)
+# The converters pull in all of TensorFlow (and tensorflowjs), which takes
+# seconds and hundreds of megabytes; workers that only serve TFLite models never
+# need them, so they're imported the first time a conversion actually runs:
 
-    if func is None:
-        raise ModelConversionError(
-            f"Unsupported model type (`{n(model_type)}`): No conversion function "
-            f"available!"
-        )
 
-    try:
-        dprint(f"Converting a `{n(model_type)}` model with `{func}` -> `{model}`.")
-        return func(directory, model)
-    except ModelConversionError as e:
-        raise e  # Pass this along unaltered
-    except Exception as e:
-        raise ModelConversionError(
-            f"Hit an error converting a `{n(model_type)}` model: {e}"
-        )
+def _tflite_converter() -> Any:
+    import tensorflow as tf
 
+    if_debug(lambda: tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.DEBUG))
 
-def tf_saved_model_to_tflite(directory: str, input_dir: str) -> bytes:
-    target = MT.TFLITE_FLAT_BUFFER
-    output = p(target, directory)
+    return tf.compat.v1.lite.TFLiteConverter
 
-    tflite = TFLiteConverter.from_saved_model(input_dir).convert()
 
-    with open(output, "wb") as f:
-        f.write(tflite)
+def _tfjs_converter() -> Any:
+    from tensorflowjs.converters import converter  # type: ignore
 
-    return conversion_step(target, directory)
+    return converter
 
 
-def keras_hdf5_to_tflite(directory: str, input_file: str) -> bytes:
-    target = MT.TFLITE_FLAT_BUFFER
-    output = p(target, directory)
+@lru_cache(maxsize=None)
+def _installed(package: str) -> bool:
+    return find_spec(package) is not None
 
-    tflite = TFLiteConverter.from_keras_model_file(input_file).convert()
+
+def _to_tflite(conversion: Conversion, converter: Callable[[], Any]) -> None:
+    """
+    Runs a `TFLiteConverter` (made by `converter`) and, if the conversion asks
+    for it, runs it again to produce an optimized model that's compared against
+    the float one.
+    """
+    output = p(MT.TFLITE_FLAT_BUFFER, conversion.directory)
+    optimization = conversion.optimization
+
+    tflite = converter().convert()
+
+    if optimization.mode != NONE:
+        optimizing = converter()
+        configure(optimizing, optimization)
+        optimized = optimizing.convert()
+
+        conversion.comparison = compare(tflite, optimized, optimization.dataset)
+        tflite = optimized
 
     with open(output, "wb") as f:
         f.write(tflite)
 
-    return conversion_step(target, directory)
 
+def saved_model_to_tflite(conversion: Conversion, input_dir: str) -> None:
+    _to_tflite(conversion, lambda: _tflite_converter().from_saved_model(input_dir))
 
-def keras_saved_model_to_tfjs_layers(directory: str, input_dir: str) -> bytes:
-    target = MT.TFJS_LAYERS
-    output = p(target, directory)
-    output_dir = join(dirname(output), "tfjs-layers-model")
 
-    dispatch_keras_saved_model_to_tensorflowjs_conversion(input_dir, output_dir)
-    copyfile(join(output_dir, "saved_model.json"), output)
-
-    return conversion_step(target, directory)
+def keras_file_to_tflite(conversion: Conversion, input_file: str) -> None:
+    _to_tflite(
+        conversion, lambda: _tflite_converter().from_keras_model_file(input_file)
+    )
 
 
-def keras_other_to_tfjs_layers(directory: str, input_file: str) -> bytes:
-    target = MT.TFJS_LAYERS
-    output = p(target, directory)
+def keras_saved_model_to_tfjs_layers(conversion: Conversion, input_dir: str) -> None:
+    output = p(MT.TFJS_LAYERS, conversion.directory)
     output_dir = join(dirname(output), "tfjs-layers-model")
 
-    dispatch_keras_h5_to_tfjs_layers_model_conversion(input_file, output_dir=output_dir)
+    _tfjs_converter().dispatch_keras_saved_model_to_tensorflowjs_conversion(
+        input_dir, output_dir
+    )
     copyfile(join(output_dir, "saved_model.json"), output)
 
-    return conversion_step(target, directory)
 
+def keras_other_to_tfjs_layers(conversion: Conversion, input_file: str) -> None:
+    output = p(MT.TFJS_LAYERS, conversion.directory)
+    output_dir = join(dirname(output), "tfjs-layers-model")
+
+    _tfjs_converter().dispatch_keras_h5_to_tfjs_layers_model_conversion(
+        input_file, output_dir
+    )
+    copyfile(join(output_dir, "saved_model.json"), output)
 
-def tfjs_layers_to_keras_hdf5(directory: str, input_file: str) -> bytes:
-    target = MT.KERAS_HDF5
-    output = p(target, directory)
 
-    dispatch_tensorflowjs_to_keras_h5_conversion(
-        join(input_file, TFJS_MODEL_NAME), output
+def tfjs_layers_to_keras_hdf5(conversion: Conversion, input_file: str) -> None:
+    _tfjs_converter().dispatch_tensorflowjs_to_keras_h5_conversion(
+        join(input_file, TFJS_MODEL_NAME), p(MT.KERAS_HDF5, conversion.directory)
     )
 
-    return conversion_step(target, directory)
+
+# Conversions form a graph: model types are the nodes and every converter we
+# have is an edge. Models get converted along the cheapest route to
+# `TFLITE_FLAT_BUFFER` (Dijkstra's), where an edge's cost is how long it's
+# taken when it worked (a moving average, starting from a guess) divided by how
+# often it's worked lately (old failures are forgotten). An edge that fails is
+# left out and the rest of the conversion is planned again from where it got
+# to; that's what lets speculative shortcuts (i.e. `KERAS_SAVED_MODEL` straight
+# to TFLite, skipping the TFJS round trip) be tried first without breaking
+# models they don't work for, and without one odd model ruling them out.
+#
+# Edges that fail outright (anything but the transient errors below) are also
+# switched off for a while: each (edge, error type) pair is a circuit breaker
+# that trips on such a failure and takes the edge out of planning until it has
+# cooled down, so that a shortcut that doesn't work for a model type isn't
+# tried (and waited on) again on every request. After that the edge gets one
+# more try; failing again trips it again and working resets all its breakers.
+
+
+class Edge(NamedTuple):
+    source: Any  # `ModelType`s
+    target: Any
+    func: ConversionFunc
+    # Until the edge has been run, a guess at how long it takes (ms):
+    estimate_ms: float
+    # The package the edge needs:
+    package: str = "tensorflow"
+
+    @property
+    def key(self) -> Tuple[Any, Any]:
+        return (self.source, self.target)
 
 
 # fmt: off
-# [Input Format] => (dir, file) -> TFLite model as a string
-model_conversion_steps: Dict[ModelType, ConversionFunc] = {
-    MT.TFLITE_FLAT_BUFFER: lambda _, f: open(f, "rb").read(),
-    MT.TF_SAVED_MODEL:     tf_saved_model_to_tflite,
-    MT.KERAS_HDF5:         keras_hdf5_to_tflite,
-    MT.KERAS_SAVED_MODEL:  keras_saved_model_to_tfjs_layers,
-    MT.KERAS_OTHER:        keras_other_to_tfjs_layers,
-    MT.TFJS_LAYERS:        tfjs_layers_to_keras_hdf5,
-    MT.TFJS_GRAPH:         lambda _, __: _unimplemented(MT.TFJS_GRAPH), # Can't do
-    MT.TF_HUB:             lambda _, __: _unimplemented(MT.TF_HUB),     # TODO
-    MT.GRAPH_DEFS:         lambda _, __: _unimplemented(MT.GRAPH_DEFS), # TODO
-}
+conversion_edges: List[Edge] = [
+    Edge(MT.TF_SAVED_MODEL,    MT.TFLITE_FLAT_BUFFER, saved_model_to_tflite,            2000.0),
+    Edge(MT.KERAS_HDF5,        MT.TFLITE_FLAT_BUFFER, keras_file_to_tflite,             2000.0),
+    # Keras SavedModels are SavedModels and "other" Keras models go through the
+    # TFJS converter's HDF5 path, so these can skip the TFJS round trip:
+    Edge(MT.KERAS_SAVED_MODEL, MT.TFLITE_FLAT_BUFFER, saved_model_to_tflite,            2000.0),
+    Edge(MT.KERAS_OTHER,       MT.TFLITE_FLAT_BUFFER, keras_file_to_tflite,             2000.0),
+    Edge(MT.KERAS_SAVED_MODEL, MT.TFJS_LAYERS,        keras_saved_model_to_tfjs_layers, 3000.0, "tensorflowjs"),
+    Edge(MT.KERAS_OTHER,       MT.TFJS_LAYERS,        keras_other_to_tfjs_layers,       3000.0, "tensorflowjs"),
+    Edge(MT.TFJS_LAYERS,       MT.KERAS_HDF5,         tfjs_layers_to_keras_hdf5,        3000.0, "tensorflowjs"),
+    # TFJS_GRAPH (can't do), TF_HUB and GRAPH_DEFS (TODO) have no edges.
+]
 # fmt: on
 
+# Weight of the newest sample in the moving averages:
+ALPHA = 0.2
+# An edge that never works still costs this fraction of its time:
+MIN_RELIABILITY = 0.05
+# Failures are forgotten over time: an edge's unreliability halves every this
+# many seconds. Failures can be down to the model rather than the edge, so an
+# edge that failed (even on every model for a while) gets tried again:
+RELIABILITY_HALF_LIFE_S: float = env_float(
+    "CONVERSION_RELIABILITY_HALF_LIFE_S", 600.0, minimum=1.0
+)
+
+# Errors that say more about the machine than the edge; these don't trip breakers:
+TRANSIENT_ERRORS: Tuple[Type[Exception], ...] = (OSError, MemoryError)
+BREAKER_COOLDOWN_S: float = env_float(
+    "CONVERSION_BREAKER_COOLDOWN_S", 600.0, minimum=0.0
+)
+
+_costs_lock = threading.Lock()
+# [edge key] => (moving average of the time the edge took when it worked in ms
+# (None until it has), moving average of whether it worked, when that was last
+# updated (`monotonic`)); edges that haven't run aren't in here:
+_costs: Dict[Tuple[Any, Any], Tuple[Optional[float], float, float]] = {}
+# [(edge key, error type name)] => when the breaker tripped (`monotonic`):
+_breakers: Dict[Tuple[Tuple[Any, Any], str], float] = {}
+
+
+def _reliability(key: Tuple[Any, Any]) -> float:
+    """How often an edge has worked, with old failures decayed away."""
+    if key not in _costs:
+        return 1.0
 
-def convert_model(model: Model) -> bytes:
+    _, reliability, updated = _costs[key]
+    decay = 0.5 ** ((monotonic() - updated) / RELIABILITY_HALF_LIFE_S)
+    return 1.0 - (1.0 - reliability) * decay
+
+
+def edge_cost(edge: Edge) -> float:
+    ms = _costs[edge.key][0] if edge.key in _costs else None
+    if ms is None:
+        ms = edge.estimate_ms
+
+    return ms / max(_reliability(edge.key), MIN_RELIABILITY)
+
+
+def record_hop(edge: Edge, ms: float, ok: bool) -> None:
+    with _costs_lock:
+        old_ms = _costs[edge.key][0] if edge.key in _costs else None
+
+        # Only hops that worked say how long the edge takes:
+        if not ok:
+            new_ms = old_ms
+        elif old_ms is None:
+            new_ms = ms
+        else:
+            new_ms = ALPHA * ms + (1 - ALPHA) * old_ms
+
+        # Edges start out trusted, so one failure doesn't rule an edge out:
+        reliability = ALPHA * ok + (1 - ALPHA) * _reliability(edge.key)
+        _costs[edge.key] = (new_ms, reliability, monotonic())
+
+
+def trip(edge: Edge, error: Exception) -> None:
+    """Switches `edge` off for a while if `error` isn't a transient one."""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return
+
+    with _costs_lock:
+        _breakers[(edge.key, type(error).__name__)] = monotonic()
+
+
+def reset(edge: Edge) -> None:
+    """The edge worked; closes its breakers."""
+    with _costs_lock:
+        for breaker in [b for b in _breakers if b[0] == edge.key]:
+            del _breakers[breaker]
+
+
+def tripped() -> Set[Tuple[Any, Any]]:
+    """Keys of the edges that have a breaker that hasn't cooled down yet."""
+    now = monotonic()
+    with _costs_lock:
+        return {
+            key
+            for (key, _), when in _breakers.items()
+            if now - when < BREAKER_COOLDOWN_S
+        }
+
+
+def conversion_costs() -> Dict[Tuple[Any, Any], float]:
+    """Current cost (ms) of every edge, by (source, target)."""
+    return {e.key: edge_cost(e) for e in conversion_edges}
+
+
+def plan(
+    source: ModelType,
+    target: ModelType = MT.TFLITE_FLAT_BUFFER,
+    exclude: AbstractSet[Tuple[Any, Any]] = frozenset(),
+    installed_only: bool = True,
+    skip_tripped: bool = True,
+) -> Optional[List[Edge]]:
+    """
+    The cheapest route from `source` to `target` over edges whose packages are
+    installed (unless `installed_only` is False), that aren't in `exclude` and
+    whose breakers haven't tripped (unless `skip_tripped` is False); None if
+    there isn't one.
+    """
+    if skip_tripped:
+        exclude = exclude | tripped()
+    edges = [
+        e
+        for e in conversion_edges
+        if e.key not in exclude and (_installed(e.package) or not installed_only)
+    ]
+
+    best: Dict[ModelType, float] = {source: 0.0}
+    via: Dict[ModelType, Edge] = {}
+    queue: List[Tuple[float, int, ModelType]] = [(0.0, 0, source)]
+    pushed = 0
+
+    while queue:
+        cost, _, node = heappop(queue)
+        if node == target:
+            route: List[Edge] = []
+            while node != source:
+                route.append(via[node])
+                node = via[node].source
+            return route[::-1]
+
+        if cost > best[node]:
+            continue
+
+        for edge in (e for e in edges if e.source == node):
+            c = cost + edge_cost(edge)
+            if c < best.get(edge.target, float("inf")):
+                best[edge.target], via[edge.target] = c, edge
+                pushed += 1
+                heappush(queue, (c, pushed, edge.target))
+
+    return None
+
+
+def conversion_step(model_type: ModelType, conversion: Conversion) -> bytes:
     """
-    :raises ModelAcquireError: When a model cannot be fetched.
     :raises ModelConversionError: When given a model that we don't know how to
                                   convert or when errors occur during model
                                   conversion.
-    :raises ModelDataError: On invalid model messages.
+
+    Converts the model in `conversion`'s directory (of type `model_type`) to
+    TFLite, one hop at a time, and returns the TFLite model.
     """
+    node = model_type
+    failed: Set[Tuple[Any, Any]] = set()
+    error: Optional[Exception] = None
+
+    while node != MT.TFLITE_FLAT_BUFFER:
+        # Edges that have been switched off beat no route at all:
+        route = plan(node, exclude=failed) or plan(
+            node, exclude=failed, skip_tripped=False
+        )
+        if route is None and error is None:
+            if plan(node, installed_only=False) is None:
+                _unimplemented(model_type)
+
+            missing = {e.package for e in conversion_edges if not _installed(e.package)}
+            raise ModelConversionError(
+                f"Converting `{n(model_type)}` models needs packages that aren't "
+                f"installed ({', '.join(sorted(missing))})."
+            )
+        if route is None:
+            raise ModelConversionError(
+                f"Hit an error converting a `{n(model_type)}` model: {error}"
+            )
+
+        edge = route[0]
+        model: str = p(edge.source, conversion.directory)
+        dprint(
+            f"Converting `{model}` to `{n(edge.target)}` with `{edge.func.__name__}` "
+            f"(route: {' -> '.join(n(e.target) for e in route)})."
+        )
+
+        begin = perf_counter_ns()
+        try:
+            edge.func(conversion, model)
+        except Exception as e:
+            ms = (perf_counter_ns() - begin) / 1e6
+            record_hop(edge, ms, ok=False)
+            trip(edge, e)
+            conversion.hops.append(Hop(edge.source, edge.target, ms, str(e)))
+
+            dprint(f"Converting to `{n(edge.target)}` failed ({e}); re-planning.")
+            failed.add(edge.key)
+            error = e
+            continue
+
+        ms = (perf_counter_ns() - begin) / 1e6
+        record_hop(edge, ms, ok=True)
+        reset(edge)
+        conversion.hops.append(Hop(edge.source, edge.target, ms))
+        node = edge.target
+
+    with open(p(MT.TFLITE_FLAT_BUFFER, conversion.directory), "rb") as f:
+        return f.read()
 
-    # Check that we've got a data source:
+
+# fmt: off
+optimization_modes: Dict[Any, str] = {
+    Model.Optimization.NONE: NONE,
+    Model.Optimization.DYNAMIC_RANGE: DYNAMIC_RANGE,
+    Model.Optimization.FLOAT16: FLOAT16,
+    Model.Optimization.FULL_INTEGER: FULL_INTEGER,
+}
+# fmt: on
+
+
+def convert_optimization(model: Model) -> Optimization:
+    """
+    :raises ModelDataError: On optimizations we can't do (i.e. full integer
+                            quantization without samples to calibrate with).
+    :raises MisshapenTensor: On sample tensors with inconsistent shapes.
+    :raises InvalidTensorMessage: On sample tensors that are missing fields.
+    """
+    pb = model.optimization
+    mode = optimization_modes.get(pb.mode)
+
+    if mode is None:
+        raise ModelDataError(f"Unknown optimization mode (`{pb.mode}`).")
+    if mode != NONE and model.type == MT.TFLITE_FLAT_BUFFER:
+        raise ModelDataError(
+            "TFLite models can't be optimized here; optimizations happen when "
+            "models are converted to TFLite."
+        )
+    if mode == FULL_INTEGER and not pb.representative_dataset:
+        raise ModelDataError(
+            "Full integer quantization needs a representative dataset to calibrate "
+            "with."
+        )
+
+    return Optimization(
+        mode, [pb_to_tflite_tensors(sample) for sample in pb.representative_dataset]
+    )
+
+
+def into_conversion_report(conversion: Conversion, report: ConversionReport) -> None:
+    i = conversion.ingestion
+    report.ingestion.CopyFrom(
+        ConversionReport.Ingestion(
+            received_bytes=i.received_bytes,
+            written_bytes=i.written_bytes,
+            skipped_bytes=i.skipped_bytes,
+            duration_ms=i.ns / 1e6,
+        )
+    )
+    report.hops.extend(
+        ConversionReport.Hop(
+            source=h.source, target=h.target, duration_ms=h.ms, error=h.error or ""
+        )
+        for h in conversion.hops
+    )
+
+    c = conversion.comparison
+    if c is not None:
+        report.optimization.CopyFrom(
+            ConversionReport.Optimization(
+                float_size_bytes=c.float_bytes,
+                size_bytes=c.optimized_bytes,
+                float_latency_ms=c.float_ms,
+                latency_ms=c.optimized_ms,
+                max_deviation=c.max_deviation,
+                mean_deviation=c.mean_deviation,
+            )
+        )
+
+
+# fmt: off
+# Which archive members models that come as a .zip need (the rest aren't
+# extracted); `everything` for the types that aren't here:
+archive_layouts: Dict[ModelType, LayoutFunc] = {
+    MT.TF_SAVED_MODEL:    saved_model,
+    MT.KERAS_SAVED_MODEL: saved_model,
+    MT.TFJS_LAYERS:       tfjs_layers(TFJS_MODEL_NAME),
+}
+# fmt: on
+
+
+def unknown_source(source: str) -> Never:
+    """:raises ModelDataError: Always."""
+    raise ModelDataError(
+        f"Model has a source type we don't know how to handle (`{source}`)."
+    )
+
+
+def local_model_file(data: Model.FromFile) -> str:
+    """:raises ModelDataError: If the file isn't there."""
+    file: str = join(MODEL_DIR, data.file)
+    dprint(f"Trying to load from local file: `{file}`.")
+
+    if not isfile(file):
+        raise ModelDataError(
+            f"The specified file model {file} doesn't seem to exist on the server."
+        )
+
+    return file
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Conversions only read their input, so a link to it is as good as a copy."""
+    try:
+        symlink(src, dst)
+    except OSError:
+        copyfile(src, dst)
+
+
+def _source(model: Model) -> Tuple[str, Any]:
+    """:raises ModelDataError: When the model doesn't have a source."""
     try:
         source: str = model.WhichOneof("source")
-        data: Union[Model.FromBytes, Model.FromURL] = getattr(model, source)
+        data: Union[Model.FromBytes, Model.FromURL, Model.FromFile] = getattr(
+            model, source
+        )
     except TypeError:
         raise ModelDataError(f"Model is missing a source (`{model}`).")
 
+    return source, data
+
+
+def acquire_model(model: Model, conversion: Conversion) -> None:
+    """
+    :raises ModelAcquireError: When a model cannot be fetched.
+    :raises ModelDataError: On invalid model messages or archives that can't be
+                            unzipped.
+    :raises ModelTooLarge: When the model (or what its archive expands to) is
+                           larger than the limits in `ingest.py`.
+    :raises InvalidArchive: When a model's archive doesn't have what its
+                            format needs or has members with unsafe paths.
+
+    Puts the model where its conversion expects it (see `ingest.py`).
+    """
+    source, data = _source(model)
+
     # For model type, we have no way of checking that we really have it; if it
     # wasn't specified we'll get 0 (TFLITE_FLAT_BUFFER). This is fine for now.
     model_type = model.type
 
-    directory = mkdtemp(prefix=f"{__name__}-")
-    cleanup: Callable[[], None] = lambda: rmtree(
-        directory
-    ) if DELETE_MODELS_AFTER_CONVERSION else None
+    directory = conversion.directory
+    ingestion = conversion.ingestion
     mkdirp: Callable[[str], None] = lambda p: pathlib.Path(p).mkdir(
         parents=True, exist_ok=True
     )
 
     try:
-        # Create a file for the model, no matter the source:
-        orig_model = join(directory, "original")
-
         target_model_path: str = get_path_for_model_type(model_type, directory)
 
         if source == "url" and (
             model_type == MT.TFJS_LAYERS or model_type == MT.TFJS_GRAPH
         ):
             # TFJS models are a special case since we need to also grab the
-            # weights.
+            # weights; the model JSON and the weight shards go straight into
+            # the model's folder (no .zip involved).
             url: str = cast(Model.FromURL, data).url
-            download(url, filename=orig_model)
-
-            # Get the next part of this script to do the right thing:
-            # (Unzip like normal, _unless_ we got a TFJS model as a URL -- in
-            # which case we've already made the directory structure and are not
-            # dealing with a .zip. In the latter case, the next part will go
-            # effectively rename `orig_model` to `TFJS_MODEL_NAME`)
-            target_model_path = join(target_model_path, TFJS_MODEL_NAME)
-
-            # Now grab all the weight shards in the model. We'll stick these in
-            # the folder that they'll actually end up being used in.
             base_url: str = dirname(url)
-            base_path: str = dirname(target_model_path)
+            mkdirp(target_model_path)
 
-            mkdirp(base_path)
+            model_json = join(target_model_path, TFJS_MODEL_NAME)
+            fetch(url, model_json, ingestion)
 
-            with open(orig_model, "r") as j:
+            with open(model_json, "r") as j:
                 tfjs_model = load_json_file(j)
 
             for w in [p for w in tfjs_model["weightsManifest"] for p in w["paths"]]:
-                download(join(base_url, w), filename=join(base_path, w))
-
-        elif source == "url":
-            download(cast(Model.FromURL, data).url, filename=orig_model)
-        elif source == "data":
-            with open(orig_model, "wb") as f:
-                f.write(cast(Model.FromBytes, data).data)
-        elif source == "file":
-            file: str = join(MODEL_DIR, cast(Model.FromFile, data).file)
-            dprint(f"Trying to load from local file: `{file}`.")
-
-            if not isfile(file):
-                raise ModelDataError(
-                    f"The specified file model {file} doesn't seem to exist on the server."
-                )
-
-            copyfile(file, orig_model)
-        else:
-            raise ModelDataError(
-                f"Model has a source type we don't know how to handle (`{source}`)."
-            )
-
-        # Move the model into it's right place, unzipping it if needed:
+                fetch(join(base_url, w), join(target_model_path, w), ingestion)
 
         # If the model path we're trying to make ends in a slash, it's a
-        # directory meaning it should have been given to us as a .zip file:
-        if target_model_path[-1] == "/":
+        # directory meaning it should have been given to us as a .zip file;
+        # only the parts of it the format needs get extracted:
+        elif target_model_path[-1] == "/":
+            layout = archive_layouts.get(model_type, everything)
             mkdirp(target_model_path)
 
-            with zipfile.ZipFile(orig_model, mode="r") as z:
-                z.extractall(path=target_model_path)
+            if source == "url":
+                archive = join(directory, "original")
+                fetch(cast(Model.FromURL, data).url, archive, ingestion)
+                extract(archive, target_model_path, layout, ingestion)
+            elif source == "data":
+                # Read in place; `BytesIO` doesn't copy the `bytes` it's given:
+                payload = cast(Model.FromBytes, data).data
+                extract(
+                    BytesIO(payload), target_model_path, layout, ingestion, len(payload)
+                )
+            elif source == "file":
+                file = local_model_file(cast(Model.FromFile, data))
+                extract(file, target_model_path, layout, ingestion)
+            else:
+                unknown_source(source)
 
-        # Otherwise, just copy the file to the expected path:
+        # Otherwise, the model goes straight to the expected path:
+        elif source == "url":
+            fetch(cast(Model.FromURL, data).url, target_model_path, ingestion)
+        elif source == "data":
+            save(cast(Model.FromBytes, data).data, target_model_path, ingestion)
+        elif source == "file":
+            link_or_copy(
+                local_model_file(cast(Model.FromFile, data)), target_model_path
+            )
         else:
-            copyfile(orig_model, target_model_path)
-
-        # Finally, with all of that out of the way, kick off the conversion:
-        tflite_str_model = conversion_step(model_type, directory)
+            unknown_source(source)
 
     # Identify Acquire Errors and let other errors propagate through, unchanged:
     except (ValueError, URLError) as e:
@@ -310,11 +693,48 @@ def convert_model(model: Model) -> bytes:
             f"zipped folder for models of type {n(model_type)})"
         )
 
+
+def convert_model(model: Model, report: Optional[ConversionReport] = None) -> bytes:
+    """
+    :raises ModelAcquireError: When a model cannot be fetched.
+    :raises ModelConversionError: When given a model that we don't know how to
+                                  convert or when errors occur during model
+                                  conversion.
+    :raises ModelDataError: On invalid model messages.
+    :raises ModelTooLarge: When the model (or what its archive expands to) is
+                           larger than the limits in `ingest.py`.
+    :raises InvalidArchive: When a model's archive doesn't have what its
+                            format needs or has members with unsafe paths.
+
+    If given a `report`, what happened during the conversion (how much of the
+    model was read and written, the time each hop took and how the optimized
+    model compares to the float one) gets filled in.
+    """
+
+    # Check that we've got a data source (before making any files):
+    _source(model)
+    optimization = convert_optimization(model)
+
+    directory = mkdtemp(prefix=f"{__name__}-")
+    conversion = Conversion(directory, optimization)
+    cleanup: Callable[[], None] = lambda: rmtree(
+        directory
+    ) if DELETE_MODELS_AFTER_CONVERSION else None
+
+    try:
+        acquire_model(model, conversion)
+
+        # Finally, with all of that out of the way, kick off the conversion:
+        tflite_str_model = conversion_step(model.type, conversion)
+
     # If we hit any kind of error, clean up:
     finally:
         cleanup()
 
     # If we made it, we're done!
+    if report is not None:
+        into_conversion_report(conversion, report)
+
     return tflite_str_model
 
 
@@ -0,0 +1,65 @@
+from typing import Any, Dict, Optional
+
+from ..admission import BULK, INTERACTIVE, NORMAL
+from ..affinity import available_cpus
+from ..delegates import AUTO, BACKENDS
+from ..options import InvalidModelOptions, ModelOptions
+from ..types import ModelOptions as ModelOptionsMessage
+
+# fmt: off
+priorities: Dict[Any, Optional[str]] = {
+    ModelOptionsMessage.UNSET:       None,
+    ModelOptionsMessage.INTERACTIVE: INTERACTIVE,
+    ModelOptionsMessage.NORMAL:      NORMAL,
+    ModelOptionsMessage.BULK:        BULK,
+}
+# fmt: on
+
+
+def convert_priority(priority: Any) -> Optional[str]:
+    """
+    :raises InvalidModelOptions: On priorities we don't know.
+
+    None for `UNSET`.
+    """
+    if priority not in priorities:
+        raise InvalidModelOptions(f"Unknown priority (`{priority}`).")
+
+    return priorities[priority]
+
+
+def convert_model_options(options: ModelOptionsMessage) -> ModelOptions:
+    """
+    :raises InvalidModelOptions: When asked to run on cores or with delegates
+                                 we don't have, or for invalid scheduling
+                                 options.
+    """
+    cpus = tuple(sorted(set(options.cpus)))
+
+    unavailable = set(cpus) - available_cpus()
+    if unavailable:
+        raise InvalidModelOptions(
+            f"Can't run on cores {sorted(unavailable)}; the server can only use "
+            f"cores {sorted(available_cpus())}."
+        )
+
+    if options.delegate not in ("", AUTO, *BACKENDS):
+        raise InvalidModelOptions(
+            f"Unknown delegate `{options.delegate}`; "
+            f"expected one of {['', AUTO, *BACKENDS]}."
+        )
+
+    if options.weight < 0:
+        raise InvalidModelOptions(f"Weights can't be negative ({options.weight}).")
+
+    return ModelOptions(
+        cache_entries=options.cache.max_entries,
+        cache_ttl=options.cache.ttl_ms / 1000,
+        native_batching=options.native_batching,
+        replicas=options.replicas or 1,
+        num_threads=options.num_threads,
+        cpus=cpus,
+        delegate=options.delegate,
+        priority=convert_priority(options.priority) or NORMAL,
+        weight=options.weight or 1.0,
+    )
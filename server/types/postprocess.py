@@ -0,0 +1,43 @@
+from typing import Optional
+
+from ..postprocess import (
+    InvalidPostProcess,
+    NonMaxSuppression,
+    PoseNetDecoder,
+    PostProcessor,
+)
+from ..types import PostProcess
+
+
+def convert_post_process(post_process: PostProcess) -> Optional[PostProcessor]:
+    """
+    :raises InvalidPostProcess: On post processing stages we can't construct.
+
+    Returns None if no post processing stage was asked for.
+    """
+    stage: Optional[str] = post_process.WhichOneof("stage")
+
+    if stage is None:
+        return None
+    elif stage == "posenet":
+        return PoseNetDecoder(post_process.posenet.output_stride)
+    elif stage == "nms":
+        nms = post_process.nms
+
+        # proto3 can't tell us if a field was set, so zeros mean defaults:
+        boxes_index, scores_index = nms.boxes_index, nms.scores_index
+        if boxes_index == scores_index:
+            boxes_index, scores_index = 0, 1
+
+        return NonMaxSuppression(
+            score_threshold=nms.score_threshold,
+            iou_threshold=nms.iou_threshold or 0.5,
+            max_detections=nms.max_detections or 20,
+            boxes_index=boxes_index,
+            scores_index=scores_index,
+            has_background_class=nms.has_background_class,
+        )
+    else:
+        raise InvalidPostProcess(
+            f"Post processing stage `{stage}` isn't supported (yet?)."
+        )
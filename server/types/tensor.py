@@ -5,9 +5,11 @@ from typing import Any, Dict, Iterable, List, Optional, Sized, Tuple, Type, Type
 import numpy as np
 from google.protobuf.message import Message
 
-from ..debug import dprint
+from ..debug import get_logger
 from ..types import Tensor, Tensors
 
+log = get_logger("tensor")
+
 # TFLite Tensors are really just numpy arrays.
 
 # In lieu of actual enums (from oneofs), we use these:
@@ -116,7 +118,7 @@ def _pb_to_tflite_tensor(pb: Tensor) -> TFLiteTensor:
         shape, dtype=dtype, buffer=np.array(arr, dtype=dtype)
     )
 
-    dprint(f"[INPUT] arr: {tensor}; shape: {shape}")
+    log.debug("[INPUT] arr: %s; shape: %s", tensor, shape)
     return tensor
 
 
@@ -155,7 +157,7 @@ def _tflite_tensor_to_pb(tensor: TFLiteTensor) -> Tensor:
             f"Failed to create a protobuf array; tried to use `({klass})`"
         )
 
-    dprint(f"[OUTPUT] tensor: {tensor}; shape: {shape}")
+    log.debug("[OUTPUT] tensor: %s; shape: %s", tensor, shape)
 
     # mypy can't figure out that array will be one of the acceptable types for
     # field in Tensor because of the values in type_map_numpy2pb, but this is
@@ -0,0 +1,184 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, environ, listdir
+from os.path import isabs, join, splitext
+from time import perf_counter_ns
+from typing import Any, Dict, List, Optional
+
+from google.protobuf import json_format
+
+from .debug import get_logger
+from .env import env_int
+from .model_store import ModelStore
+from .types import MODEL_DIR, LoadModelRequest, Model
+from .types.model import convert_model
+from .types.options import convert_model_options
+from .types.postprocess import convert_post_process
+
+# Models to load (and run) at startup, so that the first request for them is as
+# fast as the rest.
+#
+# `WARMUP_MODELS` is a comma separated list; each entry is either a `.tflite`
+# file in the local model directory (loaded without post processing or
+# options), a `LoadModelRequest` as JSON in a `.json` file (relative to the
+# local model directory, or absolute) for models that clients load with post
+# processing or options, or `*` for every `.tflite` file in the local model
+# directory.
+#
+# Models only end up sharing a handle with clients' load requests if they're
+# loaded the same way, so the requests should match what clients send.
+
+WARMUP_MODELS: List[str] = [
+    m.strip() for m in environ.get("WARMUP_MODELS", "").split(",") if m.strip()
+]
+WARMUP_RUNS: int = env_int("WARMUP_RUNS", 3, minimum=1)
+WARMUP_THREADS: int = env_int("WARMUP_THREADS", 0, minimum=0) or (cpu_count() or 1)
+
+log = get_logger("warmup")
+
+
+class WarmupConfigError(Exception):
+    ...
+
+
+def load_requests(entries: List[str]) -> Dict[str, LoadModelRequest]:
+    """
+    :raises WarmupConfigError: On entries we can't make sense of.
+
+    Load model requests for each entry, by name.
+    """
+    requests: Dict[str, LoadModelRequest] = {}
+
+    for entry in entries:
+        if entry == "*":
+            try:
+                files = sorted(f for f in listdir(MODEL_DIR) if f.endswith(".tflite"))
+            except OSError as e:
+                raise WarmupConfigError(f"Can't list the local model directory: {e}")
+
+            requests.update(load_requests(files))
+        elif splitext(entry)[1] == ".json":
+            path = entry if isabs(entry) else join(MODEL_DIR, entry)
+            try:
+                with open(path) as f:
+                    requests[entry] = json_format.Parse(f.read(), LoadModelRequest())
+            except (OSError, json_format.ParseError) as e:
+                raise WarmupConfigError(f"Bad warm up request (`{path}`): {e}")
+        elif splitext(entry)[1] == ".tflite":
+            requests[entry] = LoadModelRequest(
+                model=Model(
+                    file=Model.FromFile(file=entry), type=Model.TFLITE_FLAT_BUFFER
+                )
+            )
+        else:
+            raise WarmupConfigError(
+                f"Warm up entries should be `.tflite` or `.json` files; Got: `{entry}`."
+            )
+
+    return requests
+
+
+class ModelStatus:
+    def __init__(self) -> None:
+        self.state: str = "pending"  # pending, loading, ready, or failed
+        self.handle: Optional[int] = None
+        self.error: Optional[str] = None
+
+        # In milliseconds:
+        self.load_ms: Optional[float] = None
+        self.first_run_ms: Optional[float] = None
+        self.steady_run_ms: Optional[float] = None
+
+    def into(self) -> Dict[str, Any]:
+        return {k: v for k, v in vars(self).items() if v is not None}
+
+
+class Warmup:
+    """
+    Loads and warms up models on a background thread (with the models
+    themselves warmed up in parallel); `ready` is set once they're all done,
+    whether or not they succeeded.
+    """
+
+    def __init__(
+        self,
+        store: ModelStore,
+        requests: Dict[str, LoadModelRequest],
+        runs: int = WARMUP_RUNS,
+        threads: int = WARMUP_THREADS,
+    ):
+        self.store = store
+        self.requests = requests
+        self.runs = runs
+        self.threads = max(1, min(threads, len(requests)))
+
+        self.status: Dict[str, ModelStatus] = {n: ModelStatus() for n in requests}
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def start(self) -> "Warmup":
+        if not self.requests:
+            self._done.set()
+            return self
+
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+        return self
+
+    def _run(self) -> None:
+        begin = perf_counter_ns()
+
+        try:
+            with ThreadPoolExecutor(self.threads, thread_name_prefix="warmup") as pool:
+                for name in self.requests:
+                    pool.submit(self._warm_up, name)
+        finally:
+            self._done.set()
+
+        failed = [n for n, s in self.status.items() if s.state == "failed"]
+        log.info(
+            "Warmed up %d model(s) in %.0fms (%d failed).",
+            len(self.requests) - len(failed),
+            (perf_counter_ns() - begin) / 1e6,
+            len(failed),
+        )
+
+    def _warm_up(self, name: str) -> None:
+        req, status = self.requests[name], self.status[name]
+        status.state = "loading"
+
+        try:
+            begin = perf_counter_ns()
+            status.handle = self.store.load(
+                convert_model(req.model),
+                convert_post_process(req.post_process),
+                convert_model_options(req.options),
+            )
+            status.load_ms = (perf_counter_ns() - begin) / 1e6
+
+            model = self.store.get(status.handle)
+            status.first_run_ms, status.steady_run_ms = model.warm_up(self.runs)
+            status.state = "ready"
+
+            log.info(
+                "`%s` (handle %d): loaded in %.1fms; first run %.1fms, then %.1fms.",
+                name,
+                status.handle,
+                status.load_ms,
+                status.first_run_ms,
+                status.steady_run_ms,
+            )
+        except Exception as e:  # one bad model shouldn't stop the rest
+            status.state, status.error = "failed", f"{type(e).__name__}: {e}"
+            log.error("Failed to warm up `%s`: %s", name, status.error)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "models": {n: s.into() for n, s in self.status.items()},
+        }
@@ -0,0 +1,190 @@
+"""
+Generates small TFLite models, so that model store tests and benchmarks don't
+need the models `scripts/fetch` downloads (or the network).
+
+Models take any number of inputs of any (numeric) data type, flatten and
+concatenate them, run them through `depth` dense layers of `width` units
+(that's the knob for compute cost), and produce `outputs` outputs of
+`output_size` elements each.
+
+Models with `resizable` set accept other batch sizes (`resize_tensor_input`
+works); the rest bake a batch size of 1 into the graph and so have to be batched
+manually. Models without a batch dimension (`batch_dim`) also get batched
+manually.
+
+To write the standard set of models somewhere (i.e. the local model directory,
+for `benchmarks/load.py`):
+
+  python -m tests.synthetic $MODEL_DIR
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+Shape = Tuple[int, ...]
+
+
+class Spec(NamedTuple):
+    # (shape, numpy data type name) for each input; shapes don't include the
+    # batch dimension.
+    inputs: Sequence[Tuple[Shape, str]] = (((8,), "float32"),)
+    outputs: int = 1
+    output_size: int = 4
+    output_dtype: str = "float32"
+    depth: int = 1
+    width: int = 16
+    resizable: bool = True
+    batch_dim: bool = True
+    seed: int = 0
+
+    def input_shapes(self) -> List[Shape]:
+        """Input shapes, as the model sees them."""
+        return [((1,) + s) if self.batch_dim else s for s, _ in self.inputs]
+
+    def random_inputs(self, batch: int = 1) -> List[np.ndarray]:
+        """
+        Random inputs for the model, stacked into a batch (i.e. an extra leading
+        dimension) when `batch` isn't 1.
+        """
+        rng = np.random.RandomState(self.seed + batch)
+        tensors = []
+
+        for shape, dtype in self.inputs:
+            shape = ((batch,) + shape) if batch != 1 or self.batch_dim else shape
+            kind = np.dtype(dtype).kind
+
+            if kind == "f":
+                tensors.append(rng.randn(*shape).astype(dtype))
+            elif kind == "u":
+                tensors.append(rng.randint(0, 256, size=shape).astype(dtype))
+            else:
+                tensors.append(rng.randint(-128, 128, size=shape).astype(dtype))
+
+        return tensors
+
+
+def build(spec: Spec) -> bytes:
+    """Returns the model as a TFLite flatbuffer."""
+    if spec.resizable and not spec.batch_dim:
+        raise ValueError("Models without a batch dimension can't be resized.")
+
+    rng = np.random.RandomState(spec.seed)
+    sizes = [int(np.prod(s, dtype=np.int64)) for s, _ in spec.inputs]
+
+    def weights(fan_in: int, fan_out: int) -> tf.Tensor:
+        # Scaled so that activations don't blow up, however deep we go:
+        w = rng.randn(fan_in, fan_out) / np.sqrt(fan_in)
+        return tf.constant(w.astype(np.float32))
+
+    hidden = [
+        weights(sum(sizes) if i == 0 else spec.width, spec.width)
+        for i in range(spec.depth)
+    ]
+    heads = [
+        weights(spec.width if spec.depth else sum(sizes), spec.output_size)
+        for _ in range(spec.outputs)
+    ]
+
+    batch = None if spec.resizable else 1
+    signature = [
+        tf.TensorSpec(
+            ((batch,) + shape) if spec.batch_dim else shape,
+            tf.as_dtype(dtype),
+            name=f"input_{i}",
+        )
+        for i, (shape, dtype) in enumerate(spec.inputs)
+    ]
+    out_dtype = tf.as_dtype(spec.output_dtype)
+
+    @tf.function(input_signature=signature)
+    def model(*inputs: tf.Tensor) -> List[tf.Tensor]:
+        floats = [tf.cast(x, tf.float32) for x in inputs]
+
+        if spec.resizable:
+            rows = tf.shape(inputs[0])[0]
+            h = tf.concat(
+                [tf.reshape(x, [rows, n]) for x, n in zip(floats, sizes)], axis=1
+            )
+        else:
+            # Constant shapes are what make models fail to resize; these have
+            # to change the shape (the converter drops reshapes that don't):
+            h = tf.concat([tf.reshape(x, [1, n, 1]) for x, n in zip(floats, sizes)], 1)
+            h = tf.reshape(h, [1, sum(sizes)])
+        for w in hidden:
+            h = tf.tanh(tf.matmul(h, w))
+
+        outputs = []
+        for w in heads:
+            out = tf.matmul(h, w)
+            if not out_dtype.is_floating:
+                out = tf.clip_by_value(out * 64, out_dtype.min, out_dtype.max)
+            out = tf.cast(out, out_dtype)
+
+            outputs.append(out if spec.batch_dim else tf.reshape(out, [-1]))
+
+        return outputs
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [model.get_concrete_function()]
+    )
+    return converter.convert()
+
+
+# Models covering the interesting cases for batching and data types, along with
+# a couple of bigger ones for benchmarks:
+MODELS: Dict[str, Spec] = {
+    "resizable": Spec(),
+    "fixed": Spec(resizable=False),
+    "unbatched": Spec(inputs=(((2, 3), "float32"),), resizable=False, batch_dim=False),
+    # An output that leads with a 1 without it being a batch dimension:
+    "unbatched-1": Spec(
+        inputs=(((2, 3), "float32"),), output_size=1, resizable=False, batch_dim=False
+    ),
+    "multi-io": Spec(
+        inputs=(((4,), "float32"), ((2, 2), "float32")), outputs=3, resizable=False
+    ),
+    "multi-io-resizable": Spec(
+        inputs=(((4,), "float32"), ((2, 2), "float32")), outputs=3
+    ),
+    "uint8": Spec(inputs=(((6,), "uint8"),), output_dtype="uint8", resizable=False),
+    "int32": Spec(inputs=(((6,), "int32"),), output_dtype="int32"),
+    "image-fixed": Spec(
+        inputs=(((32, 32, 3), "float32"),), depth=4, width=256, resizable=False
+    ),
+    "image-resizable": Spec(inputs=(((32, 32, 3), "float32"),), depth=4, width=256),
+}
+
+
+def write_models(directory: str, models: Dict[str, Spec] = MODELS) -> Dict[str, str]:
+    """Writes `<name>.tflite` for each model; returns paths by name."""
+    os.makedirs(directory, exist_ok=True)
+    paths: Dict[str, str] = {}
+
+    for name, spec in models.items():
+        paths[name] = os.path.join(directory, f"{name}.tflite")
+        with open(paths[name], "wb") as f:
+            f.write(build(spec))
+
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--only", nargs="+", choices=sorted(MODELS))
+    args = parser.parse_args()
+
+    models = {n: s for n, s in MODELS.items() if not args.only or n in args.only}
+    for name, path in write_models(args.directory, models).items():
+        print(f"{name}: `{path}`", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
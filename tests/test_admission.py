@@ -0,0 +1,217 @@
+import threading
+import time
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+from server.admission import (
+    BULK,
+    INTERACTIVE,
+    NORMAL,
+    DeadlineExceeded,
+    Gate,
+    Overloaded,
+)
+
+
+def wait_for(cond: Callable[[], bool]) -> None:
+    deadline = time.time() + 5
+    while not cond():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def hold(gate: Gate, handle: str, release: threading.Event) -> threading.Thread:
+    """Takes a slot (or a spot in line) until `release` is set."""
+
+    def run() -> None:
+        with gate.admit(handle):
+            release.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_concurrency() -> None:
+    gate = Gate(concurrency=2, queue_limit=8)
+    release = threading.Event()
+    holders = [hold(gate, "a", release) for _ in range(2)]
+    wait_for(lambda: gate.running == 2)
+
+    ran: List[int] = []
+    most = [0]
+
+    def run(i: int) -> None:
+        with gate.admit("b"):
+            most[0] = max(most[0], gate.running)
+            time.sleep(0.01)
+            ran.append(i)
+
+    waiters = []
+    for i in range(4):
+        waiters.append(threading.Thread(target=run, args=(i,)))
+        waiters[-1].start()
+        wait_for(lambda: gate.waiting("b") == i + 1)
+
+    assert ran == []
+    release.set()
+    for t in holders + waiters:
+        t.join()
+
+    assert sorted(ran) == [0, 1, 2, 3] and most[0] == 2
+    assert gate.running == 0 and gate.waiting() == 0
+
+
+def test_bounded_queues() -> None:
+    gate = Gate(concurrency=1, queue_limit=2)
+    release = threading.Event()
+    threads = [hold(gate, "a", release)]
+    wait_for(lambda: gate.running == 1)
+
+    threads += [hold(gate, "a", release) for _ in range(2)]
+    wait_for(lambda: gate.waiting("a") == 2)
+
+    with pytest.raises(Overloaded):
+        with gate.admit("a"):
+            pass
+
+    # Other handles have queues of their own:
+    threads.append(hold(gate, "b", release))
+    wait_for(lambda: gate.waiting("b") == 1)
+
+    release.set()
+    for t in threads:
+        t.join()
+
+
+def test_deadlines() -> None:
+    gate = Gate(concurrency=1, queue_limit=8)
+    with gate.admit("a"):
+        time.sleep(0.05)
+
+    # Requests for `a` take ~50ms, so 10ms isn't enough:
+    with pytest.raises(DeadlineExceeded):
+        with gate.admit("a", perf_counter_ns() + 10_000_000):
+            assert False, "shouldn't run"
+
+    with gate.admit("a", perf_counter_ns() + 1_000_000_000):
+        pass
+
+    # A deadline that passes while waiting:
+    release = threading.Event()
+    holder = hold(gate, "b", release)
+    wait_for(lambda: gate.running == 1)
+
+    begin = time.time()
+    with pytest.raises(DeadlineExceeded) as e:
+        with gate.admit("c", perf_counter_ns() + 200_000_000):
+            assert False, "shouldn't run"
+
+    assert 0.15 < time.time() - begin < 1
+    assert e.value.retry_after_ms >= 0
+
+    release.set()
+    holder.join()
+    assert gate.waiting() == 0
+
+
+def queue_up(
+    gate: Gate, order: List[str], *requests: Tuple[str, Dict[str, Any]]
+) -> List[threading.Thread]:
+    """Queues up requests (name, `admit` kwargs), one at a time and in order."""
+    threads = []
+    for name, kwargs in requests:
+        handle = kwargs.pop("handle", name)
+        waiting = gate.waiting()
+
+        def run(name: str = name, handle: str = handle, kwargs: Any = kwargs) -> None:
+            with gate.admit(handle, **kwargs):
+                order.append(name)
+
+        threads.append(threading.Thread(target=run))
+        threads[-1].start()
+        wait_for(lambda: gate.waiting() == waiting + 1)
+
+    return threads
+
+
+def test_priorities_and_deadlines() -> None:
+    gate = Gate(concurrency=1, queue_limit=8)
+    release = threading.Event()
+    threads = [hold(gate, "holder", release)]
+    wait_for(lambda: gate.running == 1)
+
+    soon = perf_counter_ns() + 5_000_000_000
+    order: List[str] = []
+    threads += queue_up(
+        gate,
+        order,
+        ("bulk", dict(priority=BULK)),
+        ("normal", dict(priority=NORMAL)),
+        ("later", dict(priority=NORMAL, deadline_ns=soon + 1_000_000)),
+        ("sooner", dict(priority=NORMAL, deadline_ns=soon)),
+        ("interactive", dict(priority=INTERACTIVE)),
+    )
+
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert order == ["interactive", "sooner", "later", "normal", "bulk"]
+
+
+def test_reserved_slots() -> None:
+    gate = Gate(concurrency=2, queue_limit=8, reserved=1)
+    release = threading.Event()
+    order: List[str] = []
+
+    def bulk() -> None:
+        with gate.admit("bulk", priority=BULK):
+            release.wait()
+
+    threads = [threading.Thread(target=bulk) for _ in range(2)]
+    for t in threads:
+        t.start()
+
+    # Bulk work only gets one of the two slots..
+    wait_for(lambda: gate.running == 1 and gate.waiting() == 1)
+
+    # ..so interactive requests don't wait for it:
+    with gate.admit("interactive", priority=INTERACTIVE):
+        order.append("interactive")
+
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert order == ["interactive"]
+
+
+def test_weighted_fairness() -> None:
+    gate = Gate(concurrency=1, queue_limit=16)
+    gate._service_ms.update({"a": 10.0, "b": 10.0})
+
+    release = threading.Event()
+    threads = [hold(gate, "holder", release)]
+    wait_for(lambda: gate.running == 1)
+
+    order: List[str] = []
+    threads += queue_up(
+        gate,
+        order,
+        *[
+            (name, dict(weight=2.0 if name == "a" else 1.0))
+            for _ in range(6)
+            for name in ("a", "b")
+        ],
+    )
+
+    release.set()
+    for t in threads:
+        t.join()
+
+    # `a` gets twice the share while both have requests waiting:
+    assert order[:6].count("a") == 4 and order[:6].count("b") == 2
+    assert sorted(order) == ["a"] * 6 + ["b"] * 6
@@ -0,0 +1,58 @@
+import os
+import threading
+from typing import List, Set
+
+import pytest
+
+from server.affinity import SUPPORTED, available_cpus, pin, pinned
+
+needs_affinity = pytest.mark.skipif(not SUPPORTED, reason="no `sched_setaffinity`")
+
+
+@needs_affinity
+def test_pinned_restores() -> None:
+    before = os.sched_getaffinity(0)
+    core = min(before)
+
+    with pinned([core]):
+        assert os.sched_getaffinity(0) == {core}
+
+        # Nesting works too:
+        with pinned(before):
+            assert os.sched_getaffinity(0) == before
+        assert os.sched_getaffinity(0) == {core}
+
+    assert os.sched_getaffinity(0) == before
+
+    with pytest.raises(ZeroDivisionError):
+        with pinned([core]):
+            1 / 0
+    assert os.sched_getaffinity(0) == before
+
+
+@needs_affinity
+def test_pin_is_per_thread() -> None:
+    before = os.sched_getaffinity(0)
+    core = min(before)
+    seen: List[Set[int]] = []
+
+    def run() -> None:
+        pin([core])
+        seen.append(os.sched_getaffinity(0))
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+
+    assert seen == [{core}]
+    assert os.sched_getaffinity(0) == before
+
+
+def test_no_cpus_is_a_no_op() -> None:
+    before = available_cpus()
+
+    with pinned([]):
+        assert available_cpus() == before
+    pin(())
+
+    assert available_cpus() == before
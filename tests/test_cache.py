@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+
+from server.cache import ResultCache, digest_tensors
+
+
+def test_digest() -> None:
+    a = np.arange(12, dtype=np.float32)
+
+    assert digest_tensors([a]) == digest_tensors([a.copy()])
+    assert digest_tensors([a]) != digest_tensors([a.reshape(3, 4)])
+    assert digest_tensors([a]) != digest_tensors([a.astype(np.int32)])
+    assert digest_tensors([a]) != digest_tensors([a, a])
+
+    # Non-contiguous views digest the same as their contents:
+    b = np.arange(24, dtype=np.float32)[::2]
+    assert digest_tensors([b]) == digest_tensors([b.copy()])
+
+
+def test_lru() -> None:
+    cache = ResultCache(max_entries=2)
+    out = [np.zeros(3)]
+
+    cache.put(b"a", out)
+    cache.put(b"b", out)
+    assert cache.get(b"a") is out  # `a` is now the most recently used
+
+    cache.put(b"c", out)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is out and cache.get(b"c") is out
+
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate == 0.75
+
+
+def test_ttl() -> None:
+    cache = ResultCache(max_entries=2, ttl=0.01)
+
+    cache.put(b"a", [np.zeros(3)])
+    assert cache.get(b"a") is not None
+
+    time.sleep(0.02)
+    assert cache.get(b"a") is None
+
+
+def test_results_are_read_only() -> None:
+    cache = ResultCache(max_entries=1)
+    out = np.zeros(3)
+
+    cache.put(b"a", [out])
+    assert not out.flags.writeable
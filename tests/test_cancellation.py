@@ -0,0 +1,53 @@
+import socket
+from time import perf_counter_ns
+
+import pytest
+
+from server.cancellation import (
+    DEADLINE,
+    DISCONNECTED,
+    Cancelled,
+    CancelToken,
+    disconnect_probe,
+)
+
+
+def test_deadline() -> None:
+    CancelToken(perf_counter_ns() + 10_000_000_000).check()
+
+    token = CancelToken(perf_counter_ns() - 1)
+    with pytest.raises(Cancelled) as e:
+        token.check()
+    assert e.value.reason == token.reason == DEADLINE
+
+    # Once cancelled, always cancelled:
+    token.deadline_ns = None
+    with pytest.raises(Cancelled):
+        token.check()
+
+
+def test_cancel() -> None:
+    token = CancelToken()
+    token.check()
+
+    token.cancel(DISCONNECTED)
+    token.cancel(DEADLINE)
+    with pytest.raises(Cancelled) as e:
+        token.check()
+    assert e.value.reason == DISCONNECTED
+
+
+def test_disconnect_probe() -> None:
+    server, client = socket.socketpair()
+    with server, client, server.makefile("rb") as body:
+        disconnected = disconnect_probe({"wsgi.input": body})
+        assert disconnected is not None and not disconnected()
+
+        # Unread data isn't a hang up:
+        client.sendall(b"more")
+        assert not disconnected()
+
+        client.close()
+        assert disconnected()
+
+    assert disconnect_probe({}) is None
@@ -0,0 +1,76 @@
+from typing import Any
+
+import pytest
+
+from server.capture import CaptureFileError, CaptureWriter, read_capture
+from server.types import (
+    InferenceRequest,
+    LoadModelRequest,
+    Model,
+    ModelHandle,
+    Tensor,
+    Tensors,
+)
+
+
+def inference_request(handle: int, n: int) -> InferenceRequest:
+    tensor = Tensor(
+        floats=Tensor.FloatArray(array=[float(i) for i in range(n)]), dimensions=[n]
+    )
+    return InferenceRequest(
+        handle=ModelHandle(id=handle), tensors=Tensors(tensors=[tensor])
+    )
+
+
+def test_round_trip(tmpdir: Any) -> None:
+    path = str(tmpdir.join("capture.bin"))
+    load = LoadModelRequest(model=Model(file=Model.FromFile(file="model.tflite")))
+
+    writer = CaptureWriter(path, sample_rate=1.0)
+    writer.load_model(load, 1000, 3)
+    for i in range(300):
+        writer.inference(inference_request(3, i), 2000 + i)
+    writer.close()
+
+    records = list(read_capture(path))
+
+    assert len(records) == 301
+    assert records[0].load_model == load and records[0].handle.id == 3
+    assert records[0].timestamp_ns == 1000
+
+    for i, r in enumerate(records[1:]):
+        assert r.WhichOneof("request") == "inference"
+        assert r.inference == inference_request(3, i)
+        assert r.timestamp_ns == 2000 + i
+
+
+def test_sampling_and_appending(tmpdir: Any) -> None:
+    path = str(tmpdir.join("capture.bin"))
+    load = LoadModelRequest(model=Model(file=Model.FromFile(file="model.tflite")))
+
+    for _ in range(2):
+        writer = CaptureWriter(path, sample_rate=0.0)
+        writer.load_model(load, 1, None)  # loads are never sampled away
+        writer.inference(inference_request(0, 10), 2)
+        writer.close()
+
+    records = list(read_capture(path))
+
+    assert [r.WhichOneof("request") for r in records] == ["load_model"] * 2
+    assert not records[0].HasField("handle")
+
+
+def test_truncated(tmpdir: Any) -> None:
+    path = str(tmpdir.join("capture.bin"))
+
+    writer = CaptureWriter(path)
+    writer.inference(inference_request(0, 100), 1)
+    writer.close()
+
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+
+    with pytest.raises(CaptureFileError):
+        list(read_capture(path))
@@ -0,0 +1,99 @@
+from typing import Any
+
+from server import debug
+from server.debug import (
+    DEBUG,
+    INFO,
+    TRACE,
+    WARNING,
+    Logger,
+    _parse_categories,
+    _parse_level,
+    _parse_rate,
+    dprint,
+)
+
+
+class Unprintable:
+    def __str__(self) -> str:
+        raise AssertionError("Formatted a message that wasn't going to be logged!")
+
+
+def make_logger(level: int, sample_rate: float = 1.0) -> Logger:
+    log = Logger("test")
+    log.level, log.sample_rate = level, sample_rate
+
+    return log
+
+
+def test_disabled_messages_are_not_formatted(capsys: Any) -> None:
+    log = make_logger(WARNING)
+
+    log.debug("tensor: %s", Unprintable())
+    log.info("tensor: %s", Unprintable(), field=Unprintable())
+
+    with log.timed("nothing"):
+        pass
+
+    assert capsys.readouterr().err == ""
+    assert not log.enabled(INFO) and log.enabled(WARNING)
+
+
+def test_enabled_messages(capsys: Any) -> None:
+    log = make_logger(DEBUG)
+
+    log.debug("shape: %s", (1, 2), dtype="float32")
+    log.trace("too verbose")
+
+    assert capsys.readouterr().err == "[test] shape: (1, 2) dtype=float32\n"
+
+    log.level = TRACE
+    with log.timed("block"):
+        pass
+
+    err = capsys.readouterr().err
+    assert err.startswith("[test] block took ") and err.endswith("μs\n")
+
+
+def test_sampling(capsys: Any) -> None:
+    log = make_logger(DEBUG, sample_rate=0.0)
+    for _ in range(100):
+        log.debug("dropped")
+
+    assert capsys.readouterr().err == ""
+
+    log.sample_rate = 0.5
+    for _ in range(1000):
+        log.debug("maybe")
+
+    assert 300 < capsys.readouterr().err.count("\n") < 700
+
+
+def test_unknown_levels(capsys: Any) -> None:
+    assert _parse_level("Info", WARNING) == INFO
+    assert capsys.readouterr().err == ""
+
+    assert _parse_level("verbose", WARNING) == WARNING
+    assert "Unknown log level `verbose`" in capsys.readouterr().err
+
+
+def test_bad_sample_rates(capsys: Any, monkeypatch: Any) -> None:
+    monkeypatch.setenv("LOG_SAMPLE", "tensor:0.25,model:lots,cache:2,oops")
+    assert _parse_categories("LOG_SAMPLE", _parse_rate) == {
+        "tensor": 0.25,
+        "model": 1.0,
+        "cache": 1.0,
+    }
+    assert capsys.readouterr().err.count("\n") == 3
+
+
+def test_dprint(capsys: Any) -> None:
+    level = debug._log.level
+    debug._log.level = DEBUG
+    try:
+        dprint("a", 1, sep=", ", end="!\n")
+        dprint("b", "c")
+    finally:
+        debug._log.level = level
+
+    assert capsys.readouterr().err == "[server] a, 1!\n[server] b c\n"
@@ -0,0 +1,90 @@
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from server import delegates
+from server.delegates import (
+    ATOL,
+    BACKENDS,
+    INT_ATOL,
+    RTOL,
+    Backend,
+    DelegateSelectionError,
+    select,
+    thread_counts,
+)
+from server.model_store import LocalModel
+from server.ncore import InvalidDelegateLibrary
+from server.options import ModelOptions
+from server.runtime import outputs_agree
+from tests.synthetic import MODELS, write_models
+
+TEST_MODELS = {n: MODELS[n] for n in ("resizable", "multi-io")}
+
+
+@pytest.fixture(scope="module")
+def paths(tmp_path_factory: Any) -> Dict[str, str]:
+    return write_models(str(tmp_path_factory.mktemp("models")), TEST_MODELS)
+
+
+def broken() -> List[Any]:
+    raise InvalidDelegateLibrary("no such delegate")
+
+
+def test_thread_counts(monkeypatch: Any) -> None:
+    monkeypatch.setattr(delegates, "SUPPORTS_NUM_THREADS", True)
+    monkeypatch.setattr(delegates, "DELEGATE_THREADS", [])
+    cpu = Backend("cpu", lambda: None)
+
+    assert thread_counts(cpu, None, 1) == [1]
+    assert thread_counts(cpu, None, 4) == [1, 2, 4]
+    assert thread_counts(cpu, None, 6) == [1, 2, 4, 6]
+    assert thread_counts(cpu, 3, 6) == [3]
+    assert thread_counts(cpu._replace(threaded=False), None, 6) == [None]
+
+    monkeypatch.setattr(delegates, "DELEGATE_THREADS", [2, 8])
+    assert thread_counts(cpu, None, 6) == [2, 8]
+
+
+def test_outputs_agree() -> None:
+    q = np.array([[0, 127, 255]], dtype=np.uint8)
+    agree = lambda got, exp: outputs_agree(got, exp, RTOL, ATOL, INT_ATOL)
+
+    # Quantized kernels can round to a neighbouring step, but no further:
+    assert agree(np.array([[1, 128, 254]], dtype=np.uint8), q)
+    assert not agree(np.array([[2, 127, 255]], dtype=np.uint8), q)
+    assert not outputs_agree(np.array([[1, 127, 255]], dtype=np.uint8), q)
+
+    f = np.array([1.0, 2.0], dtype=np.float32)
+    assert agree(f * (1 + RTOL / 2), f)
+    assert not agree(f + 1, f)
+
+
+@pytest.mark.parametrize("name", sorted(TEST_MODELS))
+def test_select(paths: Dict[str, str], name: str) -> None:
+    backends = [BACKENDS["cpu"], Backend("broken", broken)]
+    selection = select({"model_path": paths[name]}, cpus=2, runs=2, backends=backends)
+
+    assert selection.backend.name == "cpu"
+    assert all(t.median_ms is not None for t in selection.trials if t.backend == "cpu")
+
+    (failed,) = [t for t in selection.trials if t.backend == "broken"]
+    assert failed.median_ms is None and "no such delegate" in str(failed.error)
+
+    with pytest.raises(DelegateSelectionError):
+        select({"model_path": paths[name]}, backends=backends[1:])
+
+
+def test_auto(paths: Dict[str, str]) -> None:
+    spec = TEST_MODELS["multi-io"]
+    inputs = spec.random_inputs()
+
+    auto = LocalModel(path=paths["multi-io"], options=ModelOptions(delegate="auto"))
+    outputs, _ = auto.predict(inputs)
+    expected, _ = LocalModel(path=paths["multi-io"]).predict(inputs)
+
+    assert auto.delegate is not None and auto.delegate.trials
+    assert auto.delegate.backend.name in BACKENDS
+    for out, exp in zip(outputs, expected):
+        np.testing.assert_allclose(out, exp, rtol=1e-2, atol=1e-3)
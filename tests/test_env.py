@@ -0,0 +1,28 @@
+from typing import Any
+
+from server.env import env_float, env_int
+
+
+def test_env_int(monkeypatch: Any) -> None:
+    monkeypatch.delenv("TEST_OPTION", raising=False)
+    assert env_int("TEST_OPTION", 4) == 4
+
+    monkeypatch.setenv("TEST_OPTION", " 12 ")
+    assert env_int("TEST_OPTION", 4, minimum=1) == 12
+
+
+def test_bad_values_get_the_default(monkeypatch: Any, capsys: Any) -> None:
+    for bad in ("twelve", "1.5", "0", "100"):
+        monkeypatch.setenv("TEST_OPTION", bad)
+        assert env_int("TEST_OPTION", 4, minimum=1, maximum=64) == 4
+
+    for bad in ("nan", "-0.5", "often"):
+        monkeypatch.setenv("TEST_OPTION", bad)
+        assert env_float("TEST_OPTION", 0.25, minimum=0.0, maximum=1.0) == 0.25
+
+    monkeypatch.setenv("TEST_OPTION", "")
+    assert env_float("TEST_OPTION", 0.25) == 0.25
+
+    warnings = capsys.readouterr().err.splitlines()
+    assert len(warnings) == 7
+    assert "TEST_OPTION=twelve" in warnings[0] and "1 to 64" in warnings[0]
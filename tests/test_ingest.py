@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import zipfile
+from typing import Any, Dict
+
+import pytest
+
+from server.ingest import (
+    Ingestion,
+    InvalidArchive,
+    ModelTooLarge,
+    everything,
+    extract,
+    save,
+    saved_model,
+    tfjs_layers,
+)
+
+
+def archive(members: Dict[str, bytes]) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+
+    buf.seek(0)
+    return buf
+
+
+def files(directory: str) -> Dict[str, bytes]:
+    found = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                found[os.path.relpath(path, directory).replace(os.sep, "/")] = f.read()
+
+    return found
+
+
+def test_saved_model(tmp_path: Any) -> None:
+    zipped = archive(
+        {
+            "model/saved_model.pb": b"graph",
+            "model/variables/variables.index": b"index",
+            "model/variables/variables.data-00000-of-00001": b"weights",
+            "model/assets/vocab.txt": b"vocab",
+            "model/checkpoints/ckpt-100.data": b"x" * 1000,
+            "model/notes.md": b"notes",
+            "__MACOSX/model/._saved_model.pb": b"clutter",
+        }
+    )
+    ingestion = Ingestion()
+    extract(zipped, str(tmp_path), saved_model, ingestion)
+
+    assert files(str(tmp_path)) == {
+        "saved_model.pb": b"graph",
+        "variables/variables.index": b"index",
+        "variables/variables.data-00000-of-00001": b"weights",
+        "assets/vocab.txt": b"vocab",
+    }
+    assert ingestion.written_bytes == ingestion.extracted_bytes == 22
+    assert ingestion.skipped_bytes == 1000 + 5 + 7
+
+    with pytest.raises(InvalidArchive):
+        extract(archive({"model.h5": b""}), str(tmp_path), saved_model, Ingestion())
+
+
+def test_tfjs_layers(tmp_path: Any) -> None:
+    manifest = {"weightsManifest": [{"paths": ["group1-shard1of1.bin"]}]}
+    zipped = archive(
+        {
+            "web/my-model.json": json.dumps(manifest).encode(),
+            "web/group1-shard1of1.bin": b"weights",
+            "web/other.json": b"{}",
+        }
+    )
+    extract(zipped, str(tmp_path), tfjs_layers("model.json"), Ingestion())
+
+    assert set(files(str(tmp_path))) == {"model.json", "group1-shard1of1.bin"}
+
+
+def test_limits(tmp_path: Any) -> None:
+    path = str(tmp_path / "model")
+    with pytest.raises(ModelTooLarge):
+        save(b"x" * 101, path, Ingestion(max_bytes=100))
+
+    # Compresses to (much) less than the limit but expands to more:
+    bomb = archive({"saved_model.pb": b"\0" * (1 << 20)})
+    assert len(bomb.getvalue()) < 1 << 12
+
+    with pytest.raises(ModelTooLarge):
+        extract(
+            bomb, str(tmp_path), saved_model, Ingestion(max_extracted_bytes=1 << 16)
+        )
+
+    with pytest.raises(ModelTooLarge):
+        extract(bomb, str(tmp_path), saved_model, Ingestion(max_bytes=100), size=101)
+
+
+def test_unsafe_paths(tmp_path: Any) -> None:
+    out = str(tmp_path / "out")
+
+    with pytest.raises(InvalidArchive):
+        extract(archive({"../../evil": b""}), out, everything, Ingestion())
+
+    zipped = archive({"saved_model.pb": b"", "variables/../../evil": b""})
+    with pytest.raises(InvalidArchive):
+        extract(zipped, out, saved_model, Ingestion())
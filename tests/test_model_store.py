@@ -0,0 +1,214 @@
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from server.cancellation import DISCONNECTED, Cancelled, CancelToken
+from server.model_store import (
+    InvalidHandleError,
+    LocalModel,
+    ModelRegisterError,
+    ModelStore,
+    TensorTypeError,
+)
+from server.options import ModelOptions
+from tests.synthetic import MODELS, Spec, write_models
+
+# Just the small ones; the image models are for benchmarks:
+TEST_MODELS = {n: s for n, s in MODELS.items() if not n.startswith("image")}
+
+
+@pytest.fixture(scope="module")
+def paths(tmp_path_factory: Any) -> Dict[str, str]:
+    return write_models(str(tmp_path_factory.mktemp("models")), TEST_MODELS)
+
+
+def model(paths: Dict[str, str], name: str) -> LocalModel:
+    return LocalModel(path=paths[name])
+
+
+def one_at_a_time(
+    m: LocalModel, spec: Spec, batch: List[np.ndarray]
+) -> List[np.ndarray]:
+    """
+    Runs each element of the batch by itself and joins the results the way
+    manual batches are (along the batch dimension, or a new one).
+    """
+    elements = [m.predict([t[i] for t in batch])[0] for i in range(len(batch[0]))]
+    join = np.concatenate if spec.batch_dim else np.stack
+
+    return [join([e[o] for e in elements]) for o in range(spec.outputs)]
+
+
+@pytest.mark.parametrize("name", sorted(TEST_MODELS))
+def test_single(paths: Dict[str, str], name: str) -> None:
+    spec = TEST_MODELS[name]
+    outputs, _ = model(paths, name).predict(spec.random_inputs())
+
+    assert len(outputs) == spec.outputs
+    for out in outputs:
+        assert out.dtype == np.dtype(spec.output_dtype)
+        assert out.shape == (
+            (1, spec.output_size) if spec.batch_dim else (spec.output_size,)
+        )
+
+
+@pytest.mark.parametrize("name", ["resizable", "int32"])
+def test_native_batch(paths: Dict[str, str], name: str) -> None:
+    spec, m = TEST_MODELS[name], model(paths, name)
+    batch = spec.random_inputs(batch=5)
+
+    outputs, _ = m.predict(batch)
+
+    # The interpreter was resized, rather than run once per element:
+    assert m.interp is not None
+    assert all(i["shape"][0] == 5 for i in m.interp.get_input_details())
+
+    for out, expected in zip(outputs, one_at_a_time(m, spec, batch)):
+        assert out.shape == (5, spec.output_size)
+        np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-5)
+
+
+# Inputs are resized one at a time, so a model with multiple inputs can't be
+# resized even if its graph could take the batch (resizing the first input
+# fails because the second one still has a batch of 1):
+@pytest.mark.parametrize("name", ["fixed", "multi-io", "multi-io-resizable", "uint8"])
+def test_manual_batch(paths: Dict[str, str], name: str) -> None:
+    spec, m = TEST_MODELS[name], model(paths, name)
+    batch = spec.random_inputs(batch=5)
+
+    # [5, 1, ...]: an extra dimension on top of the model's shape:
+    stacked = [np.expand_dims(t, 1) for t in batch]
+    outputs, _ = m.predict(stacked)
+    expected = one_at_a_time(m, spec, batch)
+
+    for out, exp in zip(outputs, expected):
+        assert out.shape == (5, spec.output_size)
+        np.testing.assert_array_equal(out, exp)
+
+    # [5, ...]: the same rank, but a batch size of 5 rather than 1:
+    outputs, _ = m.predict(batch)
+    for out, exp in zip(outputs, expected):
+        np.testing.assert_array_equal(out, exp)
+
+
+@pytest.mark.parametrize("name", ["fixed", "multi-io"])
+def test_replicas(paths: Dict[str, str], name: str, monkeypatch: Any) -> None:
+    monkeypatch.setattr("server.model_store.MAX_REPLICAS", 8)
+    spec = TEST_MODELS[name]
+    m = LocalModel(path=paths[name], options=ModelOptions(replicas=3))
+    batch = spec.random_inputs(batch=7)
+
+    outputs, metrics = m.predict(batch, trace=True)
+
+    # The primary interpreter takes a chunk too:
+    assert len(m._replicas) == 2
+    spans = metrics.spans()
+    assert spans is not None
+    replicas = {(s.args or {}).get("replica") for s in spans if s.name == "invoke"}
+    assert replicas == {0, 1, 2}
+
+    for out, exp in zip(outputs, one_at_a_time(model(paths, name), spec, batch)):
+        assert out.shape == (7, spec.output_size)
+        np.testing.assert_array_equal(out, exp)
+
+    # Batches smaller than the replica count don't use all of them:
+    outputs, _ = m.predict([t[:2] for t in batch])
+    for out, exp in zip(outputs, one_at_a_time(m, spec, [t[:2] for t in batch])):
+        np.testing.assert_array_equal(out, exp)
+
+
+@pytest.mark.parametrize("replicas", [1, 3])
+def test_cancellation(paths: Dict[str, str], replicas: int, monkeypatch: Any) -> None:
+    monkeypatch.setattr("server.model_store.MAX_REPLICAS", 8)
+    spec = TEST_MODELS["fixed"]
+    m = LocalModel(path=paths["fixed"], options=ModelOptions(replicas=replicas))
+    batch = spec.random_inputs(batch=6)
+
+    # The client "goes away" after the first couple of elements:
+    checks = [0]
+
+    def disconnected() -> bool:
+        checks[0] += 1
+        return checks[0] > 2
+
+    cancel = CancelToken(disconnected=disconnected)
+    with pytest.raises(Cancelled) as e:
+        m.predict(batch, cancel=cancel)
+
+    assert e.value.reason == cancel.reason == DISCONNECTED
+    assert 0 < cancel.skipped <= 4
+
+    # The interpreter(s) were released and still work:
+    outputs, _ = m.predict(batch, cancel=CancelToken())
+    for out, exp in zip(outputs, one_at_a_time(m, spec, batch)):
+        np.testing.assert_array_equal(out, exp)
+
+
+# Manual batches of models without a batch dimension get one added to their
+# outputs; they used to be put end to end instead:
+@pytest.mark.parametrize("name", ["unbatched", "unbatched-1"])
+def test_unbatched(paths: Dict[str, str], name: str) -> None:
+    spec, m = TEST_MODELS[name], model(paths, name)
+    batch = spec.random_inputs(batch=3)
+
+    outputs, _ = m.predict(batch)
+    old = np.concatenate([m.predict([t[i] for t in batch])[0][0] for i in range(3)])
+
+    assert old.shape == (3 * spec.output_size,)
+    assert outputs[0].shape == (3, spec.output_size)
+    np.testing.assert_array_equal(outputs[0].reshape(old.shape), old)
+    np.testing.assert_array_equal(outputs[0], one_at_a_time(m, spec, batch)[0])
+
+
+def test_singular(paths: Dict[str, str]) -> None:
+    spec, m = TEST_MODELS["fixed"], model(paths, "fixed")
+    (inp,) = spec.random_inputs()
+
+    # The batch dimension is optional for models that expect a batch of 1:
+    batched, _ = m.predict([inp])
+    singular, _ = m.predict([inp[0]])
+
+    np.testing.assert_array_equal(batched[0], singular[0])
+
+
+def test_int32_inputs_are_cast(paths: Dict[str, str]) -> None:
+    spec, m = TEST_MODELS["uint8"], model(paths, "uint8")
+    (inp,) = spec.random_inputs()
+
+    expected, _ = m.predict([inp])
+    outputs, _ = m.predict([inp.astype(np.int32)])
+
+    np.testing.assert_array_equal(outputs[0], expected[0])
+
+
+def test_mismatches(paths: Dict[str, str]) -> None:
+    m = model(paths, "multi-io")
+    a, b = TEST_MODELS["multi-io"].random_inputs(batch=4)
+
+    with pytest.raises(TensorTypeError):
+        m.predict([a])  # too few tensors
+    with pytest.raises(TensorTypeError):
+        m.predict([a.astype(np.float64), b])  # wrong data type
+    with pytest.raises(TensorTypeError):
+        m.predict([a[:, :3], b])  # wrong shape
+    with pytest.raises(TensorTypeError):
+        m.predict([a, b[:2]])  # manual batch sizes don't agree
+
+
+def test_model_store(paths: Dict[str, str]) -> None:
+    store = ModelStore()
+
+    with open(paths["fixed"], "rb") as f:
+        data = f.read()
+
+    handle = store.load(data)
+    assert store.load(data) == handle
+    assert store.load(data, options=ModelOptions(cache_entries=4)) != handle
+    assert store._load_from_file(paths["resizable"]) == handle + 2
+
+    with pytest.raises(InvalidHandleError):
+        store.get(len(store.models))
+
+    with pytest.raises(ModelRegisterError):
+        LocalModel(path=paths["fixed"] + ".missing")
@@ -0,0 +1,177 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+from server import delegates
+from server.delegates import Backend
+from server.model_store import LocalModel, ModelStore
+from server.multiplex import Multiplexer, multiplexer
+from server.options import ModelOptions
+from tests.synthetic import MODELS, write_models
+
+
+class Tenant:
+    def __init__(self, name: str, log: List[Tuple[str, str]], fail: bool = False):
+        self.name, self.log, self.fail = name, log, fail
+
+    def activate(self) -> None:
+        if self.fail:
+            raise RuntimeError("can't load")
+        self.log.append(("+", self.name))
+
+    def deactivate(self) -> None:
+        self.log.append(("-", self.name))
+
+
+def wait_for(cond: Callable[[], bool]) -> None:
+    deadline = time.time() + 5
+    while not cond():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def test_grouping() -> None:
+    mux = Multiplexer("test", group_limit=2)
+    log: List[Tuple[str, str]] = []
+    a, b = Tenant("a", log), Tenant("b", log)
+    order: List[str] = []
+    gate = threading.Event()
+
+    blocker = threading.Thread(target=lambda: mux.run(a, gate.wait))
+    blocker.start()
+    wait_for(lambda: mux._busy)
+
+    threads = []
+    for tenant, name in ((b, "b1"), (a, "a1"), (b, "b2"), (a, "a2"), (a, "a3")):
+        t = threading.Thread(
+            target=lambda tenant=tenant, name=name: mux.run(
+                tenant, lambda: order.append(name)
+            )
+        )
+        t.start()
+        threads.append(t)
+        wait_for(lambda n=len(threads): len(mux._queue) == n)
+
+    gate.set()
+    for t in [blocker] + threads:
+        t.join()
+
+    # `a` (on the device) goes first, but only twice in a row while `b` waits:
+    assert order == ["a1", "a2", "b1", "b2", "a3"]
+    assert [e for e in log if e[0] == "+"] == [("+", "a"), ("+", "b"), ("+", "a")]
+    assert mux.stats(a).swaps == 2 and mux.stats(b).swaps == 1
+    assert mux.stats(a).device_runs == 4
+
+
+def test_cpu_fallback() -> None:
+    mux = Multiplexer("test")
+    log: List[Tuple[str, str]] = []
+    a, b = Tenant("a", log), Tenant("b", log)
+    device, cpu = lambda: "device", lambda: "cpu"
+
+    assert mux.run(a, device, cpu) == "device"
+
+    # `b` would need a swap and we don't know how it does on the CPU yet:
+    assert mux.run(b, device, cpu) == "cpu"
+    assert mux.active is a
+
+    # Now we know; the CPU is slower than swapping:
+    stats = mux.stats(b)
+    stats.cpu_ms, stats.swap_ms, stats.device_ms = 100.0, 10.0, 1.0
+    assert mux.run(b, device, cpu) == "device"
+    assert mux.active is b
+
+    # ..and quicker:
+    stats = mux.stats(a)
+    stats.cpu_ms, stats.swap_ms, stats.device_ms = 5.0, 50.0, 1.0
+    assert mux.run(a, device, cpu) == "cpu"
+    assert mux.run(a, device) == "device"  # no choice
+
+    assert (mux.stats(a).cpu_runs, mux.stats(b).cpu_runs) == (1, 1)
+
+
+def test_hold_and_failures() -> None:
+    mux = Multiplexer("test")
+    log: List[Tuple[str, str]] = []
+    a, broken = Tenant("a", log), Tenant("broken", log, fail=True)
+
+    mux.run(a, lambda: None)
+    with mux.hold():
+        assert mux.active is None and log[-1] == ("-", "a")
+
+    with pytest.raises(RuntimeError):
+        mux.run(broken, lambda: None)
+
+    # The device was given back:
+    assert mux.run(a, lambda: "ok") == "ok"
+
+
+# With a fake delegate that, like NCore, only holds one model at a time:
+
+TEST_MODELS = {n: MODELS[n] for n in ("fixed", "resizable", "multi-io")}
+FAKE = "fake-ncore"
+
+
+@pytest.fixture(scope="module")
+def paths(tmp_path_factory: Any) -> Dict[str, str]:
+    return write_models(str(tmp_path_factory.mktemp("models")), TEST_MODELS)
+
+
+@pytest.fixture
+def store(monkeypatch: Any) -> ModelStore:
+    store = ModelStore()
+
+    def load() -> Optional[List[Any]]:
+        # The driver's single loadable:
+        loaded = [m for m in store.models if m.interp is not None]
+        assert len(loaded) == 0, "a model was loaded while another was on the device"
+
+        time.sleep(0.005)  # Compiling + loading the loadable takes a while.
+        return None  # (runs on the CPU)
+
+    monkeypatch.setitem(
+        delegates.BACKENDS, FAKE, Backend(FAKE, load, threaded=False, exclusive=True)
+    )
+    return store
+
+
+def test_models_share_the_device(store: ModelStore, paths: Dict[str, str]) -> None:
+    options = ModelOptions(delegate=FAKE)
+    models: Dict[str, LocalModel] = {}
+    for name, path in paths.items():
+        with open(path, "rb") as f:
+            models[name] = store.get(store.load(f.read(), None, options))
+
+    inputs = {n: TEST_MODELS[n].random_inputs() for n in TEST_MODELS}
+    expected = {n: LocalModel(path=paths[n]).predict(inputs[n])[0] for n in paths}
+    errors: List[Exception] = []
+
+    def check(name: str) -> None:
+        try:
+            outputs, _ = models[name].predict(inputs[name])
+            for out, exp in zip(outputs, expected[name]):
+                np.testing.assert_array_equal(out, exp)
+        except Exception as e:
+            errors.append(e)
+
+    # Round robin (so, lots of swapping or falling back to the CPU), from
+    # several threads at once:
+    threads = [
+        threading.Thread(target=lambda: [check(n) for n in sorted(TEST_MODELS) * 3])
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+
+    mux = multiplexer(FAKE)
+    stats = [mux.stats(m) for m in models.values()]
+    assert sum(s.device_runs + s.cpu_runs for s in stats) == 4 * 3 * len(models)
+    assert all(s.swaps >= 1 for s in stats)
+    assert sum(m.interp is not None for m in models.values()) <= 1
@@ -0,0 +1,199 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from server.postprocess import (
+    InvalidPostProcess,
+    NonMaxSuppression,
+    PoseNetDecoder,
+    PostProcessError,
+    PostProcessor,
+    Tensor,
+)
+
+
+def decode_single_pose_naive(
+    heatmaps: Tensor, offsets: Tensor, stride: int
+) -> Tuple[List[Tuple[float, float]], List[float]]:
+    """Loop-y port of `decodeSinglePose` (for one batch element)."""
+    height, width, parts = heatmaps.shape
+    keypoints, scores = [], []
+
+    for k in range(parts):
+        y, x = divmod(int(np.argmax(heatmaps[:, :, k].reshape(-1))), width)
+        keypoints.append(
+            (
+                y * stride + float(offsets[y, x, k]),
+                x * stride + float(offsets[y, x, k + parts]),
+            )
+        )
+        scores.append(float(1 / (1 + np.exp(-heatmaps[y, x, k]))))
+
+    return keypoints, scores
+
+
+def rand_posenet_outputs(
+    batch: int, height: int = 9, width: int = 9, parts: int = 17
+) -> Tuple[Tensor, Tensor]:
+    heatmaps = np.random.randn(batch, height, width, parts).astype(np.float32)
+    offsets = np.random.randn(batch, height, width, parts * 2).astype(np.float32)
+
+    return heatmaps, offsets
+
+
+@pytest.mark.parametrize("batch", [1, 4])
+@pytest.mark.parametrize("stride", [8, 16, 32])
+def test_posenet_matches_naive(batch: int, stride: int) -> None:
+    heatmaps, offsets = rand_posenet_outputs(batch)
+
+    keypoints, scores, pose_scores = PoseNetDecoder(stride)([heatmaps, offsets])
+
+    assert keypoints.shape == (batch, 17, 2)
+    assert scores.shape == (batch, 17)
+    assert pose_scores.shape == (batch,)
+
+    for b in range(batch):
+        exp_keypoints, exp_scores = decode_single_pose_naive(
+            heatmaps[b], offsets[b], stride
+        )
+
+        assert np.allclose(keypoints[b], exp_keypoints, atol=1e-4)
+        assert np.allclose(scores[b], exp_scores, atol=1e-6)
+        assert np.isclose(pose_scores[b], np.mean(exp_scores), atol=1e-6)
+
+
+def test_posenet_unbatched() -> None:
+    heatmaps, offsets = rand_posenet_outputs(1)
+
+    batched = PoseNetDecoder(16)([heatmaps, offsets])
+    unbatched = PoseNetDecoder(16)([heatmaps[0], offsets[0]])
+
+    for b, u in zip(batched, unbatched):
+        assert (b == u).all()
+
+
+def test_posenet_errors() -> None:
+    heatmaps, offsets = rand_posenet_outputs(1)
+
+    with pytest.raises(InvalidPostProcess):
+        PoseNetDecoder(17)
+
+    with pytest.raises(PostProcessError):
+        PoseNetDecoder(16)([heatmaps])
+
+    with pytest.raises(PostProcessError):
+        PoseNetDecoder(16)([heatmaps, offsets[..., :17]])
+
+
+def test_posenet_identity() -> None:
+    assert PoseNetDecoder(16) == PoseNetDecoder(16)
+    assert PoseNetDecoder(16) != PoseNetDecoder(32)
+    assert len({PoseNetDecoder(8), PoseNetDecoder(8)}) == 1
+
+
+def test_post_processors_need_a_key() -> None:
+    class NoKey(PostProcessor):
+        def __call__(self, outputs: List[Tensor]) -> List[Tensor]:
+            return outputs
+
+    with pytest.raises(TypeError):
+        NoKey()  # type: ignore
+
+
+def nms_naive(
+    boxes: Tensor, scores: Tensor, score_thresh: float, iou_thresh: float, max_det: int
+) -> List[int]:
+    """Textbook greedy NMS for one image; returns the indexes of the kept boxes."""
+    best = scores.max(axis=1)
+    order = [
+        int(i) for i in np.argsort(-best, kind="stable") if best[i] >= score_thresh
+    ]
+    kept: List[int] = []
+
+    def iou(a: Tensor, b: Tensor) -> float:
+        h = max(min(a[2], b[2]) - max(a[0], b[0]), 0)
+        w = max(min(a[3], b[3]) - max(a[1], b[1]), 0)
+        inter = h * w
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return float(inter / union) if union > 0 else 0.0
+
+    for i in order:
+        if len(kept) == max_det:
+            break
+        if all(iou(boxes[i], boxes[k]) <= iou_thresh for k in kept):
+            kept.append(i)
+
+    return kept
+
+
+def rand_detector_outputs(
+    batch: int, num_boxes: int = 200, classes: int = 10
+) -> Tuple[Tensor, Tensor]:
+    corners = np.random.rand(batch, num_boxes, 2, 2).astype(np.float32)
+    # (y_min, x_min, y_max, x_max):
+    boxes = np.concatenate([corners.min(axis=2), corners.max(axis=2)], axis=2)
+    scores = np.random.rand(batch, num_boxes, classes).astype(np.float32)
+
+    return boxes, scores
+
+
+@pytest.mark.parametrize("batch", [1, 3])
+def test_nms_matches_naive(batch: int) -> None:
+    boxes, scores = rand_detector_outputs(batch)
+    nms = NonMaxSuppression(score_threshold=0.5, iou_threshold=0.3, max_detections=15)
+
+    out_boxes, out_classes, out_scores, num = nms([boxes, scores])
+
+    assert out_boxes.shape == (batch, 15, 4)
+    assert out_classes.shape == out_scores.shape == (batch, 15)
+    assert num.shape == (batch,)
+
+    for b in range(batch):
+        kept = nms_naive(boxes[b], scores[b], 0.5, 0.3, 15)
+        n = len(kept)
+
+        assert num[b] == n
+        assert np.allclose(out_boxes[b, :n], boxes[b, kept])
+        assert (out_classes[b, :n] == scores[b, kept].argmax(axis=1)).all()
+        assert np.allclose(out_scores[b, :n], scores[b, kept].max(axis=1))
+
+        # Padding is zeroed:
+        assert (out_boxes[b, n:] == 0).all() and (out_scores[b, n:] == 0).all()
+
+
+def test_nms_ssd_layout() -> None:
+    boxes, scores = rand_detector_outputs(2, classes=91)
+    nms = NonMaxSuppression(
+        boxes_index=1, scores_index=0, has_background_class=True, score_threshold=0.9
+    )
+
+    # [batch, num_boxes, 1, 4] boxes, after the scores:
+    out = nms([scores, boxes[:, :, np.newaxis, :]])
+    exp = NonMaxSuppression(score_threshold=0.9)([boxes, scores[:, :, 1:]])
+
+    for o, e in zip(out, exp):
+        assert (o == e).all()
+
+
+def test_nms_nothing_above_threshold() -> None:
+    boxes, scores = rand_detector_outputs(2)
+    _, _, out_scores, num = NonMaxSuppression(score_threshold=1.5)([boxes, scores])
+
+    assert (num == 0).all() and (out_scores == 0).all()
+
+
+def test_nms_errors() -> None:
+    boxes, scores = rand_detector_outputs(1)
+
+    with pytest.raises(InvalidPostProcess):
+        NonMaxSuppression(iou_threshold=1.5)
+
+    with pytest.raises(InvalidPostProcess):
+        NonMaxSuppression(boxes_index=1, scores_index=1)
+
+    with pytest.raises(PostProcessError):
+        NonMaxSuppression()([boxes])
+
+    with pytest.raises(PostProcessError):
+        NonMaxSuppression()([boxes[:, :, :3], scores])
@@ -0,0 +1,84 @@
+import json
+import os
+from os.path import join
+from typing import Any
+
+from server.profiling import OpProfile, TraceStore, chrome_trace, parse_op_profile
+from server.types.metrics import DECODE, INVOKE, Span
+
+BENCHMARK_OUTPUT = """
+Running benchmark for at least 20 iterations and at least 1 seconds
+count=20 first=4301 curr=4192 min=4102 max=4566 avg=4253.2 std=109
+Profiling Info for Benchmark Initialization:
+============================== Run Order ==============================
+	             [node type]	          [start]	  [first]	 [avg ms]	     [%]	  [cdf%]	  [mem KB]	[times called]	[Name]
+	 AllocateTensors	            0.000	    0.310	    0.310	100.000%	100.000%	     0.000	        1	[AllocateTensors/0]
+
+Operator-wise Profiling Info for Regular Benchmark Runs:
+============================== Run Order ==============================
+	             [node type]	          [start]	  [first]	 [avg ms]	     [%]	  [cdf%]	  [mem KB]	[times called]	[Name]
+	                 CONV_2D	            0.000	    1.269	    1.294	 30.158%	 30.158%	     0.000	        1	[MobilenetV1/Conv2d_0/Relu6]
+	       DEPTHWISE_CONV_2D	            1.297	    0.950	    0.962	 22.421%	 52.579%	     0.000	        1	[MobilenetV1/Conv2d_1_depthwise/Relu6]
+	                 SOFTMAX	            2.262	    0.031	    0.030	  0.699%	 53.278%	     0.000	        1	[MobilenetV1/Predictions/Reshape_1]
+
+============================== Top by Computation Time ==============================
+	             [node type]	          [start]	  [first]	 [avg ms]	     [%]	  [cdf%]	  [mem KB]	[times called]	[Name]
+	                 CONV_2D	            0.000	    1.269	    1.294	 30.158%	 30.158%	     0.000	        1	[MobilenetV1/Conv2d_0/Relu6]
+"""
+
+
+def test_parse_op_profile() -> None:
+    ops = parse_op_profile(BENCHMARK_OUTPUT.split("Regular Benchmark Runs")[1])
+
+    assert ops == [
+        OpProfile("CONV_2D", "MobilenetV1/Conv2d_0/Relu6", 0.0, 1.294, 1),
+        OpProfile(
+            "DEPTHWISE_CONV_2D", "MobilenetV1/Conv2d_1_depthwise/Relu6", 1.297, 0.962, 1
+        ),
+        OpProfile("SOFTMAX", "MobilenetV1/Predictions/Reshape_1", 2.262, 0.030, 1),
+    ]
+
+    # Only the first table counts:
+    assert parse_op_profile(BENCHMARK_OUTPUT)[0].node_type == "AllocateTensors"
+    assert parse_op_profile("Segmentation fault") == []
+
+
+def test_chrome_trace() -> None:
+    ops = [
+        OpProfile("CONV_2D", "conv", 0.0, 1.0, 1),
+        OpProfile("ADD", "add", 1.0, 0.5, 1),
+    ]
+    spans = [
+        Span(INVOKE, 5_000_000, 7_000_000, {"batch_element": 0}),
+        Span(DECODE, 1_000_000, 4_000_000, {}),
+        Span(INVOKE, 8_000_000, 10_000_000, {"batch_element": 1}),
+    ]
+
+    trace = chrome_trace(spans, ops)
+    events = [e for e in json.loads(json.dumps(trace))["traceEvents"] if e["ph"] == "X"]
+    stages = [e for e in events if e["tid"] == 1]
+    op_events = [e for e in events if e["tid"] == 2]
+
+    assert [(e["name"], e["ts"], e["dur"]) for e in stages] == [
+        (DECODE, 0, 3000),
+        (INVOKE, 4000, 2000),
+        (INVOKE, 7000, 2000),
+    ]
+
+    # Ops are laid out under each invoke:
+    assert [(e["name"], e["ts"], e["dur"]) for e in op_events] == [
+        ("CONV_2D", 4000, 1000),
+        ("ADD", 5000, 500),
+        ("CONV_2D", 7000, 1000),
+        ("ADD", 8000, 500),
+    ]
+
+
+def test_trace_store_is_bounded(tmpdir: Any) -> None:
+    store = TraceStore(str(tmpdir), max_traces=3)
+    names = [store.save({"traceEvents": [], "n": i}) for i in range(5)]
+
+    assert sorted(os.listdir(str(tmpdir))) == sorted(names[2:])
+
+    with open(join(str(tmpdir), names[-1])) as f:
+        assert json.load(f)["n"] == 4
@@ -0,0 +1,72 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from server.types import ConversionReport, Model
+from server.types.model import ModelDataError, convert_model, convert_optimization
+from server.types.tensor import tflite_tensors_to_pb
+
+MODE = Model.Optimization
+SAMPLES = [[np.random.RandomState(i).rand(1, 32).astype(np.float32)] for i in range(8)]
+
+
+@pytest.fixture(scope="module")
+def keras_model(tmp_path_factory: Any) -> bytes:
+    model = tf.keras.Sequential(
+        [
+            tf.keras.layers.Dense(256, activation="relu", input_shape=(32,)),
+            tf.keras.layers.Dense(4),
+        ]
+    )
+    path = str(tmp_path_factory.mktemp("keras").join("model.h5"))
+    model.save(path)
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def message(data: bytes, mode: Any, samples: bool = True) -> Model:
+    return Model(
+        data=Model.FromBytes(data=data),
+        type=Model.Type.KERAS_HDF5,
+        optimization=Model.Optimization(
+            mode=mode,
+            representative_dataset=[tflite_tensors_to_pb(s) for s in SAMPLES]
+            if samples
+            else [],
+        ),
+    )
+
+
+def test_invalid_optimizations() -> None:
+    with pytest.raises(ModelDataError):
+        convert_optimization(message(b"", MODE.FULL_INTEGER, samples=False))
+
+    tflite = message(b"", MODE.DYNAMIC_RANGE)
+    tflite.type = Model.Type.TFLITE_FLAT_BUFFER
+    with pytest.raises(ModelDataError):
+        convert_optimization(tflite)
+
+    tflite.optimization.mode = MODE.NONE
+    assert convert_optimization(tflite).mode == "none"
+
+
+@pytest.mark.parametrize("mode", [MODE.DYNAMIC_RANGE, MODE.FLOAT16, MODE.FULL_INTEGER])
+def test_optimize(keras_model: bytes, mode: Any) -> None:
+    report = ConversionReport()
+    tflite = convert_model(message(keras_model, mode), report)
+
+    opt = report.optimization
+    assert len(tflite) == opt.size_bytes < opt.float_size_bytes
+    assert opt.latency_ms > 0 and opt.float_latency_ms > 0
+    assert len(opt.max_deviation) == len(opt.mean_deviation) == 1
+    assert 0 <= opt.mean_deviation[0] <= opt.max_deviation[0] < 0.5
+
+
+def test_no_optimization(keras_model: bytes) -> None:
+    report = ConversionReport()
+    convert_model(message(keras_model, MODE.NONE), report)
+
+    assert not report.HasField("optimization")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from server.model_store import LocalModel
+from server.options import ModelOptions
+from server.rewrite import RewriteError, make_batch_dynamic, verify_native_batching
+from tests.synthetic import MODELS, build
+
+
+@pytest.mark.parametrize("name", ["fixed", "multi-io", "uint8"])
+def test_rewrite(name: str) -> None:
+    model = build(MODELS[name])
+    rewritten, changed = make_batch_dynamic(model)
+
+    assert changed > 0
+    assert len(rewritten) == len(model)
+    assert verify_native_batching(model, rewritten) is None
+
+
+def test_unbatched() -> None:
+    with pytest.raises(RewriteError):
+        make_batch_dynamic(build(MODELS["unbatched"]))
+
+    with pytest.raises(RewriteError):
+        make_batch_dynamic(b"definitely not a flatbuffer")
+
+
+def test_native_batching_option() -> None:
+    spec = MODELS["fixed"]
+    model = build(spec)
+    batch = spec.random_inputs(batch=6)
+
+    plain = LocalModel(model=model)
+    expected, _ = plain.predict(batch)
+    assert plain.native_batching is None
+
+    m = LocalModel(model=model, options=ModelOptions(native_batching=True))
+    outputs, _ = m.predict(batch)
+
+    assert m.native_batching
+    assert m.interp is not None
+    assert m.interp.get_input_details()[0]["shape"][0] == 6  # one invoke
+
+    np.testing.assert_allclose(outputs[0], expected[0], rtol=1e-5, atol=1e-5)
+
+
+def test_native_batching_falls_back() -> None:
+    spec = MODELS["unbatched"]
+    m = LocalModel(model=build(spec), options=ModelOptions(native_batching=True))
+
+    outputs, _ = m.predict(spec.random_inputs(batch=3))
+
+    assert m.native_batching is False
+    assert outputs[0].shape == (3, spec.output_size)
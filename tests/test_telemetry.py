@@ -0,0 +1,79 @@
+import re
+import threading
+from typing import Dict
+
+from server import telemetry
+
+
+def scrape() -> Dict[str, float]:
+    samples: Dict[str, float] = {}
+    for line in telemetry.render().splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    return samples
+
+
+def test_counters_from_many_threads() -> None:
+    labels = (("handle", "counters"),)
+
+    def work() -> None:
+        for _ in range(1000):
+            telemetry.inc("requests_total", labels)
+
+    # More threads than shards, so that dead threads' shards get folded:
+    for _ in range(telemetry.MAX_SHARDS // 8 + 1):
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    runs = (telemetry.MAX_SHARDS // 8 + 1) * 10
+    assert scrape()['web_demos_requests_total{handle="counters"}'] == runs * 1000
+    assert len(telemetry._shards) <= telemetry.MAX_SHARDS + 1
+
+
+def test_gauges() -> None:
+    labels = (("handle", "gauges"),)
+
+    telemetry.inc("queue_depth", labels)
+    telemetry.inc("queue_depth", labels)
+    telemetry.dec("queue_depth", labels)
+
+    assert scrape()['web_demos_queue_depth{handle="gauges"}'] == 1
+
+
+def test_histograms() -> None:
+    labels = (("handle", "histograms"),)
+
+    for value in (0.0001, 0.003, 0.003, 0.2, 100.0):
+        telemetry.observe("inference_latency_seconds", value, labels)
+
+    samples = scrape()
+    bucket = lambda le: samples[
+        f'web_demos_inference_latency_seconds_bucket{{handle="histograms",le="{le}"}}'
+    ]
+
+    assert bucket("0.0005") == 1
+    assert bucket("0.0025") == 1
+    assert bucket("0.005") == 3
+    assert bucket("0.25") == 4
+    assert bucket("60.0") == 4
+    assert bucket("+Inf") == 5
+
+    name = "web_demos_inference_latency_seconds"
+    assert samples[f'{name}_count{{handle="histograms"}}'] == 5
+    assert abs(samples[f'{name}_sum{{handle="histograms"}}'] - 100.2061) < 1e-9
+
+
+def test_render_format() -> None:
+    telemetry.inc("errors_total", (("kind", 'a "quoted"\nkind'),))
+    text = telemetry.render([("model_file_bytes", (("handle", "0"),), 1234)])
+
+    assert "# TYPE web_demos_errors_total counter" in text
+    assert "# TYPE web_demos_model_file_bytes gauge" in text
+    assert 'web_demos_errors_total{kind="a \\"quoted\\"\\nkind"} 1' in text
+    assert 'web_demos_model_file_bytes{handle="0"} 1234' in text
+    assert re.search(r"^web_demos_process_resident_memory_bytes \d+$", text, re.M)
@@ -0,0 +1,74 @@
+import json
+from typing import Any
+
+import pytest
+
+import server.types.model
+import server.warmup
+from server.model_store import ModelStore
+from server.types import LoadModelRequest
+from server.types.model import convert_model
+from server.types.options import convert_model_options
+from server.types.postprocess import convert_post_process
+from server.warmup import Warmup, WarmupConfigError, load_requests
+from tests.synthetic import MODELS, write_models
+
+
+@pytest.fixture
+def model_dir(tmp_path: Any, monkeypatch: Any) -> str:
+    models = {n: MODELS[n] for n in ("fixed", "resizable", "multi-io")}
+    write_models(str(tmp_path), models)
+    monkeypatch.setattr(server.warmup, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(server.types.model, "MODEL_DIR", str(tmp_path))
+
+    return str(tmp_path)
+
+
+def test_load_requests(model_dir: str) -> None:
+    with open(f"{model_dir}/fixed.json", "w") as f:
+        json.dump({"model": {"file": {"file": "fixed.tflite"}}, "options": {}}, f)
+
+    assert list(load_requests(["*"])) == [
+        "fixed.tflite",
+        "multi-io.tflite",
+        "resizable.tflite",
+    ]
+    assert load_requests(["fixed.json"])["fixed.json"].model.file.file == (
+        "fixed.tflite"
+    )
+
+    with pytest.raises(WarmupConfigError):
+        load_requests(["fixed.onnx"])
+    with pytest.raises(WarmupConfigError):
+        load_requests(["missing.json"])
+
+
+def test_warmup(model_dir: str) -> None:
+    store = ModelStore()
+    requests = load_requests(["*", "missing.tflite"])
+
+    warmup = Warmup(store, requests, runs=2, threads=4).start()
+    assert warmup.wait(timeout=60)
+    assert warmup.ready
+
+    report = warmup.report()
+    assert report["models"]["missing.tflite"]["state"] == "failed"
+
+    for name in ("fixed.tflite", "resizable.tflite", "multi-io.tflite"):
+        status = report["models"][name]
+        assert status["state"] == "ready"
+        assert status["first_run_ms"] > 0 and status["steady_run_ms"] > 0
+
+        # A client loading the same model gets the warm handle:
+        req: LoadModelRequest = requests[name]
+        handle = store.load(
+            convert_model(req.model),
+            convert_post_process(req.post_process),
+            convert_model_options(req.options),
+        )
+        assert handle == status["handle"]
+        assert store.get(handle).interp is not None
+
+
+def test_nothing_to_warm_up() -> None:
+    assert Warmup(ModelStore(), {}).start().ready
@@ -0,0 +1,164 @@
+import os
+from typing import Any, List
+
+import pytest
+
+from server.types import ConversionReport
+from server.types import model as m
+from server.types.model import (
+    MT,
+    Conversion,
+    Edge,
+    ModelConversionError,
+    conversion_step,
+    into_conversion_report,
+    plan,
+)
+
+
+def writes(target: Any, ran: List[str], fail: bool = False) -> m.ConversionFunc:
+    def func(conversion: Conversion, _: str) -> None:
+        ran.append(m.n(target))
+        if fail:
+            raise RuntimeError("can't convert this one")
+
+        path = m.p(target, conversion.directory)
+        if path.endswith("/"):
+            os.makedirs(path)
+        else:
+            with open(path, "wb") as f:
+                f.write(m.n(target).encode())
+
+    return func
+
+
+@pytest.fixture
+def ran(monkeypatch: Any) -> List[str]:
+    ran: List[str] = []
+    monkeypatch.setattr(m, "_costs", {})
+    monkeypatch.setattr(m, "_breakers", {})
+    monkeypatch.setattr(m, "_installed", lambda package: package != "missing")
+    tflite, layers, hdf5 = MT.TFLITE_FLAT_BUFFER, MT.TFJS_LAYERS, MT.KERAS_HDF5
+    edges = [
+        Edge(MT.KERAS_SAVED_MODEL, tflite, writes(tflite, ran, fail=True), 10.0),
+        Edge(MT.KERAS_SAVED_MODEL, layers, writes(layers, ran), 10.0),
+        Edge(layers, hdf5, writes(hdf5, ran), 10.0),
+        Edge(hdf5, tflite, writes(tflite, ran), 10.0),
+        Edge(MT.TF_HUB, tflite, writes(tflite, ran), 10.0, "missing"),
+    ]
+    monkeypatch.setattr(m, "conversion_edges", edges)
+    return ran
+
+
+def test_plan(ran: List[str]) -> None:
+    route = plan(MT.KERAS_SAVED_MODEL)
+    assert route is not None and [e.target for e in route] == [MT.TFLITE_FLAT_BUFFER]
+
+    route = plan(MT.KERAS_SAVED_MODEL, exclude={route[0].key})
+    assert route is not None
+    assert [e.target for e in route] == [
+        MT.TFJS_LAYERS,
+        MT.KERAS_HDF5,
+        MT.TFLITE_FLAT_BUFFER,
+    ]
+
+    assert plan(MT.TFJS_GRAPH) is None
+    assert plan(MT.TF_HUB) is None and plan(MT.TF_HUB, installed_only=False)
+
+
+def test_falls_back(ran: List[str], tmp_path: Any) -> None:
+    conversion = Conversion(str(tmp_path))
+    assert conversion_step(MT.KERAS_SAVED_MODEL, conversion) == b"TFLITE_FLAT_BUFFER"
+
+    assert ran == [
+        "TFLITE_FLAT_BUFFER",
+        "TFJS_LAYERS",
+        "KERAS_HDF5",
+        "TFLITE_FLAT_BUFFER",
+    ]
+    assert conversion.hops[0].error is not None
+    assert all(h.error is None for h in conversion.hops[1:])
+
+    report = ConversionReport()
+    into_conversion_report(conversion, report)
+    assert [h.target for h in report.hops] == [
+        MT.TFLITE_FLAT_BUFFER,
+        MT.TFJS_LAYERS,
+        MT.KERAS_HDF5,
+        MT.TFLITE_FLAT_BUFFER,
+    ]
+    assert "can't convert" in report.hops[0].error
+
+
+def test_failures_are_forgotten(ran: List[str], monkeypatch: Any) -> None:
+    targets = lambda: [e.target for e in plan(MT.KERAS_SAVED_MODEL) or []]
+    shortcut = m.conversion_edges[0]
+
+    # One failure doesn't rule the shortcut out..
+    m.record_hop(shortcut, 10.0, ok=False)
+    assert targets() == [MT.TFLITE_FLAT_BUFFER]
+
+    # ..but an edge that keeps failing costs more than the long way round..
+    for _ in range(5):
+        m.record_hop(shortcut, 10.0, ok=False)
+    assert targets() == [MT.TFJS_LAYERS, MT.KERAS_HDF5, MT.TFLITE_FLAT_BUFFER]
+
+    # ..until its failures have been forgotten:
+    later = m.monotonic() + 10 * m.RELIABILITY_HALF_LIFE_S
+    monkeypatch.setattr(m, "monotonic", lambda: later)
+    assert targets() == [MT.TFLITE_FLAT_BUFFER]
+
+
+def test_shortcuts_that_fail_are_switched_off(
+    ran: List[str], tmp_path: Any, monkeypatch: Any
+) -> None:
+    def convert() -> None:
+        conversion = Conversion(str(tmp_path / str(len(os.listdir(str(tmp_path))))))
+        os.makedirs(conversion.directory)
+        conversion_step(MT.KERAS_SAVED_MODEL, conversion)
+
+    long_way = ["TFJS_LAYERS", "KERAS_HDF5", "TFLITE_FLAT_BUFFER"]
+
+    # The shortcut fails on the first request..
+    convert()
+    assert ran == ["TFLITE_FLAT_BUFFER"] + long_way
+
+    # ..so the next one goes straight to the route that works..
+    ran.clear()
+    convert()
+    assert ran == long_way
+
+    # ..until the breaker has cooled down and the shortcut can be tried again:
+    shortcut = m.conversion_edges[0]
+    assert plan(MT.KERAS_SAVED_MODEL, exclude={m.conversion_edges[1].key}) is None
+
+    later = m.monotonic() + m.BREAKER_COOLDOWN_S
+    monkeypatch.setattr(m, "monotonic", lambda: later)
+    assert plan(MT.KERAS_SAVED_MODEL, exclude={m.conversion_edges[1].key}) == [shortcut]
+
+
+def test_transient_errors_dont_trip_breakers(ran: List[str]) -> None:
+    shortcut = m.conversion_edges[0]
+
+    m.trip(shortcut, OSError("disk full"))
+    assert m.tripped() == set()
+
+    m.trip(shortcut, ValueError("unsupported op"))
+    assert m.tripped() == {shortcut.key}
+
+    # With nothing else to try, tripped edges still get used:
+    assert plan(MT.KERAS_SAVED_MODEL, exclude={m.conversion_edges[1].key}) is None
+    assert plan(
+        MT.KERAS_SAVED_MODEL, exclude={m.conversion_edges[1].key}, skip_tripped=False
+    ) == [shortcut]
+
+    m.reset(shortcut)
+    assert m.tripped() == set()
+
+
+def test_no_route(ran: List[str], tmp_path: Any) -> None:
+    with pytest.raises(ModelConversionError, match="isn't supported"):
+        conversion_step(MT.TFJS_GRAPH, Conversion(str(tmp_path)))
+
+    with pytest.raises(ModelConversionError, match="missing"):
+        conversion_step(MT.TF_HUB, Conversion(str(tmp_path)))
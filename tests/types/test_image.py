@@ -0,0 +1,98 @@
+from io import BytesIO
+from typing import Any, List
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from server.types import Images
+from server.types.image import (
+    ImageDecodeError,
+    InvalidPreprocess,
+    pb_images_to_tflite_tensors,
+)
+
+Preprocess = Images.Preprocess
+
+
+def encode(arr: np.ndarray, fmt: str = "PNG") -> bytes:
+    buf = BytesIO()
+    Image.fromarray(arr).save(buf, format=fmt)
+
+    return buf.getvalue()
+
+
+def rand_image(height: int = 12, width: int = 10) -> np.ndarray:
+    return np.random.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def decode(images: List[bytes], **spec: Any) -> np.ndarray:
+    tensors = pb_images_to_tflite_tensors(
+        Images(images=images, preprocess=Preprocess(**spec))
+    )
+
+    assert len(tensors) == 1
+    return tensors[0]
+
+
+def test_single_png_is_lossless() -> None:
+    img = rand_image()
+    tensor = decode([encode(img)], dtype=Preprocess.UINT8)
+
+    assert tensor.dtype == np.uint8
+    assert (tensor == img).all()
+
+
+def test_batch() -> None:
+    imgs = [rand_image() for _ in range(5)]
+    tensor = decode([encode(i) for i in imgs], dtype=Preprocess.INT32)
+
+    assert tensor.shape == (5, 12, 10, 3)
+    assert tensor.dtype == np.int32
+    assert (tensor == np.stack(imgs)).all()
+
+
+def test_resize_and_grayscale() -> None:
+    imgs = [encode(rand_image(40, 30), "JPEG"), encode(rand_image(8, 8))]
+    tensor = decode(imgs, height=28, width=28, grayscale=True)
+
+    assert tensor.shape == (2, 28, 28, 1)
+    assert tensor.dtype == np.float32
+
+
+def test_normalization() -> None:
+    img = rand_image()
+    tensor = decode([encode(img)], mean=[127.5], std=[127.5, 127.5, 127.5])
+
+    assert tensor.dtype == np.float32
+    assert np.allclose(tensor, (img.astype(np.float32) - 127.5) / 127.5)
+
+
+def test_errors() -> None:
+    img = encode(rand_image())
+
+    with pytest.raises(ImageDecodeError):
+        decode([b"definitely not an image"])
+
+    with pytest.raises(InvalidPreprocess):
+        decode([])
+
+    with pytest.raises(InvalidPreprocess):
+        decode([img], height=10)
+
+    with pytest.raises(InvalidPreprocess):
+        decode([img, encode(rand_image(5, 5))])
+
+    with pytest.raises(InvalidPreprocess):
+        decode([img], mean=[1.0, 2.0])
+
+    with pytest.raises(InvalidPreprocess):
+        decode([img], mean=[1.0], dtype=Preprocess.UINT8)
+
+
+def test_decompression_bombs(monkeypatch: Any) -> None:
+    # (PIL only raises for images more than twice the limit; less is a warning)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10)
+
+    with pytest.raises(ImageDecodeError):
+        decode([encode(rand_image(12, 10))])
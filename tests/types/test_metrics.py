@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from server.types.metrics import DECODE, ENCODE, INVOKE, STAGES, Metrics
+
+
+def test_stages_accumulate() -> None:
+    m = Metrics().add_time(INVOKE, 10).add_time(INVOKE, 5).add_time(DECODE, 3)
+
+    assert m.get_time(INVOKE) == 15
+    assert m.get_time(ENCODE) == 0
+    assert m.stages() == ((DECODE, 3), (INVOKE, 15))
+
+    mm = m.into()
+    assert mm.stages.invoke == 15 and mm.stages.decode == 3
+
+
+def test_timed() -> None:
+    m = Metrics()
+
+    with m.timed(ENCODE):
+        time.sleep(0.001)
+
+    assert m.get_time(ENCODE) >= 1_000_000
+
+
+def test_no_stages() -> None:
+    assert not Metrics().into().HasField("stages")
+
+
+def test_unknown_stage() -> None:
+    assert "bogus" not in STAGES
+
+    with pytest.raises(AssertionError):
+        Metrics().add_time("bogus", 1)
+
+
+def test_spans_only_when_recording() -> None:
+    m = Metrics().span(INVOKE, 0, 10)
+
+    with m.timed(ENCODE):
+        pass
+
+    assert m.spans() is None
+
+    m = Metrics().record_spans().span(INVOKE, 0, 10, batch_element=0)
+
+    with m.timed(ENCODE):
+        pass
+
+    spans = m.spans()
+    assert spans is not None and [s.name for s in spans] == [INVOKE, ENCODE]
+    assert spans[0].args == {"batch_element": 0}
+    assert spans[1].end - spans[1].begin == m.get_time(ENCODE)
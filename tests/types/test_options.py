@@ -0,0 +1,47 @@
+import pytest
+
+from server.admission import BULK, INTERACTIVE, NORMAL
+from server.affinity import available_cpus
+from server.options import InvalidModelOptions, ModelOptions
+from server.types import ModelOptions as ModelOptionsMessage
+from server.types.options import convert_model_options, convert_priority
+
+
+def test_defaults() -> None:
+    assert convert_model_options(ModelOptionsMessage()) == ModelOptions()
+
+
+def test_cpus() -> None:
+    core = min(available_cpus())
+    options = convert_model_options(
+        ModelOptionsMessage(cpus=[core, core], num_threads=3)
+    )
+
+    assert options.cpus == (core,) and options.num_threads == 3
+
+    with pytest.raises(InvalidModelOptions):
+        convert_model_options(ModelOptionsMessage(cpus=[max(available_cpus()) + 1]))
+
+
+def test_delegate() -> None:
+    assert (
+        convert_model_options(ModelOptionsMessage(delegate="auto")).delegate == "auto"
+    )
+    assert convert_model_options(ModelOptionsMessage(delegate="cpu")).delegate == "cpu"
+
+    with pytest.raises(InvalidModelOptions):
+        convert_model_options(ModelOptionsMessage(delegate="no-such-delegate"))
+
+
+def test_scheduling() -> None:
+    assert convert_model_options(ModelOptionsMessage()).priority == NORMAL
+    options = convert_model_options(
+        ModelOptionsMessage(priority=ModelOptionsMessage.BULK, weight=0.5)
+    )
+    assert options.priority == BULK and options.weight == 0.5
+
+    assert convert_priority(ModelOptionsMessage.UNSET) is None
+    assert convert_priority(ModelOptionsMessage.INTERACTIVE) == INTERACTIVE
+
+    with pytest.raises(InvalidModelOptions):
+        convert_model_options(ModelOptionsMessage(weight=-1))